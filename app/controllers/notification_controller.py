@@ -1,169 +1,723 @@
 from ..db.notifications import (
-    save_notification,
+    create_notification,
+    save_notifications,
     get_notification_by_txn_id,
+    get_notifications_by_txn_ids,
     update_notification,
-    get_notifications
+    get_notifications,
+    requeue_dead_letters,
+    renew_notification_lease,
+    stream_notifications,
+    filter_query,
+    EXPORT_BATCH_SIZE,
+    STATUS_PROJECTION
+)
+from ..db.status_cache import status_cache
+from ..db.archive import find_archived
+from ..db.stats import stats_rollup, bucket_start, GRANULARITIES, STATS_MAX_BUCKETS
+from ..models.serializers import (
+    notification_summary,
+    notification_detail,
+    ndjson_line,
+    csv_header,
+    csv_lines,
+    csv_values,
+    sse_event,
+    sse_comment,
+    stats_bucket
 )
 from ..services.telegram_service import telegram_service
+from ..services.delivery_queue import delivery_queue, QueueFullError, DELIVERY_MODE
+from ..services.retry_service import failure_update, lease_keeper
+from ..services.digest_service import digest_coalescer
+from ..services.dispatcher import default_node_id
+from ..services.circuit_breaker import is_mongo_unavailable
+from ..services.spill_journal import spill_journal
+from ..services.metrics import NOTIFICATIONS, NOTIFICATION_TIME_TO_SEND
+from ..services.log_service import log_context
+from ..services.event_hub import event_hub, SSE_HEARTBEAT, SSE_RETRY_MS
+import os
+import time
+import asyncio
 import logging 
-from datetime import datetime 
+from datetime import datetime, timedelta
+from bson import ObjectId # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Batch settings
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 500))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 10))
+
+# Buckets returned by the stats endpoint when no start is given
+STATS_DEFAULT_BUCKETS = int(os.getenv("STATS_DEFAULT_BUCKETS", 24))
+
+
+# Build the "pending" notification document for an incoming alert
+# Outside distributed mode this process delivers it, so it is stored already claimed
+# (claimed_by, lease_until and a lease_id fencing the outcome); lease_keeper renews the
+# lease until the delivery is done, and the retry sweeper only takes over if it lapses.
+# In distributed mode (or leased=False) it is due straight away, for whoever claims it first.
+def build_notification(data, leased=None):
+    now = datetime.now()
+    if leased is None:
+        leased = DELIVERY_MODE != "distributed"
+
+    notification = {
+        "transaction_number": data["transaction_number"],
+        "transaction_amount": data["transaction_amount"],
+        "fraud_probability": data["fraud_probability"],
+        "category": data.get("category"),
+        "merchant": data.get("merchant"),
+        "is_nighttime": data.get("is_nighttime"),
+        "transaction_location": data.get("transaction_location"),
+        "risk_level": telegram_service.get_risk_level(data["fraud_probability"]),
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    }
+
+    if leased:
+        lease_until = now + timedelta(seconds=lease_keeper.lease)
+        notification.update({
+            "claimed_by": default_node_id(),
+            "lease_until": lease_until,
+            "lease_id": str(ObjectId()),
+            "next_attempt_at": lease_until
+        })
+
+    return notification
+
+
+# Count a delivery outcome by status and risk level
+def record_outcome(status, data):
+    NOTIFICATIONS.inc(status=status, risk_level=telegram_service.get_risk_level(data.get("fraud_probability", 0)))
+
+
+# Time from acceptance to delivery, by risk level (the per-priority view of dispatch)
+def record_time_to_send(saved, data, sent_at):
+    created_at = saved.get("created_at")
+    if created_at:
+        risk_level = telegram_service.get_risk_level(data.get("fraud_probability", 0))
+        NOTIFICATION_TIME_TO_SEND.observe((sent_at - created_at).total_seconds(), risk_level=risk_level)
 
 
 """
 Process a fraud notification:
 1. Save notification to database with "pending" status
-2. Send notification to Telegram
+2. Send notification to Telegram (inline, or via the delivery queue)
 3. Update notification status based on result
 """
 async def send_fraud_notification(data):
     try:
-        # Check if notification already exists
-        existing = await get_notification_by_txn_id(data.get("transaction_number"))
+        # In queue mode, claim a slot before writing so a full queue rejects cleanly
+        queued = DELIVERY_MODE == "queue" and delivery_queue.running
+        if queued:
+            try:
+                await delivery_queue.reserve()
+            except QueueFullError as e:
+                return {
+                    "success": False,
+                    "message": "Delivery queue is full, retry later",
+                    "status": "rejected",
+                    "error": str(e),
+                    "queue_full": True
+                }
+
+        # 1. Create the notification with pending status, unless one already
+        # exists for this transaction (a single atomic upsert)
+        notification = build_notification(data)
+        
+        try:
+            saved, created = await create_notification(notification)
+        except Exception as e:
+            if queued:
+                delivery_queue.release()
+            # Mongo is down: keep the alert on local disk and store it once Mongo is back
+            if is_mongo_unavailable(e) and spill_journal.enabled:
+                await spill_journal.append(data)
+                return journaled_result()
+            raise
+
+        if not created:
+            if queued:
+                delivery_queue.release()
 
-        if existing:
             return {
                 "success":True,
                 "message": "Notification already exists for this transaction.",
-                "notification_id": existing["_id"],
-                "status": existing["status"]
+                "notification_id": saved["_id"],
+                "status": saved["status"]
             }
 
-        # 1. Create and save notification with pending status 
-        notification = {
-            "transaction_number": data["transaction_number"],
-            "transaction_amount": data["transaction_amount"],
-            "fraud_probability": data["fraud_probability"],
-            "category": data.get("category"),
-            "merchant": data.get("merchant"),
-            "is_nighttime": data.get("is_nighttime"),
-            "status": "pending",
-            "created_at": datetime.now()
+        # Renew the lease while it waits in the queue or for rate budget
+        lease_keeper.hold(saved)
+
+        # 2. Hand off to the delivery workers (or leave it to the dispatchers) and return straight away
+        if queued:
+            delivery_queue.put(saved, data)
+
+        if queued or DELIVERY_MODE == "distributed":
+            return {
+                "success": True,
+                "message": "Notification queued for delivery.",
+                "notification_id": saved["_id"],
+                "status": "pending",
+                "queued": True
+            }
+
+        return await deliver_notification(saved, data)
+            
+    except Exception as e:
+        logger.error("Error processing notification: %s", e, extra={"transaction_number": data.get("transaction_number")})
+        return {
+            "success": False,
+            "message": "Error processing notification",
+            "error": str(e)
         }
-        
-        saved = await save_notification(notification)
 
-        # 2. Send notification to Telegram
+
+def journaled_result():
+    return {
+        "success": True,
+        "message": "Database unavailable, notification journaled for delivery.",
+        "status": "journaled",
+        "queued": True
+    }
+
+
+"""
+Store an alert from the spill journal once Mongo is reachable again.
+It keeps the time it was accepted as created_at and is due straight away, so the
+retry sweeper (or a dispatcher) sends it. Replaying an entry twice is harmless:
+the upsert on transaction_number leaves an existing notification alone.
+"""
+async def replay_journaled_notification(data, journaled_at):
+    notification = build_notification(data, leased=False)
+    notification["created_at"] = journaled_at
+    await create_notification(notification)
+
+
+"""
+Process a batch of fraud notifications:
+1. Drop duplicates inside the batch and those already stored (one $in query)
+2. Save the new ones with a single unordered insert_many
+3. Send them with bounded concurrency (or queue them in queue mode)
+Every input gets its own entry in the returned results, in request order.
+"""
+async def send_fraud_notifications_batch(items):
+    results = [None] * len(items)
+
+    try:
+        # 1. Duplicates inside the batch - the first occurrence wins
+        first_seen = {}
+        for index, data in enumerate(items):
+            txn = data["transaction_number"]
+            if txn in first_seen:
+                results[index] = {
+                    "transaction_number": txn,
+                    "success": False,
+                    "message": "Duplicate transaction in batch.",
+                    "status": "duplicate"
+                }
+            else:
+                first_seen[txn] = index
+
+        # Duplicates against what is already stored
+        existing = await get_notifications_by_txn_ids(first_seen.keys())
+        for txn, notification in existing.items():
+            results[first_seen.pop(txn)] = {
+                "transaction_number": txn,
+                "success": True,
+                "message": "Notification already exists for this transaction.",
+                "notification_id": notification["_id"],
+                "status": notification["status"]
+            }
+
+        new_indexes = list(first_seen.values())
+
+        # In queue mode, only write what the queue can take
+        queued = DELIVERY_MODE == "queue" and delivery_queue.running
+        if queued:
+            accepted = []
+            for index in new_indexes:
+                try:
+                    await delivery_queue.reserve()
+                    accepted.append(index)
+                except QueueFullError as e:
+                    results[index] = {
+                        "transaction_number": items[index]["transaction_number"],
+                        "success": False,
+                        "message": "Delivery queue is full, retry later",
+                        "status": "rejected",
+                        "error": str(e)
+                    }
+            new_indexes = accepted
+
+        # 2. Save the new notifications in one round trip
         try:
-            telegram_result = await telegram_service.send_fraud_alert(data)     
-
-            # 3. Update notification status based on Telegram result
-            if telegram_result.get("success"):
-                # Success -> update status to "sent"
-                await update_notification(saved["_id"], {
-                    "status": "sent",
-                    "sent_at": datetime.now(),
-                    "message_id": telegram_result.get("message_id"),
-                    "content": telegram_result.get("content")
-                })  
+            saved = await save_notifications([build_notification(items[i]) for i in new_indexes])
+        except Exception:
+            if queued:
+                for _ in new_indexes:
+                    delivery_queue.release()
+            raise
 
-                return {
+        to_deliver = []
+        for index, outcome in zip(new_indexes, saved):
+            txn = items[index]["transaction_number"]
+
+            if outcome["notification"] is not None:
+                lease_keeper.hold(outcome["notification"])
+                to_deliver.append((index, outcome["notification"]))
+                continue
+
+            if queued:
+                delivery_queue.release()
+
+            if outcome["duplicate"]:
+                # Lost a race with a concurrent request on the unique index
+                results[index] = {
+                    "transaction_number": txn,
                     "success": True,
-                    "message": "Notification sent successfully.",
-                    "notification_id": saved["_id"],
-                    "status": "sent"
+                    "message": "Notification already exists for this transaction.",
+                    "status": "duplicate"
                 }
             else:
-                # Failure - update status to "failed"
-                await update_notification(saved["_id"], {
-                    "status": "failed",
-                    "error": telegram_result.get("error", "Unknown error"),
-                    "failed_at": datetime.now()
-                })
-                
-                return {
+                results[index] = {
+                    "transaction_number": txn,
                     "success": False,
-                    "message": "Failed to send notification",
-                    "notification_id": saved["_id"],
-                    "status": "failed",
-                    "error": telegram_result.get("error", "Unknown error")
+                    "message": "Error saving notification",
+                    "status": "error",
+                    "error": outcome["error"]
                 }
-            
-        except Exception as e:
-            # Exception during sending - update status to "failed"
+
+        # 3. Deliver
+        if queued or DELIVERY_MODE == "distributed":
+            for index, notification in to_deliver:
+                if queued:
+                    delivery_queue.put(notification, items[index])
+                results[index] = {
+                    "transaction_number": items[index]["transaction_number"],
+                    "success": True,
+                    "message": "Notification queued for delivery.",
+                    "notification_id": notification["_id"],
+                    "status": "pending"
+                }
+        else:
+            semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+            async def deliver(index, notification):
+                async with semaphore:
+                    result = await deliver_notification(notification, items[index])
+                result["transaction_number"] = items[index]["transaction_number"]
+                results[index] = result
+
+            await asyncio.gather(*(deliver(i, n) for i, n in to_deliver))
+
+        return {
+            "success": True,
+            "total": len(items),
+            "results": results
+        }
+
+    except Exception as e:
+        if is_mongo_unavailable(e) and spill_journal.enabled:
+            return await journal_batch(items, results)
+
+        logger.error("Error processing notification batch: %s", e)
+        return {
+            "success": False,
+            "message": "Error processing notification batch",
+            "error": str(e),
+            "results": []
+        }
+
+
+# Journal every batch item that has no result yet (Mongo went away before it was stored).
+# The appends are issued together so they share fsyncs, and keep the batch order.
+async def journal_batch(items, results):
+    pending = [index for index, result in enumerate(results) if result is None]
+
+    try:
+        await asyncio.gather(*(spill_journal.append(items[index]) for index in pending))
+    except Exception as e:
+        logger.error("Error journaling notification batch: %s", e)
+        return {
+            "success": False,
+            "message": "Error processing notification batch",
+            "error": str(e),
+            "results": []
+        }
+
+    for index in pending:
+        results[index] = {"transaction_number": items[index]["transaction_number"], **journaled_result()}
+
+    return {
+        "success": True,
+        "total": len(items),
+        "results": results
+    }
+
+
+"""
+Deliver a saved notification to Telegram (or to a digest) and record the outcome.
+Used inline by send_fraud_notification, by the delivery queue workers, the retry sweeper and the dispatcher.
+A claimed notification carries a lease_id: the outcome is only written while that lease is held.
+"""
+async def deliver_notification(saved, data):
+    # Every record logged while delivering carries the alert's identifiers
+    with log_context(transaction_number=data.get("transaction_number"), notification_id=saved.get("_id")):
+        return await _deliver_notification(saved, data)
+
+
+async def _deliver_notification(saved, data):
+    lease_id = saved.get("lease_id")
+
+    # Taken over while it waited (this process lost Mongo for longer than the lease):
+    # whoever holds it now sends it
+    if lease_keeper.lost(saved["_id"]):
+        lease_keeper.release(saved["_id"])
+        logger.warning("Lease on notification %s was lost before sending; not sent", saved["_id"])
+        return {
+            "success": False,
+            "message": "Notification lease was lost, delivery left to its new owner",
+            "notification_id": saved["_id"],
+            "status": "pending",
+            "lease_lost": True
+        }
+
+    # Low-risk alerts may wait to go out as part of a digest
+    if digest_coalescer.should_coalesce(data):
+        if lease_id:
+            # Hold the claim until the digest has gone out (the digest releases it)
+            await renew_notification_lease(saved["_id"], lease_id, lease_keeper.lease)
+            lease_keeper.hold(saved)
+        await digest_coalescer.add(saved, data)
+        return {
+            "success": True,
+            "message": "Notification added to digest.",
+            "notification_id": saved["_id"],
+            "status": "pending",
+            "queued": True
+        }
+
+    try:
+        return await send_notification(saved, data)
+    finally:
+        lease_keeper.release(saved["_id"])
+
+
+# Send one notification to Telegram and write the outcome, fenced on its lease
+async def send_notification(saved, data):
+    lease_id = saved.get("lease_id")
+
+    try:
+        started = time.perf_counter()
+        telegram_result = await telegram_service.send_fraud_alert(data)     
+
+        # Update notification status based on Telegram result
+        if telegram_result.get("success"):
+            # Success -> update status to "sent"
+            sent_at = datetime.now()
+            sent = time.perf_counter()
             await update_notification(saved["_id"], {
-                "status": "failed",
-                "error": str(e),
-                "failed_at": datetime.now()
-            })
+                "status": "sent",
+                "sent_at": sent_at,
+                "message_id": telegram_result.get("message_id"),
+                "content": telegram_result.get("content"),
+                "rate_limit_wait": telegram_result.get("waited", 0.0),
+                "attempts": saved.get("attempts", 0) + 1,
+                "next_attempt_at": None
+            }, lease_id=lease_id)
+
+            record_outcome("sent", data)
+            record_time_to_send(saved, data, sent_at)
+
+            waited = telegram_result.get("waited", 0.0)
+            logger.info("Notification sent", extra={"timings": {
+                "rate_limit_wait": round(waited, 4),
+                "telegram": round(sent - started - waited, 4),
+                "db_update": round(time.perf_counter() - sent, 4),
+                "time_to_send": round((sent_at - saved["created_at"]).total_seconds(), 4) if saved.get("created_at") else None
+            }})
+
+            return {
+                "success": True,
+                "message": "Notification sent successfully.",
+                "notification_id": saved["_id"],
+                "status": "sent"
+            }
+        else:
+            # Failure - schedule a retry, or dead-letter after too many attempts
+            error = telegram_result.get("error", "Unknown error")
+            update = failure_update(saved, error)
+            await update_notification(saved["_id"], update, lease_id=lease_id)
+            record_outcome(update["status"], data)
             
-            logging.error(f"Error sending notification: {str(e)}")
             return {
                 "success": False,
-                "message": "Error sending notification",
+                "message": "Failed to send notification",
                 "notification_id": saved["_id"],
-                "status": "failed",
-                "error": str(e)
+                "status": update["status"],
+                "error": error
             }
-            
+        
     except Exception as e:
-        logging.error(f"Error processing notification: {str(e)}")
+        # Exception during sending - schedule a retry, or dead-letter
+        update = failure_update(saved, str(e))
+        await update_notification(saved["_id"], update, lease_id=lease_id)
+        record_outcome(update["status"], data)
+        
+        logger.error("Error sending notification: %s", e)
         return {
             "success": False,
-            "message": "Error processing notification",
+            "message": "Error sending notification",
+            "notification_id": saved["_id"],
+            "status": update["status"],
             "error": str(e)
         }
     
+"""
+Requeue dead-lettered notifications (all of them, or the given IDs / transaction IDs).
+"""
+async def requeue_dead_letter_notifications(ids=None):
+    try:
+        requeued = await requeue_dead_letters(ids)
+
+        return {
+            "success": True,
+            "message": f"Requeued {requeued} dead-lettered notifications.",
+            "requeued": requeued
+        }
+
+    except Exception as e:
+        logger.error("Error requeueing dead letters: %s", e)
+        return {
+            "success": False,
+            "message": "Error requeueing dead letters",
+            "error": str(e),
+            "requeued": 0
+        }
+
+
 """
 Get the status of a notification by ID or transaction ID.
+Notifications that have expired from MongoDB are looked up in the archive.
 """
 async def get_notification_status(id):
     try:
-        notification = await get_notification_by_txn_id(id)
+        # Read through the cache; entries are refreshed when the notification is updated
+        notification = status_cache.get(id)
+
+        if notification is None:
+            notification = await get_notification_by_txn_id(id, projection=STATUS_PROJECTION)
+
+            # Past the retention window it is only in the archive
+            if not notification:
+                notification = await find_archived(id)
+
+            if not notification:
+                return None
+
+            status_cache.put(notification)
         
+        # Return a simplified response with just the essential information
+        return notification_detail(notification)
+    
+    except Exception as e:
+        logger.error("Error getting notification status: %s", e)
+        return None
+
+
+"""
+Get the Telegram message of a notification by ID or transaction ID.
+Compact documents don't store it, so it is rendered again from the stored alert,
+dated when it was sent (or last attempted); older documents still have theirs.
+"""
+async def get_notification_content(id):
+    try:
+        notification = await get_notification_by_txn_id(id) or await find_archived(id)
+
         if not notification:
             return None
-        
-        # Return a simplified response with just the essential information
+
+        content = notification.get("content")
+        rendered = content is None
+        if rendered:
+            detected_at = notification.get("sent_at") or notification.get("updated_at") or notification.get("created_at")
+            content = telegram_service.format_fraud_message(notification, detected_at)
+
         return {
             "notification_id": notification["_id"],
             "transaction_number": notification["transaction_number"],
-            "status": notification["status"],
-            "created_at": notification.get("created_at"),
-            "sent_at": notification.get("sent_at"),
-            "error": notification.get("error"),
-            "fraud_probability": notification.get("fraud_probability"),
-            "transaction_amount": notification.get("transaction_amount"),
-            "message_id": notification.get("message_id")
+            "content": content,
+            "rendered": rendered
         }
-    
+
     except Exception as e:
-        logging.error(f"Error getting notification status: {str(e)}")
+        logger.error("Error getting notification content: %s", e)
         return None
 
 
 """
-List all notification with pagination
+List notifications with pagination, optionally filtered (see filter_query for the filter names).
+With `after` (the next_cursor of a previous page) keyset pagination is used instead of page/skip.
+The total is included by default for page mode and left out for cursor mode.
 """
-async def list_all_notifications(page=1, limit=10):
+async def list_all_notifications(page=1, limit=10, after=None, include_total=None, filters=None):
     try:
-        result = await get_notifications(page, limit)
-        
-        # Simplify the response format for the API
-        simplified_notifications = []
-        
-        for notification in result["notifications"]:
-            simplified_notifications.append({
-                "notification_id": notification["_id"],
-                "transaction_number": notification["transaction_number"],
-                "status": notification["status"],
-                "created_at": notification.get("created_at"),
-                "sent_at": notification.get("sent_at")
-            })
+        if include_total is None:
+            include_total = after is None
+
+        query = filter_query(**(filters or {}))
+
+        try:
+            result = await get_notifications(page, limit, after=after, include_total=include_total, query=query)
+        except ValueError as e:
+            return {
+                "success": False,
+                "message": "Invalid cursor",
+                "error": str(e),
+                "invalid_cursor": True,
+                "notifications": []
+            }
         
         return {
             "success": True,
-            "notifications": simplified_notifications,
+            # Simplify the response format for the API
+            "notifications": [notification_summary(n) for n in result["notifications"]],
             "total": result["total"],
             "page": result["page"],
             "limit": result["limit"],
-            "pages": result["pages"]
+            "pages": result["pages"],
+            "next_cursor": result["next_cursor"]
         }
     
     except Exception as e:
-        logging.error(f"Error listing notifications: {str(e)}")
+        logger.error("Error listing notifications: %s", e)
         return {
             "success": False,
             "message": "Error listing notifications",
             "error": str(e),
             "notifications": []
-        }
\ No newline at end of file
+        }
+
+
+"""
+Export notifications matching the filters as NDJSON or CSV, oldest first.
+An async generator of byte chunks for a StreamingResponse: rows are encoded one
+cursor batch at a time, so memory stays flat however many rows match.
+If the client disconnects, the response cancels this generator and the
+repository closes the Mongo cursor.
+"""
+async def export_notifications(format="ndjson", status=None, created_from=None, created_to=None):
+    rows = stream_notifications(filter_query(status, created_from, created_to))
+    chunk = []
+
+    def encode(chunk):
+        if format == "csv":
+            return csv_lines(chunk)
+        return b"".join(chunk)
+
+    try:
+        if format == "csv":
+            yield csv_header()
+
+        async for notification in rows:
+            chunk.append(csv_values(notification) if format == "csv" else ndjson_line(notification))
+
+            if len(chunk) >= EXPORT_BATCH_SIZE:
+                yield encode(chunk)
+                chunk = []
+
+        if chunk:
+            yield encode(chunk)
+
+    except Exception as e:
+        # Headers are already sent; re-raise so the response is cut off rather than silently truncated
+        logger.error("Error exporting notifications: %s", e)
+        raise
+
+    finally:
+        await rows.aclose()
+
+
+"""
+Stream notification events as Server-Sent Events, optionally only some statuses / risk levels.
+"created" is sent when an alert is stored, then an event named after each new status
+(pending, sent, failed, dead_letter). Each carries an id; a client reconnecting with the
+last one it got receives what it missed, or a "resync" event if that is no longer possible
+(it should then reload what it shows). A client too slow to keep up gets an "overflow"
+event and is disconnected, so it cannot hold up the others.
+"""
+async def stream_notification_events(status=None, risk_level=None, last_event_id=None):
+    subscription, resumed = event_hub.subscribe(status, risk_level, last_event_id)
+    last_sent = last_event_id
+
+    try:
+        yield sse_event("ready", {"source": event_hub.stats()["source"]}, retry=SSE_RETRY_MS)
+        if not resumed:
+            yield sse_event("resync", {"message": "Missed events are no longer available; reload and continue from here"})
+
+        while True:
+            events = await subscription.get(SSE_HEARTBEAT)
+
+            if events:
+                yield b"".join(
+                    sse_event(event["event"], {k: v for k, v in event.items() if k not in ("id", "event")}, id=event["id"])
+                    for event in events
+                )
+                last_sent = events[-1]["id"]
+            elif not subscription.closed:
+                yield sse_comment("keep-alive")
+
+            if subscription.closed:
+                if subscription.overflowed:
+                    yield sse_event("overflow", {
+                        "message": "Too far behind; reconnect with Last-Event-ID to catch up",
+                        "last_event_id": last_sent
+                    })
+                return
+
+    finally:
+        event_hub.unsubscribe(subscription)
+
+
+"""
+Get time-bucketed notification stats from the rollups.
+The cost depends on the number of buckets asked for, not on the number of notifications.
+By default the last STATS_DEFAULT_BUCKETS buckets up to now are returned.
+"""
+async def get_notification_stats(granularity="hour", start=None, end=None):
+    try:
+        step = GRANULARITIES[granularity]
+        end = end or bucket_start(datetime.now(), granularity) + step
+        start = start or end - step * STATS_DEFAULT_BUCKETS
+
+        if start >= end or (end - start) / step > STATS_MAX_BUCKETS:
+            return {
+                "success": False,
+                "message": "Invalid time range",
+                "error": f"start must be before end and the range at most {STATS_MAX_BUCKETS} {granularity} buckets",
+                "invalid_range": True
+            }
+
+        buckets = await stats_rollup.query(granularity, start, end)
+
+        return {
+            "success": True,
+            "granularity": granularity,
+            "start": bucket_start(start, granularity),
+            "end": end,
+            "buckets": [stats_bucket(bucket) for bucket in buckets]
+        }
+
+    except Exception as e:
+        logger.error("Error getting notification stats: %s", e)
+        return {
+            "success": False,
+            "message": "Error getting notification stats",
+            "error": str(e)
+        }
@@ -0,0 +1,158 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from datetime import datetime
+from dotenv import load_dotenv # type: ignore
+from ..models.serializers import dumps
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Archive settings
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_COMPRESSLEVEL = int(os.getenv("ARCHIVE_COMPRESSLEVEL", 6))
+
+# Fields written as ISO 8601 strings and parsed back into datetimes on lookup
+DATE_FIELDS = ("created_at", "updated_at", "sent_at", "next_attempt_at", "lease_until")
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    notification_id TEXT PRIMARY KEY,
+    transaction_number TEXT UNIQUE,
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    created_at TEXT
+)
+"""
+
+
+# Parse an archived NDJSON line back into a notification
+def decode(line):
+    notification = json.loads(line)
+    for field in DATE_FIELDS:
+        if isinstance(notification.get(field), str):
+            notification[field] = datetime.fromisoformat(notification[field])
+    return notification
+
+
+"""
+Cold storage for notifications past the retention window, on local disk.
+Notifications are written as gzip-compressed NDJSON, partitioned by the day they
+were created: <directory>/YYYY/MM/DD/notifications-YYYYMMDD-<time>-<pid>.ndjson.gz,
+one new file per day per write (so a file is never appended to, and one being
+written is never seen half-done: it is renamed into place once fsynced).
+A SQLite index (<directory>/index.sqlite3) maps each notification's id and
+transaction_number to its file and line, so a lookup decompresses one small file.
+A notification archived twice (e.g. after a crash before it was marked archived
+in Mongo) is indexed at its latest copy.
+Methods are blocking; call them from a thread.
+"""
+class ArchiveStore():
+
+    def __init__(self, directory=ARCHIVE_DIR, compresslevel=ARCHIVE_COMPRESSLEVEL):
+        self.directory = directory
+        self.compresslevel = compresslevel
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, "index.sqlite3")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(INDEX_SCHEMA)
+        return connection
+
+    # Write notifications (with string _ids); returns the number written
+    def write(self, notifications):
+        days = {}
+        for notification in notifications:
+            days.setdefault(notification["created_at"].date(), []).append(notification)
+
+        rows = []
+        for day, batch in sorted(days.items()):
+            directory = os.path.join(self.directory, f"{day:%Y}", f"{day:%m}", f"{day:%d}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"notifications-{day:%Y%m%d}-{time.time_ns()}-{os.getpid()}.ndjson.gz")
+            relative = os.path.relpath(path, self.directory)
+
+            temporary = f"{path}.tmp"
+            with open(temporary, "wb") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=self.compresslevel) as compressed:
+                    for line, notification in enumerate(batch):
+                        compressed.write(dumps(notification) + b"\n")
+                        rows.append((
+                            notification["_id"],
+                            notification["transaction_number"],
+                            relative,
+                            line,
+                            notification["created_at"].isoformat()
+                        ))
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(temporary, path)
+
+            directory_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?)", rows)
+        finally:
+            connection.close()
+
+        return len(rows)
+
+    # Find an archived notification by ObjectId or transaction number; None if it is not archived
+    def lookup(self, id):
+        if not os.path.exists(self.index_path):
+            return None
+
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT path, line FROM archive WHERE notification_id = ? OR transaction_number = ? LIMIT 1",
+                (id, id)
+            ).fetchone()
+        finally:
+            connection.close()
+
+        if not row:
+            return None
+
+        path, line = row
+        try:
+            with gzip.open(os.path.join(self.directory, path), "rb") as f:
+                for number, content in enumerate(f):
+                    if number == line:
+                        return decode(content)
+        except FileNotFoundError:
+            logger.error("Archive file %s is indexed but missing", path)
+        return None
+
+    # Cheap enough for /health: no scan of the index
+    def stats(self):
+        exists = os.path.exists(self.index_path)
+        return {
+            "directory": self.directory,
+            "index_bytes": os.path.getsize(self.index_path) if exists else 0
+        }
+
+
+# Create instance
+archive_store = ArchiveStore()
+
+
+# Look up an archived notification without blocking the event loop
+async def find_archived(id):
+    return await asyncio.to_thread(archive_store.lookup, id)
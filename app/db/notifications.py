@@ -1,181 +1,1073 @@
 from motor.motor_asyncio import AsyncIOMotorClient # type: ignore
 from bson import ObjectId # type: ignore
-from datetime import datetime 
-import os 
-import logging 
+from pymongo import ReturnDocument, InsertOne, UpdateOne # type: ignore
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError, OperationFailure # type: ignore
+from datetime import datetime, timedelta
+import os
+import json
+import asyncio
+import time
+import base64
+import logging
 from dotenv import load_dotenv # type: ignore
+from .status_cache import status_cache
+from .stats import stats_rollup
+from .schema import to_storage, storage_update, storage_projection, from_storage
+from .write_coalescer import WriteCoalescer, WRITE_COALESCING, WRITE_COALESCE_INTERVAL, WRITE_COALESCE_MAX_BATCH
+from ..services.metrics import mongo_timed
+from ..services.circuit_breaker import mongo_breaker
+from ..services.event_hub import event_hub
+from ..services.telegram_service import RISK_THRESHOLDS, RISK_LEVELS, PRIORITY_AGING
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # MongoDB connection string
 MONGODB_URI = os.getenv("MONGODB_URI")
 MONGODB_DB = os.getenv("MONGODB_DB")
 
-# MongoDB connection
-client = None
-db = None
+# MongoDB client settings (unset values keep the driver defaults)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 100))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", 0))
+MONGODB_MAX_IDLE_TIME_MS = os.getenv("MONGODB_MAX_IDLE_TIME_MS")
+MONGODB_CONNECT_TIMEOUT_MS = os.getenv("MONGODB_CONNECT_TIMEOUT_MS")
+MONGODB_SOCKET_TIMEOUT_MS = os.getenv("MONGODB_SOCKET_TIMEOUT_MS")
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS")
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS")
+# Write concern: "majority", or a number of nodes such as "1"
+MONGODB_WRITE_CONCERN = os.getenv("MONGODB_WRITE_CONCERN")
+MONGODB_JOURNAL = os.getenv("MONGODB_JOURNAL")
 
-# Connect to MongoDB database
-async def connect_to_mongodb():
-    global client, db
-    
-    try:
-        # Connect MongoDB
-        client = AsyncIOMotorClient(MONGODB_URI)
-        db = client[MONGODB_DB]
+# How long the total notification count is reused before asking Mongo again
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 10))
 
-        # Create index for faster lookups 
-        await db.notifications.create_index("transaction_number", unique=True)
+# Fields the list can filter on by equality; each gets a (field, created_at, _id) index
+LIST_EQUALITY_FILTERS = ("status", "risk_level", "merchant", "category")
 
-        logging.info("Connected to MongoDB")
+# Documents fetched per round trip when streaming an export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
 
-    except Exception as e:
-        logging.error(f"Failed to connect to MongoDB: {e}")
-        raise e
+# Fields each API response needs, so reads don't ship the rendered content around
+STATUS_PROJECTION = {
+    "transaction_number": 1,
+    "status": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "sent_at": 1,
+    "error": 1,
+    "fraud_probability": 1,
+    "transaction_amount": 1,
+    "message_id": 1
+}
+LIST_PROJECTION = {
+    "transaction_number": 1,
+    "status": 1,
+    "created_at": 1,
+    "sent_at": 1
+}
+# What the stats rollups and the event hub need to know about a status change
+TRANSITION_PROJECTION = {
+    "transaction_number": 1,
+    "status": 1,
+    "risk_level": 1,
+    "created_at": 1,
+    "sent_at": 1
+}
+# Everything needed to (re)send an alert
+DELIVERY_PROJECTION = {"content": 0}
+# TTL index enforcing the retention window (see ensure_retention_index)
+RETENTION_INDEX = "retention_ttl"
+# Fields cleared when a claimed notification is finished with
+LEASE_RELEASE = {"claimed_by": None, "lease_until": None, "lease_id": None}
+EXPORT_PROJECTION = {
+    "transaction_number": 1,
+    "transaction_amount": 1,
+    "fraud_probability": 1,
+    "category": 1,
+    "merchant": 1,
+    "is_nighttime": 1,
+    "status": 1,
+    "attempts": 1,
+    "error": 1,
+    "message_id": 1,
+    "created_at": 1,
+    "sent_at": 1
+}
 
 
-# Clost the database connection
-async def close_db_connection():
-    global client
-    
-    if client:
-        client.close()
-        logging.info("Closed MongoDB connection")
-    else:
-        logging.warning("No MongoDB connection to close")
-
-# Save notification to the database
-async def save_notification(notification_data):
-    global db
-    if db is None:
-        await connect_to_mongodb()
-    
+# Build AsyncIOMotorClient keyword arguments from the settings above
+def client_options():
+    options = {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE
+    }
+
+    for key, value in (
+        ("maxIdleTimeMS", MONGODB_MAX_IDLE_TIME_MS),
+        ("connectTimeoutMS", MONGODB_CONNECT_TIMEOUT_MS),
+        ("socketTimeoutMS", MONGODB_SOCKET_TIMEOUT_MS),
+        ("serverSelectionTimeoutMS", MONGODB_SERVER_SELECTION_TIMEOUT_MS),
+        ("waitQueueTimeoutMS", MONGODB_WAIT_QUEUE_TIMEOUT_MS)
+    ):
+        if value:
+            options[key] = int(value)
+
+    if MONGODB_WRITE_CONCERN:
+        options["w"] = int(MONGODB_WRITE_CONCERN) if MONGODB_WRITE_CONCERN.isdigit() else MONGODB_WRITE_CONCERN
+    if MONGODB_JOURNAL:
+        options["journal"] = MONGODB_JOURNAL.lower() == "true"
+
+    return options
+
+
+# Query matching a notification by ObjectId or transaction_number in one round trip
+def id_query(id):
+    if ObjectId.is_valid(id) and len(id) == 24:
+        return {"$or": [{"_id": ObjectId(id)}, {"transaction_number": id}]}
+    return {"transaction_number": id}
+
+
+# Build a find() filter for the list and export endpoints.
+# Equality filters take one value or several; ranges are inclusive, except created_to.
+def filter_query(status=None, created_from=None, created_to=None, risk_level=None, merchant=None,
+                 category=None, min_amount=None, max_amount=None, min_probability=None, max_probability=None):
+    query = {}
+
+    for field, value in (("status", status), ("risk_level", risk_level), ("merchant", merchant), ("category", category)):
+        if value:
+            values = [value] if isinstance(value, str) else list(value)
+            query[field] = values[0] if len(values) == 1 else {"$in": values}
+
+    for field, low, high, upper in (
+        ("transaction_amount", min_amount, max_amount, "$lte"),
+        ("fraud_probability", min_probability, max_probability, "$lte"),
+        ("created_at", created_from, created_to, "$lt")
+    ):
+        bounds = {}
+        if low is not None:
+            bounds["$gte"] = low
+        if high is not None:
+            bounds[upper] = high
+        if bounds:
+            query[field] = bounds
+
+    return query
+
+
+# Risk-level filters for claiming due notifications, one pass per level from CRITICAL down.
+# A lower level joins a higher level's pass once it has been due for `aging` seconds per
+# level of difference, so it is not starved; notifications without a known level go last.
+def claim_passes(now, aging=PRIORITY_AGING):
+    for rank in reversed(range(len(RISK_LEVELS))):
+        levels = [{"risk_level": RISK_LEVELS[rank]}]
+        if aging > 0:
+            levels += [
+                {"risk_level": RISK_LEVELS[lower], "next_attempt_at": {"$lte": now - timedelta(seconds=(rank - lower) * aging)}}
+                for lower in range(rank)
+            ]
+        if rank == 0:
+            levels.append({"risk_level": {"$nin": list(RISK_LEVELS)}})
+        yield levels
+
+
+# Encode the position after a document as an opaque cursor token
+def encode_cursor(notification):
+    payload = json.dumps({
+        "t": notification["created_at"].isoformat(),
+        "id": str(notification["_id"])
+    })
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+# Decode a cursor token back into (created_at, ObjectId); raises ValueError if malformed
+def decode_cursor(token):
     try:
-        # Add timestamp
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# The list query for the page after `position` (a decoded cursor), newest first.
+# The redundant $lte bound on created_at lets the index scan start at the cursor
+# even where the planner applies the $or only as a filter.
+def page_query(filters, position):
+    created_at, object_id = position
+    after_position = [
+        {"created_at": {"$lte": created_at}},
+        {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": object_id}}
+        ]}
+    ]
+    return {"$and": ([filters] if filters else []) + after_position}
+
+
+# Every operation goes through the Mongo circuit breaker: those that raise are wrapped in
+# mongo_breaker.guard, those that log and return a fallback check it first and report
+# connection errors to it, so once Mongo is down they all fail fast instead of timing out.
+class NotificationRepository():
+
+    # Initialize the repository; extra keyword arguments go to AsyncIOMotorClient.
+    # With coalesce, create() and update() from concurrent callers are written in shared
+    # bulk_writes (see WriteCoalescer and _write_batch).
+    def __init__(self, uri=MONGODB_URI, db_name=MONGODB_DB, coalesce=WRITE_COALESCING,
+                 coalesce_interval=WRITE_COALESCE_INTERVAL, coalesce_max_batch=WRITE_COALESCE_MAX_BATCH, **options):
+        self.uri = uri
+        self.db_name = db_name
+        self.options = {**client_options(), **options}
+
+        self.client = None
+        self.db = None
+        self._pid = None
+        self._count_cache = (None, 0.0)
+        self.coalescer = WriteCoalescer(self._write_batch, coalesce_interval, coalesce_max_batch) if coalesce else None
+
+    @property
+    def collection(self):
+        return self.db.notifications
+
+    # Connect to MongoDB database
+    async def connect(self):
+        try:
+            # Connect MongoDB
+            self.client = AsyncIOMotorClient(self.uri, **self.options)
+            self.db = self.client[self.db_name]
+            self._pid = os.getpid()
+
+            # Create index for faster lookups
+            await self.collection.create_index("transaction_number", unique=True)
+
+            # Index for the retry sweeper: due retries and expired pending leases
+            await self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+            # The same per risk level, for claiming the highest level first
+            await self.collection.create_index([("risk_level", 1), ("status", 1), ("next_attempt_at", 1)])
+
+            # Index for listing newest first, including keyset (cursor) pagination.
+            # Range filters (amount, fraud_probability, created_at) walk this index too.
+            # Amount and fraud_probability get no index of their own: one led by a range can't
+            # return the list in created_at order, so every page would be sorted in memory.
+            # Walking newest first stops once a page is full, so a page reads about
+            # limit / (share of notifications matching): cheap for broad ranges, a long walk
+            # for a narrow one on its own (a created_at range bounds it).
+            await self.collection.create_index([("created_at", -1), ("_id", -1)])
+
+            # One index per equality filter on the list, each followed by the list sort key,
+            # so any filter combination is an index scan with no in-memory sort
+            for field in LIST_EQUALITY_FILTERS:
+                await self.collection.create_index([(field, 1), ("created_at", -1), ("_id", -1)])
+
+            await self.backfill_risk_levels()
+
+            stats_rollup.bind(self.db)
+            await stats_rollup.create_indexes()
+
+            logger.info("Connected to MongoDB")
+
+        except Exception as e:
+            logger.error("Failed to connect to MongoDB: %s", e)
+            raise e
+
+    # Close the database connection
+    async def close(self):
+        if self.coalescer:
+            await self.coalescer.drain()
+
+        if self.client:
+            self.client.close()
+            self.client = None
+            self.db = None
+            logger.info("Closed MongoDB connection")
+        else:
+            logger.warning("No MongoDB connection to close")
+
+    # Connect lazily; a client inherited through fork is never reused (pymongo is not fork-safe)
+    async def _ensure_connected(self):
+        if self.db is None or self._pid != os.getpid():
+            await self.connect()
+
+    # Create a notification unless one already exists for its transaction_number,
+    # in a single atomic upsert. Returns (notification, created).
+    @mongo_timed("upsert")
+    @mongo_breaker.guard
+    async def create(self, notification_data):
+        await self._ensure_connected()
+
         if "created_at" not in notification_data:
             notification_data["created_at"] = datetime.now()
-        
-        # Insert notification
-        result = await db.notifications.insert_one(notification_data)   
-
-        # Add MongoDB ID to the notification data 
-        notification_data["_id"] = str(result.inserted_id)
-        
-        return notification_data
-    
-    except Exception as e:
-        logging.error(f"Failed to save notification: {str(e)}")
-        raise e
-    
-# Get notification by transaction ID
-async def get_notification_by_txn_id(id):
-    global db
-    if db is None:
-        await connect_to_mongodb()
-    
-    notification = None
-    
-    try:
-        # First try to find by MongoDB ObjectId
-        if len(id) == 24:  # MongoDB ObjectId is 24 hex chars
-            try:
-                notification = await db.notifications.find_one({"_id": ObjectId(id)})
-            except:
-                pass
-        
-        # If not found or not a valid ObjectId, try by transaction_id
-        if not notification:
-            notification = await db.notifications.find_one({"transaction_number": id})
-        
-        # Convert ObjectId to string for easier handling
-        if notification:
+
+        # Coalesced: a plain insert, a duplicate key meaning it already exists
+        if self.coalescer:
+            return await self.coalescer.submit(("insert", notification_data))
+
+        # Choose the _id up front so the upsert can answer with the pre-image:
+        # None means we inserted, anything else is the existing document
+        object_id = ObjectId()
+        transaction_number = notification_data["transaction_number"]
+        fields = {k: v for k, v in to_storage(notification_data).items() if k != "transaction_number"}
+        fields["_id"] = object_id
+
+        try:
+            existing = await self.collection.find_one_and_update(
+                {"transaction_number": transaction_number},
+                {"$setOnInsert": fields},
+                projection={"status": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # Two upserts raced on the unique index and the other one inserted first
+            existing = await self.collection.find_one(
+                {"transaction_number": transaction_number},
+                {"status": 1}
+            )
+
+        if existing is not None:
+            existing["_id"] = str(existing["_id"])
+            existing["transaction_number"] = transaction_number
+            return existing, False
+
+        notification_data["_id"] = str(object_id)
+        stats_rollup.record_created(notification_data)
+        event_hub.notification_created(notification_data)
+        return notification_data, True
+
+    # Save several notifications with a single unordered insert_many
+    # Returns one entry per input: the saved notification, or None and the error
+    @mongo_timed("insert_many")
+    @mongo_breaker.guard
+    async def save_many(self, notifications):
+        await self._ensure_connected()
+
+        if not notifications:
+            return []
+
+        for notification in notifications:
+            if "created_at" not in notification:
+                notification["created_at"] = datetime.now()
+
+        errors = {}
+        documents = [to_storage(notification) for notification in notifications]
+
+        try:
+            # insert_many assigns an _id to every document before writing
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: the other documents were still written
+            for write_error in e.details.get("writeErrors", []):
+                errors[write_error["index"]] = write_error
+        except Exception as e:
+            logger.error("Failed to save notifications: %s", e)
+            raise e
+
+        results = []
+        for index, notification in enumerate(notifications):
+            if index in errors:
+                results.append({
+                    "notification": None,
+                    "duplicate": errors[index].get("code") == 11000,
+                    "error": errors[index].get("errmsg", "Write error")
+                })
+            else:
+                notification["_id"] = str(documents[index]["_id"])
+                stats_rollup.record_created(notification)
+                event_hub.notification_created(notification)
+                results.append({"notification": notification, "duplicate": False, "error": None})
+
+        return results
+
+    # Get existing notifications for a list of transaction numbers in one query
+    @mongo_timed("find_many")
+    @mongo_breaker.guard
+    async def find_by_txn_ids(self, transaction_numbers):
+        await self._ensure_connected()
+
+        if not transaction_numbers:
+            return {}
+
+        cursor = self.collection.find(
+            {"transaction_number": {"$in": list(transaction_numbers)}},
+            {"transaction_number": 1, "status": 1}
+        )
+
+        existing = {}
+        async for notification in cursor:
             notification["_id"] = str(notification["_id"])
-        
-        return notification
-    
-    except Exception as e:
-        logging.error(f"Error getting notification: {str(e)}")
-        return None
-
-
-# Update notification in database
-async def update_notification(id, update_data):
-    global db
-    if db is None:
-        await connect_to_mongodb()
-    
-    try:
-        # Add updated_at timestamp
-        if "updated_at" not in update_data:
-            update_data["updated_at"] = datetime.now()
-        
-        # Try to update by MongoDB ObjectId first
-        if len(id) == 24:  # Check if it looks like an ObjectId
-            try:
-                result = await db.notifications.update_one(
-                    {"_id": ObjectId(id)},
-                    {"$set": update_data}
+            existing[notification["transaction_number"]] = notification
+
+        return existing
+
+    # Get notification by ObjectId or transaction ID
+    @mongo_timed("find_one")
+    async def get(self, id, projection=None):
+        await self._ensure_connected()
+
+        try:
+            mongo_breaker.check()
+            notification = from_storage(await self.collection.find_one(id_query(id), storage_projection(projection)))
+            mongo_breaker.record_success()
+
+            # Convert ObjectId to string for easier handling
+            if notification:
+                notification["_id"] = str(notification["_id"])
+
+            return notification
+
+        except Exception as e:
+            mongo_breaker.observe(e)
+            logger.error("Error getting notification: %s", e)
+            return None
+
+    # Update notification in database and return the updated document.
+    # With lease_id the update only applies while that claim is still held (and releases it);
+    # None is returned if the lease was lost to another dispatcher.
+    @mongo_timed("find_one_and_update")
+    async def update(self, id, update_data, projection=STATUS_PROJECTION, lease_id=None):
+        await self._ensure_connected()
+
+        try:
+            mongo_breaker.check()
+            # Add updated_at timestamp
+            if "updated_at" not in update_data:
+                update_data["updated_at"] = datetime.now()
+
+            if self.coalescer:
+                notification = await self.coalescer.submit(("update", id, update_data, projection, lease_id), key=id)
+                mongo_breaker.record_success()
+                return notification
+
+            query = id_query(id)
+            if lease_id:
+                query = {"$and": [query, {"lease_id": lease_id}]}
+                update_data = {**update_data, **LEASE_RELEASE}
+
+            # Read the pre-image so a status change can be counted in the stats rollups
+            previous = await self.collection.find_one_and_update(
+                query,
+                storage_update(update_data),
+                projection=storage_projection({**projection, **TRANSITION_PROJECTION}) if projection else None,
+                return_document=ReturnDocument.BEFORE
+            )
+            mongo_breaker.record_success()
+
+            if not previous:
+                if lease_id:
+                    logger.warning("Lease %s on notification %s was lost; update not applied", lease_id, id)
+                else:
+                    logger.warning("No notification found to update with ID: %s", id)
+                return None
+
+            previous = from_storage(previous)
+            previous["_id"] = str(previous["_id"])
+            if "status" in update_data:
+                stats_rollup.record_transition(previous, previous.get("status"), update_data["status"], update_data.get("sent_at"))
+                event_hub.status_changed(previous, previous.get("status"), update_data["status"])
+
+            notification = {**previous, **{k: v for k, v in update_data.items() if not projection or k in projection}}
+            status_cache.put(notification)
+            return notification
+
+        except Exception as e:
+            mongo_breaker.observe(e)
+            logger.error("Failed to update notification: %s", e)
+            return None
+
+    # Apply several {"$set": ...} updates by notification _id in one bulk_write
+    # updates is a list of (id, update_data) or (id, update_data, lease_id); like update(),
+    # one with a lease_id only applies while that claim is held (and releases it).
+    # Returns the number of documents modified
+    @mongo_timed("bulk_update")
+    @mongo_breaker.guard
+    async def update_many(self, updates):
+        await self._ensure_connected()
+
+        if not updates:
+            return 0
+
+        now = datetime.now()
+        updates = [(update[0], update[1], update[2] if len(update) > 2 else None) for update in updates]
+        object_ids = [ObjectId(id) for id, _, _ in updates]
+        operations = []
+        for object_id, (_, update_data, lease_id) in zip(object_ids, updates):
+            query = {"_id": object_id}
+            if lease_id:
+                query["lease_id"] = lease_id
+                update_data = {**update_data, **LEASE_RELEASE}
+            operations.append(UpdateOne(query, storage_update({"updated_at": now, **update_data})))
+
+        # Current status, risk level, timestamps and lease of each document, for the stats rollups and events
+        previous = {}
+        if (stats_rollup.enabled or event_hub.publishes_locally) and any("status" in update_data for _, update_data, _ in updates):
+            cursor = self.collection.find({"_id": {"$in": object_ids}}, {**TRANSITION_PROJECTION, "lease_id": 1})
+            previous = {notification["_id"]: notification async for notification in cursor}
+
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            logger.error("Failed to update %s notifications in bulk", len(e.details.get('writeErrors', [])))
+            return e.details.get("nModified", 0)
+
+        for object_id, (_, update_data, lease_id) in zip(object_ids, updates):
+            before = previous.get(object_id)
+            # A fenced update whose lease had been taken over was not applied
+            if before and "status" in update_data and (not lease_id or before.get("lease_id") == lease_id):
+                stats_rollup.record_transition(before, before.get("status"), update_data["status"], update_data.get("sent_at"))
+                event_hub.status_changed(before, before.get("status"), update_data["status"])
+
+        # The new documents were not read back, so drop any cached copies
+        for id, _, _ in updates:
+            status_cache.invalidate(id)
+
+        return result.modified_count
+
+    # Flush a batch of coalesced writes in one unordered bulk_write. Operations are
+    # ("insert", document), answered (notification, created) like create(), and
+    # ("update", id, update_data, projection, lease_id), answered like update().
+    # bulk_write reports no per-document outcome for updates, so the pre-images are read in
+    # one find just before it: they feed the stats rollups and the status cache, and a fenced
+    # update whose pre-image no longer holds the lease is reported as lost (the write itself
+    # is fenced either way). Duplicate inserts are looked up in one find afterwards.
+    @mongo_timed("coalesced_write")
+    async def _write_batch(self, operations):
+        await self._ensure_connected()
+
+        previous = await self._pre_images([operation for operation in operations if operation[0] == "update"])
+
+        requests = []
+        for operation in operations:
+            if operation[0] == "insert":
+                document = operation[1]
+                document["_id"] = ObjectId()
+                requests.append(InsertOne(to_storage(document)))
+            else:
+                _, id, update_data, _, lease_id = operation
+                query = id_query(id)
+                if lease_id:
+                    query = {"$and": [query, {"lease_id": lease_id}]}
+                    update_data = {**update_data, **LEASE_RELEASE}
+                requests.append(UpdateOne(query, storage_update(update_data)))
+
+        errors = {}
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything without an error was still written
+            for write_error in e.details.get("writeErrors", []):
+                errors[write_error["index"]] = write_error
+        except Exception:
+            # Leave the callers' documents as they were handed in
+            for operation in operations:
+                if operation[0] == "insert":
+                    operation[1].pop("_id", None)
+            raise
+
+        duplicates = [
+            operation[1]["transaction_number"] for index, operation in enumerate(operations)
+            if operation[0] == "insert" and errors.get(index, {}).get("code") == 11000
+        ]
+        existing = {}
+        if duplicates:
+            cursor = self.collection.find({"transaction_number": {"$in": duplicates}}, {"transaction_number": 1, "status": 1})
+            existing = {notification["transaction_number"]: notification async for notification in cursor}
+
+        results = []
+        for index, operation in enumerate(operations):
+            error = errors.get(index)
+
+            if operation[0] == "insert":
+                document = operation[1]
+                if error is None:
+                    document["_id"] = str(document["_id"])
+                    stats_rollup.record_created(document)
+                    event_hub.notification_created(document)
+                    results.append((document, True))
+                elif error.get("code") == 11000 and document["transaction_number"] in existing:
+                    del document["_id"]
+                    found = existing[document["transaction_number"]]
+                    found["_id"] = str(found["_id"])
+                    results.append((found, False))
+                else:
+                    del document["_id"]
+                    results.append(WriteError(error.get("errmsg", "Write error"), error.get("code"), error))
+                continue
+
+            _, id, update_data, projection, lease_id = operation
+            if error is not None:
+                logger.error("Failed to update notification %s: %s", id, error.get("errmsg"))
+                results.append(None)
+                continue
+
+            before = previous.get(id)
+            if not before or (lease_id and before.get("lease_id") != lease_id):
+                if lease_id:
+                    logger.warning("Lease %s on notification %s was lost; update not applied", lease_id, id)
+                else:
+                    logger.warning("No notification found to update with ID: %s", id)
+                results.append(None)
+                continue
+
+            if "status" in update_data:
+                stats_rollup.record_transition(before, before.get("status"), update_data["status"], update_data.get("sent_at"))
+                event_hub.status_changed(before, before.get("status"), update_data["status"])
+
+            if lease_id:
+                update_data = {**update_data, **LEASE_RELEASE}
+            if projection:
+                before = {k: v for k, v in before.items() if k in projection or k in ("_id", "status", "created_at", "sent_at")}
+            notification = {**before, **{k: v for k, v in update_data.items() if not projection or k in projection}}
+            status_cache.put(notification)
+            results.append(notification)
+
+        return results
+
+    # Current documents for a batch of coalesced updates, in one find, keyed by the id each update used
+    async def _pre_images(self, updates):
+        if not updates:
+            return {}
+
+        ids = {operation[1] for operation in updates}
+        object_ids = [ObjectId(id) for id in ids if ObjectId.is_valid(id) and len(id) == 24]
+        query = {"$or": [{"_id": {"$in": object_ids}}, {"transaction_number": {"$in": list(ids)}}]}
+
+        # Everything any of the updates will hand back, plus what the rollups and fencing need
+        projection = {**TRANSITION_PROJECTION, "lease_id": 1}
+        for operation in updates:
+            if operation[3] is None:
+                projection = None
+                break
+            projection.update(operation[3])
+
+        previous = {}
+        async for notification in self.collection.find(query, storage_projection(projection)):
+            notification = from_storage(notification)
+            notification["_id"] = str(notification["_id"])
+            for key in (notification["_id"], notification.get("transaction_number")):
+                if key in ids:
+                    previous[key] = notification
+        return previous
+
+    # Atomically claim the next notification that is due for a delivery attempt
+    # (a failed one whose backoff has elapsed, or a pending one whose lease expired).
+    # The claim pushes next_attempt_at forward by lease_seconds so no one else takes it,
+    # and records who holds it (claimed_by) and a fresh lease_id that fences later writes.
+    # Higher risk levels are claimed first (see claim_passes).
+    @mongo_timed("claim_due")
+    async def claim_due(self, lease_seconds, owner=None, aging=PRIORITY_AGING):
+        await self._ensure_connected()
+
+        now = datetime.now()
+        lease_until = now + timedelta(seconds=lease_seconds)
+        lease = {"claimed_by": owner, "lease_until": lease_until, "lease_id": str(ObjectId())}
+
+        try:
+            mongo_breaker.check()
+            notification = None
+            for levels in claim_passes(now, aging):
+                notification = await self.collection.find_one_and_update(
+                    {
+                        "status": {"$in": ["pending", "failed"]},
+                        "next_attempt_at": {"$lte": now},
+                        "$or": levels
+                    },
+                    storage_update({
+                        "status": "pending",
+                        "next_attempt_at": lease_until,
+                        "updated_at": now,
+                        **lease
+                    }),
+                    projection=DELIVERY_PROJECTION,
+                    sort=[("next_attempt_at", 1)],
+                    return_document=ReturnDocument.BEFORE
                 )
-                
-                if result.modified_count > 0:
-                    return await get_notification_by_txn_id(id)
-            except Exception as e:
-                logging.error(f"Error updating by ObjectId: {str(e)}")
-        
-        # Try updating by transaction_id
-        result = await db.notifications.update_one(
-            {"transaction_number": id},
-            {"$set": update_data}
+                if notification:
+                    break
+            mongo_breaker.record_success()
+
+            if notification:
+                # The pre-image tells the stats rollups which status the claim moved it from
+                notification = from_storage(notification)
+                notification["_id"] = str(notification["_id"])
+                stats_rollup.record_transition(notification, notification.get("status"), "pending")
+                event_hub.status_changed(notification, notification.get("status"), "pending")
+                notification.update({
+                    "status": "pending",
+                    "next_attempt_at": lease_until,
+                    "updated_at": now,
+                    **lease
+                })
+                status_cache.put(notification)
+
+            return notification
+
+        except Exception as e:
+            mongo_breaker.observe(e)
+            logger.error("Error claiming due notification: %s", e)
+            return None
+
+    # Extend a claim that is still held; False means the lease expired and was taken over
+    @mongo_timed("renew_lease")
+    @mongo_breaker.guard
+    async def renew_lease(self, id, lease_id, lease_seconds):
+        await self._ensure_connected()
+
+        now = datetime.now()
+        lease_until = now + timedelta(seconds=lease_seconds)
+        result = await self.collection.update_one(
+            {"_id": ObjectId(id), "lease_id": lease_id, "status": "pending", "lease_until": {"$gt": now}},
+            {"$set": {"lease_until": lease_until, "next_attempt_at": lease_until}}
         )
-        
-        if result.modified_count > 0:
-            return await get_notification_by_txn_id(id)
-        
-        logging.warning(f"No notification found to update with ID: {id}")
-        return None
-        
-    except Exception as e:
-        logging.error(f"Failed to update notification: {str(e)}")
-        return None
-    
-
-# Get all notifications with pagination
-async def get_notifications(page=1, limit=10):
-    """Get all notifications with pagination"""
-    global db
-    if db is None:
-        await connect_to_mongodb()
-    
-    try:
-        # Calculate skip value for pagination
-        skip = (page - 1) * limit
-        
-        # Get notifications with pagination, sorted by newest first
-        cursor = db.notifications.find().sort("created_at", -1).skip(skip).limit(limit)
+        return result.modified_count == 1
+
+    # Extend several claims held by this process ({id: lease_id}) in one bulk_write, whether
+    # or not they have expired, as long as nobody else has claimed them since.
+    # Returns the ids still held; the others were taken over (or finished elsewhere).
+    @mongo_timed("renew_leases")
+    @mongo_breaker.guard
+    async def renew_leases(self, leases, lease_seconds):
+        await self._ensure_connected()
+
+        if not leases:
+            return set()
+
+        lease_until = datetime.now() + timedelta(seconds=lease_seconds)
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(id), "lease_id": lease_id, "status": "pending"},
+                {"$set": {"lease_until": lease_until, "next_attempt_at": lease_until}}
+            )
+            for id, lease_id in leases.items()
+        ], ordered=False)
+
+        cursor = self.collection.find(
+            {"_id": {"$in": [ObjectId(id) for id in leases]}, "status": "pending"},
+            {"lease_id": 1}
+        )
+        return {
+            str(notification["_id"]) async for notification in cursor
+            if notification.get("lease_id") == leases[str(notification["_id"])]
+        }
+
+    # Move dead-lettered notifications back to pending so the sweeper retries them
+    # With no ids given, every dead letter is requeued
+    @mongo_timed("requeue_dead_letters")
+    @mongo_breaker.guard
+    async def requeue_dead_letters(self, ids=None):
+        await self._ensure_connected()
+
+        query = {"status": "dead_letter"}
+
+        if ids:
+            object_ids = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+            query["$or"] = [
+                {"_id": {"$in": object_ids}},
+                {"transaction_number": {"$in": list(ids)}}
+            ]
+
+        # Collect the dead letters first so exactly these are requeued and counted in the stats
+        requeued = await self.collection.find(query, TRANSITION_PROJECTION).to_list(length=None)
+        if not requeued:
+            return 0
+
+        now = datetime.now()
+        result = await self.collection.update_many(
+            {"_id": {"$in": [notification["_id"] for notification in requeued]}, "status": "dead_letter"},
+            storage_update({
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "updated_at": now,
+                # Back in the hot set until it is done again; an archived copy stays in the archive
+                "archived": None
+            })
+        )
+
+        for notification in requeued:
+            stats_rollup.record_transition(notification, "dead_letter", "pending")
+            event_hub.status_changed(notification, "dead_letter", "pending")
+
+        # Requeues are rare; dropping the whole cache is simpler than finding each entry
+        if result.modified_count:
+            status_cache.clear()
+
+        return result.modified_count
+
+    # Notifications in a final status created before `cutoff` and not yet archived, oldest first
+    @mongo_timed("archive_candidates")
+    @mongo_breaker.guard
+    async def archive_candidates(self, cutoff, limit, statuses):
+        await self._ensure_connected()
+
+        cursor = self.collection.find(
+            {"created_at": {"$lt": cutoff}, "status": {"$in": list(statuses)}, "archived": {"$ne": True}},
+            DELIVERY_PROJECTION
+        ).sort([("created_at", 1), ("_id", 1)]).limit(limit)
+
         notifications = await cursor.to_list(length=limit)
-        
-        # Convert ObjectIds to strings
         for notification in notifications:
+            from_storage(notification)
             notification["_id"] = str(notification["_id"])
-        
-        # Count total documents for pagination metadata
-        total_count = await db.notifications.count_documents({})
-        
-        return {
-            "notifications": notifications,
-            "total": total_count,
-            "page": page,
-            "limit": limit,
-            "pages": (total_count + limit - 1) // limit  # Ceiling division
-        }
-    
-    except Exception as e:
-        logging.error(f"Error getting notifications: {str(e)}")
-        return {
-            "notifications": [],
-            "total": 0,
-            "page": page,
-            "limit": limit,
-            "pages": 0
-        }
\ No newline at end of file
+        return notifications
+
+    # Flag archived notifications, which lets the retention TTL index expire them.
+    # One whose status changed since it was read is left alone (and archived again later).
+    @mongo_timed("mark_archived")
+    @mongo_breaker.guard
+    async def mark_archived(self, ids, statuses):
+        await self._ensure_connected()
+
+        result = await self.collection.update_many(
+            {"_id": {"$in": [ObjectId(i) for i in ids]}, "status": {"$in": list(statuses)}},
+            {"$set": {"archived": True}}
+        )
+        return result.modified_count
+
+    # TTL index expiring archived notifications `seconds` after they were created.
+    # Partial on archived, so a notification that has not been archived is never deleted.
+    @mongo_timed("ensure_retention_index")
+    @mongo_breaker.guard
+    async def ensure_retention_index(self, seconds):
+        await self._ensure_connected()
+
+        seconds = int(seconds)
+        try:
+            await self.collection.create_index(
+                "created_at",
+                name=RETENTION_INDEX,
+                expireAfterSeconds=seconds,
+                partialFilterExpression={"archived": True}
+            )
+        except OperationFailure as e:
+            # 85/86: the index exists with another window; change it in place
+            if e.code not in (85, 86):
+                raise
+            await self.db.command({
+                "collMod": self.collection.name,
+                "index": {"name": RETENTION_INDEX, "expireAfterSeconds": seconds}
+            })
+            logger.info("Retention window changed to %ss", seconds)
+
+    # Seconds after which the retention TTL index expires notifications, or None without one
+    @mongo_timed("retention_window")
+    @mongo_breaker.guard
+    async def retention_window(self):
+        await self._ensure_connected()
+
+        index = (await self.collection.index_information()).get(RETENTION_INDEX)
+        return index.get("expireAfterSeconds") if index else None
+
+    # Total number of notifications, from collection metadata and cached for a few seconds
+    @mongo_timed("count")
+    @mongo_breaker.guard
+    async def total_count(self):
+        await self._ensure_connected()
+
+        value, expires = self._count_cache
+        if value is not None and time.monotonic() < expires:
+            return value
+
+        value = await self.collection.estimated_document_count()
+        self._count_cache = (value, time.monotonic() + COUNT_CACHE_TTL)
+        return value
+
+    # Number of notifications matching a filter
+    @mongo_timed("count_documents")
+    @mongo_breaker.guard
+    async def count(self, query):
+        await self._ensure_connected()
+        return await self.collection.count_documents(query)
+
+    # Round trip to the server; used to probe whether an open breaker can close
+    @mongo_timed("ping")
+    @mongo_breaker.guard
+    async def ping(self):
+        await self._ensure_connected()
+        await self.db.command("ping")
+        return True
+
+    # Set risk_level on notifications stored before it was recorded; a no-op once done
+    async def backfill_risk_levels(self):
+        upper = None
+        for level, threshold in RISK_THRESHOLDS:
+            probability = {"$gte": threshold}
+            if upper is not None:
+                probability["$lt"] = upper
+            result = await self.collection.update_many(
+                {"risk_level": {"$exists": False}, "fraud_probability": probability},
+                {"$set": {"risk_level": level}}
+            )
+            if result.modified_count:
+                logger.info("Backfilled risk_level=%s on %s notifications", level, result.modified_count)
+            upper = threshold
+
+    # Get notifications matching `query` (see filter_query), newest first.
+    # Pass `after` (a cursor token) for keyset pagination, otherwise `page` is used.
+    # With include_total False no count is taken and total/pages are None.
+    @mongo_timed("list")
+    async def list(self, page=1, limit=10, after=None, include_total=True, query=None, projection=LIST_PROJECTION):
+        await self._ensure_connected()
+
+        # Validate the cursor before querying so a bad token is reported as such
+        position = decode_cursor(after) if after else None
+
+        try:
+            mongo_breaker.check()
+            # (created_at, _id) gives a stable order and is served by the compound index
+            sort = [("created_at", -1), ("_id", -1)]
+
+            filters = query or {}
+
+            if position:
+                cursor = self.collection.find(page_query(filters, position), projection).sort(sort).limit(limit)
+            else:
+                # Calculate skip value for pagination
+                skip = (page - 1) * limit
+                cursor = self.collection.find(filters, projection).sort(sort).skip(skip).limit(limit)
+
+            notifications = await cursor.to_list(length=limit)
+            mongo_breaker.record_success()
+
+            next_cursor = encode_cursor(notifications[-1]) if len(notifications) == limit else None
+
+            # Convert ObjectIds to strings
+            for notification in notifications:
+                from_storage(notification)
+                notification["_id"] = str(notification["_id"])
+
+            # Count total documents for pagination metadata; a filtered count is exact
+            # (and served by the same indexes), an unfiltered one comes from metadata
+            total_count = None
+            if include_total:
+                total_count = await self.count(filters) if filters else await self.total_count()
+
+            return {
+                "notifications": notifications,
+                "total": total_count,
+                "page": None if position else page,
+                "limit": limit,
+                "pages": (total_count + limit - 1) // limit if total_count is not None else None,  # Ceiling division
+                "next_cursor": next_cursor
+            }
+
+        except Exception as e:
+            mongo_breaker.observe(e)
+            logger.error("Error getting notifications: %s", e)
+            return {
+                "notifications": [],
+                "total": 0,
+                "page": page,
+                "limit": limit,
+                "pages": 0,
+                "next_cursor": None
+            }
+
+    # Iterate over matching notifications, oldest first, without holding them in memory.
+    # The driver fetches batch_size documents per round trip; the server cursor is
+    # closed when iteration ends, fails or is abandoned (e.g. the client disconnects).
+    async def stream(self, query=None, batch_size=EXPORT_BATCH_SIZE, projection=EXPORT_PROJECTION):
+        await self._ensure_connected()
+
+        cursor = self.collection.find(query or {}, storage_projection(projection))
+        cursor = cursor.sort([("created_at", 1), ("_id", 1)]).batch_size(batch_size)
+
+        try:
+            async for notification in cursor:
+                notification = from_storage(notification)
+                notification["_id"] = str(notification["_id"])
+                yield notification
+        finally:
+            # Shielded so a cancelled request still releases the server-side cursor
+            await asyncio.shield(cursor.close())
+
+
+# Shared repository for the application
+repository = NotificationRepository()
+
+
+# Module-level helpers used by the controllers and services
+
+# Connect to MongoDB database
+async def connect_to_mongodb():
+    await repository.connect()
+
+
+# Close the database connection
+async def close_db_connection():
+    await repository.close()
+
+
+async def create_notification(notification_data):
+    return await repository.create(notification_data)
+
+
+async def save_notifications(notifications):
+    return await repository.save_many(notifications)
+
+
+async def get_notifications_by_txn_ids(transaction_numbers):
+    return await repository.find_by_txn_ids(transaction_numbers)
+
+
+async def get_notification_by_txn_id(id, projection=None):
+    return await repository.get(id, projection)
+
+
+async def update_notification(id, update_data, lease_id=None):
+    return await repository.update(id, update_data, lease_id=lease_id)
+
+
+async def update_notifications(updates):
+    return await repository.update_many(updates)
+
+
+async def claim_due_notification(lease_seconds, owner=None):
+    return await repository.claim_due(lease_seconds, owner)
+
+
+async def renew_notification_lease(id, lease_id, lease_seconds):
+    return await repository.renew_lease(id, lease_id, lease_seconds)
+
+
+async def renew_notification_leases(leases, lease_seconds):
+    return await repository.renew_leases(leases, lease_seconds)
+
+
+async def requeue_dead_letters(ids=None):
+    return await repository.requeue_dead_letters(ids)
+
+
+async def get_archive_candidates(cutoff, limit, statuses):
+    return await repository.archive_candidates(cutoff, limit, statuses)
+
+
+async def mark_notifications_archived(ids, statuses):
+    return await repository.mark_archived(ids, statuses)
+
+
+async def ensure_retention_index(seconds):
+    return await repository.ensure_retention_index(seconds)
+
+
+async def get_notifications(page=1, limit=10, after=None, include_total=True, query=None):
+    return await repository.list(page, limit, after=after, include_total=include_total, query=query)
+
+
+async def ping_database():
+    return await repository.ping()
+
+
+# Start publishing notification events, from a change stream if the server has them
+async def start_notification_events():
+    await repository._ensure_connected()
+    await event_hub.start(repository.collection)
+
+
+def write_coalescer_stats():
+    if not repository.coalescer:
+        return {"enabled": False}
+    return {"enabled": True, **repository.coalescer.stats()}
+
+
+def stream_notifications(query=None, batch_size=EXPORT_BATCH_SIZE):
+    return repository.stream(query, batch_size=batch_size)
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+from bson import BSON # type: ignore
+from pymongo import UpdateOne # type: ignore
+from dotenv import load_dotenv # type: ignore
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Format new notification documents are written in: 2 is the compact format below,
+# 1 the original one (for a rolling deploy, while older instances still read the collection)
+NOTIFICATION_SCHEMA_VERSION = int(os.getenv("NOTIFICATION_SCHEMA_VERSION", 2))
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", 1000))
+
+# Short stored names for fields that are read back but never queried, sorted or indexed
+# (renaming those would need every query to know both formats)
+COMPACT_NAMES = {
+    "is_nighttime": "night",
+    "transaction_location": "loc",
+    "attempts": "att",
+    "error": "err",
+    "message_id": "mid",
+    "rate_limit_wait": "wait",
+    "digest_size": "dsz"
+}
+LONG_NAMES = {short: long for long, short in COMPACT_NAMES.items()}
+
+# Not stored in the compact format: content is rendered again on demand from the alert
+# fields, failed_at is the updated_at of a failed notification
+DROPPED_FIELDS = ("content", "failed_at")
+
+
+# Telegram message ids are integers; store them as one rather than as a string
+def compact_value(field, value):
+    if field == "message_id" and isinstance(value, str) and value.isdigit() and len(value) < 19:
+        return int(value)
+    return value
+
+
+"""
+Storage format of notification documents.
+
+Version 1 (the original) stores every field under its API name, the rendered
+Telegram message (content), failed_at, and None for anything unset.
+Version 2 ("v": 2) stores only the alert inputs and delivery metadata: fields
+that are only ever read back get short names (COMPACT_NAMES), None values are
+left out (and $unset when an update clears them), content and failed_at are not
+stored and numeric message ids are stored as integers. Queried fields keep their
+names and types, so queries and indexes serve both versions alike.
+
+Documents are converted with to_storage() (the document to insert) and
+storage_update() on the way in, and from_storage() on the way out, which reads
+either version (and documents of version 1 since updated in the compact way).
+"""
+def to_storage(notification, version=NOTIFICATION_SCHEMA_VERSION):
+    if version < 2:
+        return notification
+
+    stored = {"v": 2}
+    for field, value in notification.items():
+        if field in DROPPED_FIELDS or value is None:
+            continue
+        stored[COMPACT_NAMES.get(field, field)] = compact_value(field, value)
+    return stored
+
+
+# Update document for setting `fields` (API names) on a stored notification
+def storage_update(fields, version=NOTIFICATION_SCHEMA_VERSION):
+    if version < 2:
+        return {"$set": fields}
+
+    set_fields = {}
+    unset_fields = {}
+    for field, value in fields.items():
+        if field in DROPPED_FIELDS:
+            unset_fields[field] = ""
+            continue
+
+        short = COMPACT_NAMES.get(field)
+        if short:
+            # A document written in the original format may still have the long name
+            unset_fields[field] = ""
+
+        if value is None:
+            unset_fields[short or field] = ""
+        else:
+            set_fields[short or field] = compact_value(field, value)
+
+    update = {}
+    if set_fields:
+        update["$set"] = set_fields
+    if unset_fields:
+        update["$unset"] = unset_fields
+    return update
+
+
+# Projection that fetches `projection`'s fields in either format
+def storage_projection(projection):
+    if not projection or not any(value for value in projection.values()):
+        return projection
+
+    stored = dict(projection)
+    for field, value in projection.items():
+        if field in COMPACT_NAMES and value:
+            stored[COMPACT_NAMES[field]] = value
+    return stored
+
+
+# Read adapter: a stored document (either version) as the notification the code expects
+def from_storage(document):
+    if not document:
+        return document
+
+    document.pop("v", None)
+    for short, long in LONG_NAMES.items():
+        if short in document:
+            document[long] = document.pop(short)
+
+    if isinstance(document.get("message_id"), int):
+        document["message_id"] = str(document["message_id"])
+    return document
+
+
+# Update that rewrites one stored document in the compact format, or None if it already is
+def migration_update(document):
+    if document.get("v") == 2:
+        return None
+
+    set_fields = {"v": 2}
+    unset_fields = {}
+    for field, value in document.items():
+        if field == "_id":
+            continue
+        if field in DROPPED_FIELDS or value is None:
+            unset_fields[field] = ""
+        elif field in COMPACT_NAMES:
+            unset_fields[field] = ""
+            set_fields[COMPACT_NAMES[field]] = compact_value(field, value)
+
+    update = {"$set": set_fields}
+    if unset_fields:
+        update["$unset"] = unset_fields
+    return update
+
+
+"""
+Rewrite every notification not yet in the compact format, batch_size at a time.
+Each rewrite only applies if the document has not been updated since it was read
+(same updated_at); those that have are skipped and picked up by the next run.
+Safe to run while the service is up, and to run again.
+"""
+async def migrate(collection, batch_size=MIGRATION_BATCH_SIZE, dry_run=False):
+    migrated = 0
+    skipped = 0
+    last_id = None
+
+    while True:
+        query = {"v": {"$ne": 2}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        documents = await collection.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not documents:
+            break
+        last_id = documents[-1]["_id"]
+
+        operations = [
+            UpdateOne({"_id": document["_id"], "updated_at": document.get("updated_at")}, update)
+            for document in documents
+            for update in (migration_update(document),) if update
+        ]
+        if dry_run or not operations:
+            migrated += len(operations)
+            continue
+
+        result = await collection.bulk_write(operations, ordered=False)
+        migrated += result.modified_count
+        skipped += len(operations) - result.matched_count
+        logger.info("Migrated %s notifications so far", migrated)
+
+    return {"migrated": migrated, "skipped": skipped}
+
+
+# Document and index sizes of the collection, and BSON bytes per document by format
+# (measured on a sample, since collStats does not tell the formats apart)
+async def size_report(collection, sample=1000):
+    report = {}
+
+    try:
+        stats = await collection.database.command("collStats", collection.name)
+        report.update({
+            "count": stats.get("count"),
+            "size_bytes": stats.get("size"),
+            "avg_document_bytes": stats.get("avgObjSize"),
+            "storage_bytes": stats.get("storageSize"),
+            "total_index_bytes": stats.get("totalIndexSize"),
+            "index_bytes": stats.get("indexSizes")
+        })
+    except Exception as e:
+        report["collstats_error"] = str(e)
+
+    sizes = {}
+    async for document in collection.find().sort("_id", -1).limit(sample):
+        version = "v2" if document.get("v") == 2 else "v1"
+        sizes.setdefault(version, []).append(len(BSON.encode(document)))
+
+    report["sampled_bytes_per_document"] = {
+        version: {"documents": len(values), "avg": round(sum(values) / len(values), 1), "max": max(values)}
+        for version, values in sorted(sizes.items())
+    }
+    return report
+
+
+"""
+Compact the stored notifications, or report their size:
+    python -m app.db.schema report
+    python -m app.db.schema migrate [--dry-run]
+migrate prints the size report before and after. WiredTiger keeps the freed space
+for reuse; run the server's compact command to hand it back to the filesystem.
+"""
+async def schema_command(command, dry_run=False):
+    from .notifications import repository
+
+    await repository.connect()
+    try:
+        if command == "report":
+            return await size_report(repository.collection)
+
+        before = await size_report(repository.collection)
+        result = await migrate(repository.collection, dry_run=dry_run)
+        after = await size_report(repository.collection)
+        return {"before": before, **result, "dry_run": dry_run, "after": after}
+    finally:
+        await repository.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    arguments = sys.argv[1:]
+    if not arguments or arguments[0] not in ("report", "migrate") or set(arguments[1:]) - {"--dry-run"}:
+        print("Usage: python -m app.db.schema report | migrate [--dry-run]")
+        sys.exit(2)
+
+    result = asyncio.run(schema_command(arguments[0], dry_run="--dry-run" in arguments))
+    print(json.dumps(result, indent=2, default=str))
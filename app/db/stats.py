@@ -0,0 +1,336 @@
+import os
+import sys
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from pymongo import UpdateOne, ReplaceOne # type: ignore
+from pymongo.errors import BulkWriteError # type: ignore
+from dotenv import load_dotenv # type: ignore
+from ..services.telegram_service import telegram_service
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Stats settings
+STATS_ENABLED = os.getenv("STATS_ENABLED", "true").lower() == "true"
+# Increments are merged in memory and written as one bulk of $inc upserts this often
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", 1))
+# Largest number of buckets a single stats query may return
+STATS_MAX_BUCKETS = int(os.getenv("STATS_MAX_BUCKETS", 1500))
+
+# Seconds within the retention window that a rebuild leaves alone, since the oldest
+# notifications in it can expire while the rebuild runs
+STATS_REBUILD_MARGIN = float(os.getenv("STATS_REBUILD_MARGIN", 3600))
+
+STATS_COLLECTION = "notification_stats"
+
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1)
+}
+
+# Delivery latency (sent_at - created_at) bucket upper bounds in seconds; counts are not cumulative
+LATENCY_BUCKETS = (1, 5, 10, 30, 60, 300, 900, 3600)
+
+
+# Start of the bucket containing a timestamp
+def bucket_start(timestamp, granularity):
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_id(granularity, start):
+    return f"{granularity}:{start.isoformat()}"
+
+
+def latency_label(seconds):
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+# Values become field names, so keep them free of "." and a leading "$"
+def field_key(value):
+    if value is None or value == "":
+        return "unknown"
+    return str(value).replace(".", "_").lstrip("$") or "unknown"
+
+
+def risk_level_of(notification):
+    return notification.get("risk_level") or telegram_service.get_risk_level(notification.get("fraud_probability", 0))
+
+
+"""
+Rollups of notification activity per minute, hour and day.
+Each rollup document describes the notifications *created* in its bucket:
+total, amount_sum, counts by risk_level and category, the current status
+distribution, and how long the sent ones took to go out. Counters are
+kept up to date with $inc as notifications are created and change status,
+so the numbers always equal what `rebuild` computes from the raw documents
+(those still stored: see the retention window in rebuild_command).
+"""
+class StatsRollup():
+
+    def __init__(self, enabled=STATS_ENABLED, flush_interval=STATS_FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.db = None
+        self._pending = {}
+        self._task = None
+
+        self.flushes = 0
+        self.flush_errors = 0
+
+    # Attach to the application database (called by the repository on connect)
+    def bind(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db[STATS_COLLECTION]
+
+    async def create_indexes(self):
+        await self.collection.create_index([("granularity", 1), ("start", 1)])
+
+    def _inc(self, created_at, fields):
+        if not self.enabled or created_at is None:
+            return
+
+        for granularity in GRANULARITIES:
+            start = bucket_start(created_at, granularity)
+            increments = self._pending.setdefault((granularity, start), {})
+            for field, amount in fields.items():
+                increments[field] = increments.get(field, 0) + amount
+
+    # Count a newly stored notification
+    def record_created(self, notification):
+        fields = {
+            "total": 1,
+            "amount_sum": notification.get("transaction_amount") or 0,
+            f"status.{field_key(notification.get('status'))}": 1,
+            f"risk_level.{field_key(risk_level_of(notification))}": 1,
+            f"category.{field_key(notification.get('category'))}": 1
+        }
+        fields.update(self._delivery_fields(notification))
+        self._inc(notification.get("created_at"), fields)
+
+    # Move a notification (its pre-image) from one status to another.
+    # Becoming sent records the delivery latency; leaving sent takes it back out.
+    def record_transition(self, notification, old_status, new_status, sent_at=None):
+        if old_status == new_status:
+            return
+
+        fields = {
+            f"status.{field_key(old_status)}": -1,
+            f"status.{field_key(new_status)}": 1
+        }
+        if old_status == "sent":
+            for field, amount in self._delivery_fields(notification).items():
+                fields[field] = -amount
+        if new_status == "sent":
+            fields.update(self._delivery_fields({**notification, "status": "sent", "sent_at": sent_at}))
+        self._inc(notification.get("created_at"), fields)
+
+    def _delivery_fields(self, notification):
+        sent_at = notification.get("sent_at")
+        created_at = notification.get("created_at")
+        if notification.get("status") != "sent" or not sent_at or not created_at:
+            return {}
+
+        seconds = max((sent_at - created_at).total_seconds(), 0.0)
+        return {f"latency.{latency_label(seconds)}": 1, "latency_sum": seconds, "sent": 1}
+
+    # Write the merged increments as one bulk of upserts
+    async def flush(self):
+        if not self._pending or self.db is None:
+            return
+
+        pending, self._pending = self._pending, {}
+        operations = [
+            UpdateOne(
+                {"_id": bucket_id(granularity, start)},
+                {"$inc": increments, "$setOnInsert": {"granularity": granularity, "start": start}},
+                upsert=True
+            )
+            for (granularity, start), increments in pending.items()
+        ]
+
+        keys = list(pending)
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+            self.flushes += 1
+        except BulkWriteError as e:
+            # Unordered: only the reported operations failed; retry just those next time
+            self.flush_errors += 1
+            self._requeue(pending, [keys[error["index"]] for error in e.details.get("writeErrors", [])])
+            logger.error("Failed to flush %s stats buckets", len(e.details.get('writeErrors', [])))
+        except Exception as e:
+            # Keep the increments for the next flush rather than losing them
+            self.flush_errors += 1
+            self._requeue(pending, keys)
+            logger.error("Failed to flush stats rollups: %s", e)
+
+    def _requeue(self, pending, keys):
+        for key in keys:
+            merged = self._pending.setdefault(key, {})
+            for field, amount in pending[key].items():
+                merged[field] = merged.get(field, 0) + amount
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Stop the flusher and write whatever is left
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # Rollup buckets in [start, end), oldest first; buckets with no activity are returned as zeros
+    async def query(self, granularity, start, end):
+        step = GRANULARITIES[granularity]
+        first = bucket_start(start, granularity)
+
+        cursor = self.collection.find(
+            {"granularity": granularity, "start": {"$gte": first, "$lt": end}},
+            {"_id": 0, "granularity": 0}
+        ).sort("start", 1)
+        found = {doc["start"]: doc async for doc in cursor}
+
+        buckets = []
+        current = first
+        while current < end:
+            buckets.append(found.get(current) or {"start": current})
+            current += step
+        return buckets
+
+    # Recompute the rollups from the raw notifications and write them over the stored ones.
+    # With `since`, only buckets starting at or after it are rebuilt (the raw notifications
+    # before it may have expired); older buckets are left as they are.
+    async def rebuild(self, notifications, since=None, batch_size=1000):
+        saved_enabled, self.enabled = self.enabled, True
+        saved_pending, self._pending = self._pending, {}
+
+        try:
+            cursor = notifications.find({"created_at": {"$gte": since}} if since else {}, {
+                "status": 1, "risk_level": 1, "fraud_probability": 1, "category": 1,
+                "transaction_amount": 1, "created_at": 1, "sent_at": 1
+            }).batch_size(batch_size)
+
+            count = 0
+            async for notification in cursor:
+                self.record_created(notification)
+                count += 1
+
+            rebuilt, self._pending = self._pending, {}
+        finally:
+            self.enabled = saved_enabled
+            self._pending = saved_pending
+
+        # A bucket that starts before `since` only saw part of its notifications
+        rebuilt = {
+            (granularity, start): increments
+            for (granularity, start), increments in rebuilt.items()
+            if since is None or start >= since
+        }
+
+        operations = [
+            ReplaceOne(
+                {"_id": bucket_id(granularity, start)},
+                {"granularity": granularity, "start": start, **expand(increments)},
+                upsert=True
+            )
+            for (granularity, start), increments in rebuilt.items()
+        ]
+        for i in range(0, len(operations), batch_size):
+            await self.collection.bulk_write(operations[i:i + batch_size], ordered=False)
+
+        # Buckets in the rebuilt range that no longer have any notifications
+        kept = {bucket_id(granularity, start) for granularity, start in rebuilt}
+        stale = [
+            document["_id"]
+            async for document in self.collection.find({"start": {"$gte": since}} if since else {}, {"_id": 1})
+            if document["_id"] not in kept
+        ]
+        for i in range(0, len(stale), batch_size):
+            await self.collection.delete_many({"_id": {"$in": stale[i:i + batch_size]}})
+
+        return {"notifications": count, "buckets": len(operations), "removed": len(stale), "since": since}
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending_buckets": len(self._pending),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors
+        }
+
+
+# Turn {"status.sent": 3} into {"status": {"sent": 3}}
+def expand(increments):
+    document = {}
+    for field, amount in increments.items():
+        target = document
+        *parents, leaf = field.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = amount
+    return document
+
+
+# Create instance
+stats_rollup = StatsRollup()
+
+
+"""
+Rebuild the rollups from the raw notifications:
+    python -m app.db.stats rebuild
+Live increments flushed while a rebuild runs are replaced by the rebuilt numbers.
+When the retention TTL index exists, notifications older than its window may have
+expired: only buckets starting within the window (less STATS_REBUILD_MARGIN, for
+what expires while the rebuild runs) are rebuilt, and older ones are kept.
+"""
+async def rebuild_command():
+    from .notifications import repository
+
+    await repository.connect()
+    stats_rollup.bind(repository.db)
+    try:
+        since = None
+        window = await repository.retention_window()
+        if window is not None:
+            since = datetime.now() - timedelta(seconds=window - STATS_REBUILD_MARGIN)
+            logger.info("Notifications expire after %ss; keeping stats buckets before %s", window, since)
+
+        result = await stats_rollup.rebuild(repository.collection, since=since)
+        logger.info("Rebuilt %s stats buckets from %s notifications, removed %s empty ones",
+                    result['buckets'], result['notifications'], result['removed'])
+    finally:
+        await repository.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.db.stats rebuild")
+        sys.exit(2)
+
+    asyncio.run(rebuild_command())
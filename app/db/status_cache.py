@@ -0,0 +1,156 @@
+import os
+import time
+from datetime import datetime
+from collections import OrderedDict
+from dotenv import load_dotenv # type: ignore
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Status cache settings
+STATUS_CACHE_ENABLED = os.getenv("STATUS_CACHE_ENABLED", "true").lower() == "true"
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", 10000))
+# Pending/failed/dead-lettered notifications can still change, so they are only reused briefly.
+# 0 doesn't cache them at all: with several workers, another one may already have sent
+# the notification, and it only clears its own cache (app.server sets 0 for more than one)
+STATUS_CACHE_PENDING_TTL = float(os.getenv("STATUS_CACHE_PENDING_TTL", 2))
+STATUS_CACHE_TERMINAL_TTL = float(os.getenv("STATUS_CACHE_TERMINAL_TTL", 300))
+
+# Statuses that never change again. Not dead_letter: a requeue moves it back to pending,
+# and only clears the cache of the process that handled it, not the other workers'
+TERMINAL_STATUSES = ("sent",)
+
+
+class CacheBackend():
+    """Storage interface for StatusCache, so a shared cache can be plugged in later."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_size=STATUS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class StatusCache():
+    """
+    Notification documents keyed by both their ObjectId and transaction_number.
+    Writers refresh entries with put(); a reader's put() never replaces a newer entry.
+    """
+
+    def __init__(self, backend=None, enabled=STATUS_CACHE_ENABLED,
+                 pending_ttl=STATUS_CACHE_PENDING_TTL, terminal_ttl=STATUS_CACHE_TERMINAL_TTL):
+        self.backend = backend or LRUCache()
+        self.enabled = enabled
+        self.pending_ttl = pending_ttl
+        self.terminal_ttl = terminal_ttl
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id):
+        if not self.enabled:
+            return None
+
+        notification = self.backend.get(id)
+        if notification is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return notification
+
+    # Cache a notification document under both of its keys
+    def put(self, notification):
+        if not self.enabled or not notification:
+            return
+
+        # Don't let a slower reader overwrite what a writer just stored
+        cached = self.backend.get(notification["_id"])
+        if cached is not None and _version(cached) > _version(notification):
+            return
+
+        ttl = self.terminal_ttl if notification.get("status") in TERMINAL_STATUSES else self.pending_ttl
+        if ttl <= 0:
+            self.invalidate(notification)
+            return
+
+        value = dict(notification)
+        self.backend.set(notification["_id"], value, ttl)
+        if notification.get("transaction_number"):
+            self.backend.set(notification["transaction_number"], value, ttl)
+
+    # Drop a notification (or a notification id) under both of its keys
+    def invalidate(self, notification):
+        if isinstance(notification, str):
+            notification = self.backend.get(notification) or {"_id": notification}
+
+        self.backend.delete(notification["_id"])
+        if notification.get("transaction_number"):
+            self.backend.delete(notification["transaction_number"])
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Last modification time of a notification document
+def _version(notification):
+    return notification.get("updated_at") or notification.get("created_at") or datetime.min
+
+
+# Create instance
+status_cache = StatusCache()
@@ -0,0 +1,140 @@
+import os
+import asyncio
+import logging
+from dotenv import load_dotenv # type: ignore
+from ..services.metrics import MONGO_COALESCED_BATCH_SIZE
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Write coalescing settings
+WRITE_COALESCING = os.getenv("WRITE_COALESCING", "false").lower() == "true"
+# How long the first write of a batch waits for others to join it
+WRITE_COALESCE_INTERVAL = float(os.getenv("WRITE_COALESCE_INTERVAL", 0.002))
+# A batch this large is flushed at once instead of waiting out the interval
+WRITE_COALESCE_MAX_BATCH = int(os.getenv("WRITE_COALESCE_MAX_BATCH", 500))
+
+
+"""
+Collects writes from concurrent coroutines and hands them to `flush` in batches:
+whatever arrives within `interval` of the first write, or `max_batch` writes,
+whichever comes first. flush(operations) returns one result per operation, in order,
+or an exception instance for an operation that failed on its own; if flush raises,
+every caller in the batch gets that error.
+Writes with the same key (e.g. two updates to one document) are never in the same
+batch, and are flushed in the order they were submitted: a repeated key flushes the
+current batch, and a batch with a key that an earlier batch is still flushing waits
+for that flush to finish.
+A caller that stops waiting (is cancelled) does not take its write out of the batch.
+"""
+class WriteCoalescer():
+
+    def __init__(self, flush, interval=WRITE_COALESCE_INTERVAL, max_batch=WRITE_COALESCE_MAX_BATCH):
+        self.flush = flush
+        self.interval = interval
+        self.max_batch = max_batch
+
+        self._pending = []
+        self._keys = set()
+        self._timer = None
+        # Flushes the pending batch has to wait for, and the flush in flight for each key
+        self._after = set()
+        self._flushing = {}
+        self._flushes = set()
+
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+
+    # Queue a write and wait for its own result
+    async def submit(self, operation, key=None):
+        if key is not None:
+            if key in self._keys:
+                self._seal()
+            if key in self._flushing:
+                self._after.add(self._flushing[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((operation, future))
+        if key is not None:
+            self._keys.add(key)
+
+        if len(self._pending) >= self.max_batch:
+            self._seal()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._seal)
+
+        return await future
+
+    # Close the current batch and start flushing it; returns the flush task
+    def _seal(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, keys, after = self._pending, self._keys, self._after
+        self._pending, self._keys, self._after = [], set(), set()
+        if not batch:
+            return None
+
+        task = asyncio.create_task(self._run(batch, after))
+        self._flushes.add(task)
+        for key in keys:
+            self._flushing[key] = task
+        task.add_done_callback(lambda task: self._flushed(task, keys))
+        return task
+
+    def _flushed(self, task, keys):
+        self._flushes.discard(task)
+        for key in keys:
+            # A later batch with this key has taken over the entry
+            if self._flushing.get(key) is task:
+                del self._flushing[key]
+
+    async def _run(self, batch, after):
+        # Keep writes to the same document in the order they were made
+        if after:
+            await asyncio.gather(*after, return_exceptions=True)
+
+        self.batches += 1
+        self.operations += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        MONGO_COALESCED_BATCH_SIZE.observe(len(batch))
+
+        try:
+            results = await self.flush([operation for operation, _ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error("Failed to flush %s coalesced writes: %s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    # Flush what is queued and wait for every flush in flight
+    async def drain(self):
+        self._seal()
+        while self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "in_flight": len(self._flushes),
+            "batches": self.batches,
+            "operations": self.operations,
+            "average_batch": round(self.operations / self.batches, 1) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "failed_batches": self.failed_batches
+        }
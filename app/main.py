@@ -1,4 +1,5 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
@@ -9,14 +10,36 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Configure logging: records go through a queue to a background writer thread
+from app.services.log_service import log_service
+log_service.configure()
+
+logger = logging.getLogger(__name__)
 
 # Import database functions
-from app.db.notifications import connect_to_mongodb, close_db_connection
+from app.db.notifications import connect_to_mongodb, close_db_connection, ping_database, write_coalescer_stats, start_notification_events
+
+# Import services
+from app.services.telegram_service import telegram_service
+from app.services.delivery_queue import delivery_queue, DELIVERY_MODE
+from app.services.retry_service import retry_sweeper, lease_keeper, RETRY_SWEEP_ENABLED
+from app.services.digest_service import digest_coalescer
+from app.services.dispatcher import dispatcher
+from app.services.circuit_breaker import mongo_breaker, telegram_breaker
+from app.services.spill_journal import spill_journal
+from app.services.event_hub import event_hub
+from app.services.retention_service import retention_archiver, RETENTION_ENABLED
+from app.db.status_cache import status_cache
+from app.db.stats import stats_rollup
+from app.services.metrics import (
+    multiprocess_metrics,
+    MetricsMiddleware,
+    DELIVERY_QUEUE_DEPTH,
+    DELIVERY_QUEUE_OLDEST_AGE,
+    TELEGRAM_POOL_IN_USE
+)
+from app.controllers.notification_controller import deliver_notification, replay_journaled_notification
+from app.models.serializers import json_encoder, FAST_JSON_ENABLED
 
 # Import routers
 from app.routers.notification_routers import router as notification_router
@@ -36,17 +59,62 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Record request latency and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Register event handlers
 @app.on_event("startup")
 async def startup_event():
-    """Connect to database when app starts"""
+    """Connect to database and start delivery workers and the retry sweeper when app starts"""
     await connect_to_mongodb()
-    logging.info("Notification Service started")
+    await stats_rollup.start()
+    # Live feed for GET /notifications/stream
+    await start_notification_events()
+    # Initialize the bot and open pooled connections before the first alert arrives
+    await telegram_service.start()
+    # Replay alerts journaled while Mongo was down (including those left by a previous run)
+    await spill_journal.start(replay_journaled_notification, ping_database)
+    # Renew the leases of alerts this worker is delivering
+    await lease_keeper.start()
+
+    if DELIVERY_MODE == "queue":
+        await delivery_queue.start(deliver_notification)
+
+    if DELIVERY_MODE == "distributed":
+        # The dispatcher claims new, retry-due and abandoned notifications alike
+        await dispatcher.start(deliver_notification)
+    elif RETRY_SWEEP_ENABLED:
+        await retry_sweeper.start(deliver_notification)
+
+    # Archive notifications leaving the hot window before the TTL index expires them
+    if RETENTION_ENABLED:
+        await retention_archiver.start()
+
+    # Share this worker's metrics with the others
+    await multiprocess_metrics.start(refresh_gauges)
+
+    # requirements.txt pins orjson; without it responses are encoded several times slower
+    if FAST_JSON_ENABLED and json_encoder() != "orjson":
+        logger.warning("orjson is not installed; encoding responses with the stdlib json module")
+
+    logger.info("Notification Service started")
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close database connection when app shuts down"""
+    """Drain delivery workers and close database connection when app shuts down"""
+    # Close any event streams still open
+    await event_hub.stop()
+    await retention_archiver.stop()
+    await retry_sweeper.stop()
+    await dispatcher.stop()
+    await delivery_queue.stop()
+    await digest_coalescer.stop()
+    await lease_keeper.stop()
+    await spill_journal.stop()
+    await stats_rollup.stop()
+    await telegram_service.close()
     await close_db_connection()
+    await multiprocess_metrics.stop()
 
 # Add router
 app.include_router(notification_router)
@@ -66,9 +134,46 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        # Everything below describes this worker only
+        "pid": os.getpid(),
+        "delivery": delivery_queue.stats(),
+        "retry": retry_sweeper.stats(),
+        "leases": lease_keeper.stats(),
+        "dispatcher": dispatcher.stats(),
+        "telegram": telegram_service.stats(),
+        "status_cache": status_cache.stats(),
+        "digest": digest_coalescer.stats(),
+        "stats_rollup": stats_rollup.stats(),
+        "write_coalescer": write_coalescer_stats(),
+        "circuit_breakers": {
+            "mongo": mongo_breaker.stats(),
+            "telegram": telegram_breaker.stats()
+        },
+        "spill_journal": spill_journal.stats(),
+        "events": event_hub.stats(),
+        "retention": {"enabled": RETENTION_ENABLED, **retention_archiver.stats()},
+        "logging": log_service.stats()
+    }
+
+# Gauges read from the services when metrics are reported
+def refresh_gauges():
+    delivery = delivery_queue.stats()
+    DELIVERY_QUEUE_DEPTH.set(delivery["depth"])
+    DELIVERY_QUEUE_OLDEST_AGE.set(delivery["oldest_age_seconds"])
+    if telegram_service.request:
+        TELEGRAM_POOL_IN_USE.set(telegram_service.request.in_flight)
+
+# Prometheus metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in the Prometheus text format, for all workers when they share METRICS_MULTIPROC_DIR"""
+    refresh_gauges()
+    return PlainTextResponse(multiprocess_metrics.render(), media_type="text/plain; version=0.0.4")
 
-# Run the application
+# Run the application in development mode (auto-reload, single process)
+# For production use the launcher instead: python -m app.server
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5005))
     uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
@@ -9,6 +9,7 @@ class NotificationRequest(BaseModel):
     fraud_probability: float = Field(..., ge=0, le=1, description="Fraud probability score (0-1)")
     is_nighttime: Optional[bool] = Field(None, description="True if the transaction is made at night, False otherwise")
     category: Optional[str] = Field(None, description="Merchant category")
+    merchant: Optional[str] = Field(None, description="Merchant name")
     transaction_location: Optional[str] = Field(None, description="Location of the transaction")
     job: Optional[str] = Field(None, description="Job of the cardholder")
     state: Optional[str] = Field(None, description="State where the transaction occurred")
@@ -29,7 +30,7 @@ class NotificationRequest(BaseModel):
 class NotificationBase(BaseModel):
     notification_id: str = Field(..., description="Notification database ID")
     transaction_number: str = Field(..., description="Transaction ID")
-    status: str = Field(..., description="Notification status (pending, sent, failed)")
+    status: str = Field(..., description="Notification status (pending, sent, failed, dead_letter)")
     created_at: datetime = Field(..., description="When the notification was created")
     
     class Config:
@@ -65,6 +66,13 @@ class NotificationDetail(NotificationBase):
         }
         
 
+class NotificationContent(BaseModel):
+    notification_id: str = Field(..., description="Notification database ID")
+    transaction_number: str = Field(..., description="Transaction ID")
+    content: str = Field(..., description="Telegram message for the alert (HTML)")
+    rendered: bool = Field(..., description="True if rendered now from the stored alert, False if stored when it was sent")
+
+
 class NotificationResponse(BaseModel):
     success: bool = Field(..., description="Indicates if the notification was successfully sent")
     message: str = Field(..., description="Message indicating the status of the notification")
@@ -86,10 +94,11 @@ class NotificationResponse(BaseModel):
 class PaginatedNotifications(BaseModel):
     success: bool = Field(..., description="Whether the operation was successful")
     notifications: List[NotificationBase] = Field(..., description="List of notifications")
-    total: int = Field(..., description="Total number of notifications")
-    page: int = Field(..., description="Current page number")
+    total: Optional[int] = Field(None, description="Total number of notifications (approximate, omitted unless requested in cursor mode)")
+    page: Optional[int] = Field(None, description="Current page number (not set in cursor mode)")
     limit: int = Field(..., description="Number of items per page")
-    pages: int = Field(..., description="Total number of pages")
+    pages: Optional[int] = Field(None, description="Total number of pages")
+    next_cursor: Optional[str] = Field(None, description="Pass as `after` to fetch the next page; null on the last page")
     
     class Config:
         schema_extra = {
@@ -106,6 +115,106 @@ class PaginatedNotifications(BaseModel):
                 "total": 42,
                 "page": 1,
                 "limit": 10,
-                "pages": 5
+                "pages": 5,
+                "next_cursor": "eyJ0IjogIjIwMjMtMTAtMTVUMTQ6MzA6MDAiLCAiaWQiOiAiNjRhODJjM2U5YjcyZjVkOGU5ZjgyYzMxIn0="
+            }
+        }
+
+class BatchNotificationResult(BaseModel):
+    transaction_number: str = Field(..., description="Transaction ID")
+    success: bool = Field(..., description="Whether this item was accepted or sent")
+    message: str = Field(..., description="Outcome for this item")
+    notification_id: Optional[str] = Field(None, description="Notification database ID")
+    status: Optional[str] = Field(None, description="Item status (sent, failed, pending, journaled, duplicate, rejected, error)")
+    error: Optional[str] = Field(None, description="Error message if any")
+
+
+class BatchNotificationResponse(BaseModel):
+    success: bool = Field(..., description="Whether the batch was processed")
+    total: int = Field(..., description="Number of items in the batch")
+    results: List[BatchNotificationResult] = Field(..., description="Per-item results, in request order")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "success": True,
+                "total": 2,
+                "results": [
+                    {
+                        "transaction_number": "TX123456789",
+                        "success": True,
+                        "message": "Notification sent successfully.",
+                        "notification_id": "64a82c3e9b72f5d8e9f82c31",
+                        "status": "sent"
+                    },
+                    {
+                        "transaction_number": "TX123456789",
+                        "success": False,
+                        "message": "Duplicate transaction in batch.",
+                        "status": "duplicate"
+                    }
+                ]
             }
-        }
\ No newline at end of file
+        }
+
+
+class RequeueRequest(BaseModel):
+    ids: Optional[List[str]] = Field(None, description="Notification IDs or transaction IDs to requeue; all dead letters if omitted")
+
+
+class RequeueResponse(BaseModel):
+    success: bool = Field(..., description="Whether the operation was successful")
+    message: str = Field(..., description="Outcome of the requeue")
+    requeued: int = Field(..., description="Number of dead-lettered notifications moved back to pending")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "success": True,
+                "message": "Requeued 3 dead-lettered notifications.",
+                "requeued": 3
+            }
+        }
+
+
+class StatsBucket(BaseModel):
+    start: datetime = Field(..., description="Start of the bucket")
+    total: int = Field(..., description="Notifications created in the bucket")
+    amount_sum: float = Field(..., description="Sum of their transaction amounts")
+    status: Dict[str, int] = Field(..., description="Their current status counts")
+    risk_level: Dict[str, int] = Field(..., description="Counts by risk level")
+    category: Dict[str, int] = Field(..., description="Counts by merchant category")
+    sent: int = Field(..., description="How many of them have been sent")
+    latency: Dict[str, int] = Field(..., description="Sent notifications by delivery latency (sent_at - created_at), le_<seconds>")
+    avg_latency_seconds: Optional[float] = Field(None, description="Average delivery latency of the sent ones")
+
+
+class NotificationStatsResponse(BaseModel):
+    success: bool = Field(..., description="Whether the operation was successful")
+    granularity: str = Field(..., description="Bucket size (minute, hour, day)")
+    start: datetime = Field(..., description="Start of the first bucket")
+    end: datetime = Field(..., description="End of the range (exclusive)")
+    buckets: List[StatsBucket] = Field(..., description="One entry per bucket, oldest first")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "success": True,
+                "granularity": "hour",
+                "start": "2023-10-15T14:00:00",
+                "end": "2023-10-15T15:00:00",
+                "buckets": [
+                    {
+                        "start": "2023-10-15T14:00:00",
+                        "total": 42,
+                        "amount_sum": 18250.5,
+                        "status": {"sent": 40, "failed": 1, "pending": 1},
+                        "risk_level": {"CRITICAL": 12, "HIGH": 20, "MEDIUM": 10},
+                        "category": {"shopping_net": 30, "grocery_pos": 12},
+                        "sent": 40,
+                        "latency": {"le_1": 35, "le_5": 5},
+                        "avg_latency_seconds": 0.82
+                    }
+                ]
+            }
+        }
@@ -0,0 +1,153 @@
+import io
+import os
+import csv
+import json
+from datetime import datetime
+from bson import ObjectId # type: ignore
+from fastapi.responses import Response # type: ignore
+from dotenv import load_dotenv # type: ignore
+
+try:
+    import orjson # type: ignore
+except ImportError:
+    orjson = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Serve status and list responses straight from documents, skipping response_model validation
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "true").lower() == "true"
+
+# Fields of NotificationBase / NotificationDetail, in schema order
+SUMMARY_FIELDS = ("notification_id", "transaction_number", "status", "created_at")
+DETAIL_FIELDS = SUMMARY_FIELDS + ("sent_at", "error", "fraud_probability", "transaction_amount", "message_id")
+
+# Columns of an export row (NDJSON keys and CSV header)
+EXPORT_FIELDS = (
+    "notification_id", "transaction_number", "transaction_amount", "fraud_probability",
+    "category", "merchant", "is_nighttime", "status", "attempts", "error", "message_id",
+    "created_at", "sent_at"
+)
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Which encoder dumps() uses, for the startup log
+def json_encoder():
+    return "orjson" if orjson is not None else "json"
+
+
+# Encode to JSON bytes; orjson handles datetimes natively, ObjectIds go through _default
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with dumps() instead of the stdlib encoder."""
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+# Shape a Mongo document like NotificationBase (list items)
+def notification_summary(notification):
+    return {
+        "notification_id": str(notification["_id"]),
+        "transaction_number": notification["transaction_number"],
+        "status": notification["status"],
+        "created_at": notification.get("created_at")
+    }
+
+
+# Shape a Mongo document like NotificationDetail (status endpoint)
+def notification_detail(notification):
+    detail = notification_summary(notification)
+    for field in DETAIL_FIELDS[len(SUMMARY_FIELDS):]:
+        detail[field] = notification.get(field)
+    return detail
+
+
+def export_row(notification):
+    row = {field: notification.get(field) for field in EXPORT_FIELDS}
+    row["notification_id"] = str(notification["_id"])
+    return row
+
+
+# One NDJSON line per notification
+def ndjson_line(notification):
+    return dumps(export_row(notification)) + b"\n"
+
+
+# One Server-Sent Events message; `data` is sent as JSON on a single line
+def sse_event(event, data, id=None, retry=None):
+    lines = []
+    if id:
+        lines.append(f"id: {id}")
+    if retry:
+        lines.append(f"retry: {retry}")
+    lines.append(f"event: {event}")
+    return ("\n".join(lines) + "\ndata: ").encode() + dumps(data) + b"\n\n"
+
+
+# SSE comment line, ignored by clients; keeps idle connections (and proxies) alive
+def sse_comment(text):
+    return f": {text}\n\n".encode()
+
+
+def csv_header():
+    return csv_lines([EXPORT_FIELDS])
+
+
+# Encode CSV rows (lists of values); datetimes as ISO 8601, None as an empty cell
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+    return buffer.getvalue().encode("utf-8")
+
+
+def csv_values(notification):
+    row = export_row(notification)
+    return [row[field] for field in EXPORT_FIELDS]
+
+
+# Shape a stats rollup document like StatsBucket; missing counters are zero
+def stats_bucket(rollup):
+    sent = rollup.get("sent", 0)
+    return {
+        "start": rollup["start"],
+        "total": rollup.get("total", 0),
+        "amount_sum": round(rollup.get("amount_sum", 0), 2),
+        "status": {k: v for k, v in rollup.get("status", {}).items() if v},
+        "risk_level": rollup.get("risk_level", {}),
+        "category": rollup.get("category", {}),
+        "sent": sent,
+        "latency": {k: v for k, v in rollup.get("latency", {}).items() if v},
+        "avg_latency_seconds": round(rollup.get("latency_sum", 0) / sent, 3) if sent else None
+    }
+
+
+"""
+Return a controller result from a route.
+With the fast path on, the result (already shaped like the route's response_model by
+the helpers above) is encoded directly; otherwise FastAPI validates and encodes it as usual.
+The route keeps its response_model either way, so the OpenAPI schema does not change.
+"""
+def fast_response(content):
+    if not FAST_JSON_ENABLED:
+        return content
+    return FastJSONResponse(content)
@@ -1,14 +1,30 @@
-from fastapi import APIRouter, HTTPException, Query, Path
+from typing import List, Optional, Literal
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Path, Header, Response
+from fastapi.responses import StreamingResponse
 from ..models.schemas import (
     NotificationRequest,
     NotificationResponse,
     NotificationDetail,
-    PaginatedNotifications
+    NotificationContent,
+    PaginatedNotifications,
+    BatchNotificationResponse,
+    RequeueRequest,
+    RequeueResponse,
+    NotificationStatsResponse
 )
+from ..models.serializers import fast_response, EXPORT_MEDIA_TYPES
 from ..controllers.notification_controller import (
+    BATCH_MAX_SIZE,
     send_fraud_notification,
+    send_fraud_notifications_batch,
+    requeue_dead_letter_notifications,
     get_notification_status,
-    list_all_notifications
+    get_notification_content,
+    list_all_notifications,
+    export_notifications,
+    stream_notification_events,
+    get_notification_stats
 )
 
 # Create Router
@@ -18,7 +34,7 @@ router = APIRouter(
 )
 
 @router.post("/send", response_model=NotificationResponse)
-async def send_notification(request: NotificationRequest):
+async def send_notification(request: NotificationRequest, response: Response):
     # Send a fraud notification to Telegram 
     result = await send_fraud_notification(request.dict())
 
@@ -26,12 +42,91 @@ async def send_notification(request: NotificationRequest):
         if "already exists" in result.get("message", ""):
             # Not really an error, just informational
             return result
+        elif result.get("queue_full"):
+            # Backpressure - the caller should retry later
+            raise HTTPException(status_code=429, detail=result["error"])
         else:
             raise HTTPException(status_code=500, detail=result["error"])
+
+    if result.get("queued"):
+        # Accepted for background delivery
+        response.status_code = 202
     
     return result   
 
 
+@router.post("/send-batch", response_model=BatchNotificationResponse)
+async def send_notification_batch(requests: List[NotificationRequest]):
+    """Send a batch of fraud notifications, with a result per item"""
+    if len(requests) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size exceeds the limit of {BATCH_MAX_SIZE}")
+
+    result = await send_fraud_notifications_batch([request.dict() for request in requests])
+
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+
+    return result
+
+
+@router.post("/dead-letters/requeue", response_model=RequeueResponse)
+async def requeue_dead_letters(request: Optional[RequeueRequest] = None):
+    """Move dead-lettered notifications back to pending for another round of retries"""
+    result = await requeue_dead_letter_notifications(request.ids if request else None)
+
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+
+    return result
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson or csv"),
+    status: Optional[List[str]] = Query(None, description="Only these statuses (repeat for several)"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Created before this time")
+):
+    """Stream notifications as NDJSON or CSV, oldest first"""
+    return StreamingResponse(
+        export_notifications(format, status, created_from, created_to),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="notifications.{format}"'}
+    )
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream(
+    status: Optional[List[str]] = Query(None, description="Only events moving to these statuses (\"pending\" includes created; repeat for several)"),
+    risk_level: Optional[List[Literal["MEDIUM", "HIGH", "CRITICAL"]]] = Query(None, description="Only these risk levels (repeat for several)"),
+    last_event_id: Optional[str] = Query(None, description="Resume after this event id"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID", description="Set by EventSource when it reconnects")
+):
+    """Live feed of notification events (created and status changes) as Server-Sent Events"""
+    return StreamingResponse(
+        stream_notification_events(status, risk_level, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stats", response_model=NotificationStatsResponse)
+async def notification_stats(
+    granularity: Literal["minute", "hour", "day"] = Query("hour", description="Bucket size"),
+    start: Optional[datetime] = Query(None, description="First bucket (default: 24 buckets before end)"),
+    end: Optional[datetime] = Query(None, description="End of the range, exclusive (default: end of the current bucket)")
+):
+    """Notification volumes, outcomes and delivery latency per time bucket"""
+    result = await get_notification_stats(granularity, start, end)
+
+    if not result["success"]:
+        if result.get("invalid_range"):
+            raise HTTPException(status_code=400, detail=result["error"])
+        raise HTTPException(status_code=500, detail=result["error"])
+
+    return result
+
+
 @router.get("/status/{id}", response_model=NotificationDetail)
 async def check_status(id: str = Path(..., description="Notification ID or Transaction ID")):
     """Check the status of a notification"""
@@ -40,18 +135,55 @@ async def check_status(id: str = Path(..., description="Notification ID or Trans
     if not result:
         raise HTTPException(status_code=404, detail=f"Notification not found with ID: {id}")
     
+    return fast_response(result)
+
+
+@router.get("/content/{id}", response_model=NotificationContent)
+async def notification_content(id: str = Path(..., description="Notification ID or Transaction ID")):
+    """The Telegram message of a notification"""
+    result = await get_notification_content(id)
+
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Notification not found with ID: {id}")
+
     return result
 
 
 @router.get("/", response_model=PaginatedNotifications)
 async def list_notifications(
     page: int = Query(1, ge=1, description="Page number"),
-    limit: int = Query(10, ge=1, le=100, description="Items per page")
+    limit: int = Query(10, ge=1, le=100, description="Items per page"),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor (keyset pagination); keep the same filters"),
+    include_total: Optional[bool] = Query(None, description="Include the total count (default: yes for page mode, no for cursor mode)"),
+    status: Optional[List[str]] = Query(None, description="Only these statuses (repeat for several)"),
+    risk_level: Optional[List[Literal["MEDIUM", "HIGH", "CRITICAL"]]] = Query(None, description="Only these risk levels (repeat for several)"),
+    merchant: Optional[str] = Query(None, description="Merchant name"),
+    category: Optional[str] = Query(None, description="Merchant category"),
+    min_amount: Optional[float] = Query(None, ge=0, description="Minimum transaction amount"),
+    max_amount: Optional[float] = Query(None, ge=0, description="Maximum transaction amount"),
+    min_probability: Optional[float] = Query(None, ge=0, le=1, description="Minimum fraud probability"),
+    max_probability: Optional[float] = Query(None, ge=0, le=1, description="Maximum fraud probability"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Created before this time")
 ):
-    """List all notifications with pagination"""
-    result = await list_all_notifications(page, limit)
+    """List notifications with pagination, newest first, optionally filtered"""
+    filters = {
+        "status": status,
+        "risk_level": risk_level,
+        "merchant": merchant,
+        "category": category,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+        "min_probability": min_probability,
+        "max_probability": max_probability,
+        "created_from": created_from,
+        "created_to": created_to
+    }
+    result = await list_all_notifications(page, limit, after, include_total, filters)
     
     if not result["success"]:
+        if result.get("invalid_cursor"):
+            raise HTTPException(status_code=400, detail=result["error"])
         raise HTTPException(status_code=500, detail=result["error"])
     
-    return result
\ No newline at end of file
+    return fast_response(result)
\ No newline at end of file
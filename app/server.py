@@ -0,0 +1,123 @@
+import os
+import glob
+import argparse
+import logging
+import tempfile
+import importlib.util
+import uvicorn # type: ignore
+from dotenv import load_dotenv # type: ignore
+from app.services.log_service import log_service
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Server settings
+SERVER_HOST = os.getenv("HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("PORT", 5005))
+# 0 means one worker per CPU
+SERVER_WORKERS = int(os.getenv("WORKERS", 0))
+SERVER_KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", 5))
+SERVER_BACKLOG = int(os.getenv("BACKLOG", 2048))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+SERVER_LIMIT_CONCURRENCY = os.getenv("LIMIT_CONCURRENCY")
+
+
+# Worker count sized to the CPUs this process may actually run on
+def default_workers():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Prefer uvloop and httptools when they are installed
+def loop_implementation():
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_implementation():
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+# Give the workers an empty directory to share their metrics through (see MultiprocessMetrics)
+def prepare_metrics_dir():
+    directory = os.getenv("METRICS_MULTIPROC_DIR")
+    if not directory:
+        directory = tempfile.mkdtemp(prefix="notify-metrics-")
+        # Inherited by the worker processes
+        os.environ["METRICS_MULTIPROC_DIR"] = directory
+    else:
+        os.makedirs(directory, exist_ok=True)
+        # Snapshots of a previous run would be counted again
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.remove(path)
+    return directory
+
+
+# Stop caching statuses that can still change: another worker may change them
+# and only its own cache hears of it (see STATUS_CACHE_PENDING_TTL)
+def share_status_cache():
+    os.environ.setdefault("STATUS_CACHE_PENDING_TTL", "0")
+    return float(os.environ["STATUS_CACHE_PENDING_TTL"])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the notification service in production mode")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--keep-alive", type=int, default=SERVER_KEEP_ALIVE, help="Seconds to keep idle connections open")
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG, help="Maximum pending connections")
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT,
+                        help="Seconds to wait for in-flight requests and shutdown hooks")
+    parser.add_argument("--limit-concurrency", type=int,
+                        default=int(SERVER_LIMIT_CONCURRENCY) if SERVER_LIMIT_CONCURRENCY else None,
+                        help="Answer 503 above this many concurrent connections per worker")
+    return parser.parse_args(argv)
+
+
+"""
+Production entry point: `python -m app.server`.
+Each worker process imports the app and runs its own startup hook, so the
+MongoDB client and Telegram bot are created inside the worker, never shared.
+State held in memory is per worker too, and a request reaches any one of them:
+/metrics merges every worker's metrics through METRICS_MULTIPROC_DIR (a fresh
+temporary directory unless set), but /health, the status cache, the delivery queue
+and locally published events describe only the worker that answered. So that no
+worker answers with a status another one has since changed, the status cache only
+keeps sent notifications (STATUS_CACHE_PENDING_TTL defaults to 0).
+"""
+def main(argv=None):
+    args = parse_args(argv)
+    workers = args.workers or default_workers()
+    loop = loop_implementation()
+    http = http_implementation()
+
+    log_service.configure()
+    if workers > 1:
+        logger.info("Workers share metrics through %s", prepare_metrics_dir())
+        if share_status_cache() > 0:
+            logger.warning("STATUS_CACHE_PENDING_TTL is set: workers may serve a status another worker has changed for up to %ss",
+                           os.environ["STATUS_CACHE_PENDING_TTL"])
+    logger.info("Starting %s workers on %s:%s (loop=%s, http=%s)", workers, args.host, args.port, loop, http)
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_concurrency=args.limit_concurrency,
+        reload=False,
+        access_log=False
+    )
+
+
+if __name__ == "__main__":
+    main()
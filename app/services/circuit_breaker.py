@@ -0,0 +1,158 @@
+import os
+import time
+import functools
+import logging
+from dotenv import load_dotenv # type: ignore
+from pymongo.errors import ConnectionFailure # type: ignore
+from telegram.error import NetworkError, BadRequest # type: ignore
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Breaker settings: open after THRESHOLD consecutive failures, try again after RESET seconds
+MONGO_BREAKER_THRESHOLD = int(os.getenv("MONGO_BREAKER_THRESHOLD", 5))
+MONGO_BREAKER_RESET = float(os.getenv("MONGO_BREAKER_RESET", 5))
+TELEGRAM_BREAKER_THRESHOLD = int(os.getenv("TELEGRAM_BREAKER_THRESHOLD", 5))
+TELEGRAM_BREAKER_RESET = float(os.getenv("TELEGRAM_BREAKER_RESET", 30))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+"""
+Circuit breaker for one dependency.
+closed: calls go through; consecutive failures are counted.
+open: calls fail at once with CircuitOpenError until reset_timeout has passed.
+half_open: one trial call at a time; success closes the breaker, failure opens it again.
+Only exceptions for which is_failure() is true count (e.g. network errors, not bad requests).
+"""
+class CircuitBreaker():
+
+    def __init__(self, name, failure_threshold, reset_timeout, is_failure):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    # Whether a call may go ahead now; in half_open this takes the single trial slot
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Circuit breaker '%s' closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    # Any failure while half-open opens the breaker again, whether or not it was the trial call
+    # (code using check() and observe() reaches Mongo without taking the trial slot)
+    def record_failure(self):
+        self.failures += 1
+        was_trial, self._trial = self._trial, False
+
+        if self.opened_at is None:
+            if self.failures >= self.failure_threshold:
+                self.times_opened += 1
+                logger.error("Circuit breaker '%s' opened after %s failures", self.name, self.failures)
+                self.opened_at = time.monotonic()
+        elif was_trial or self.state == "half_open":
+            logger.warning("Circuit breaker '%s' failed while half-open, opened again", self.name)
+            self.opened_at = time.monotonic()
+
+    # A call that ended with an error that says nothing about the dependency's health
+    def record_neutral(self):
+        self._trial = False
+
+    # Count an error caught by code that handles its own failures
+    def observe(self, error):
+        if self.is_failure(error):
+            self.record_failure()
+
+    # Fail fast while open, without taking the half-open trial slot.
+    # Callers report the outcome themselves: record_success() or observe(error).
+    def check(self):
+        if self.state == "open":
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    # Run func(*args, **kwargs) through the breaker
+    async def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_neutral()
+            raise
+        except BaseException:
+            self.record_neutral()
+            raise
+
+        self.record_success()
+        return result
+
+    # Decorator form of call() for async functions and methods
+    def guard(self, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self.call(func, *args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+# Mongo could not be reached (not merely rejecting a write, e.g. a duplicate key)
+def is_mongo_failure(error):
+    return isinstance(error, ConnectionFailure)
+
+
+# Mongo is unreachable, or the breaker already knows it is
+def is_mongo_unavailable(error):
+    return isinstance(error, (ConnectionFailure, CircuitOpenError))
+
+
+# Telegram could not be reached or timed out; a bad request is our problem, not an outage
+def is_telegram_unavailable(error):
+    return isinstance(error, NetworkError) and not isinstance(error, BadRequest)
+
+
+# Create instances
+mongo_breaker = CircuitBreaker("mongo", MONGO_BREAKER_THRESHOLD, MONGO_BREAKER_RESET, is_mongo_failure)
+telegram_breaker = CircuitBreaker("telegram", TELEGRAM_BREAKER_THRESHOLD, TELEGRAM_BREAKER_RESET, is_telegram_unavailable)
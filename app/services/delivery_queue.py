@@ -0,0 +1,165 @@
+import os
+import time
+import asyncio
+import logging
+import itertools
+from dotenv import load_dotenv # type: ignore
+from .telegram_service import risk_rank, priority_key, PRIORITY_AGING
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Delivery settings
+# DELIVERY_MODE: "sync" sends inside the request, "queue" hands off to background workers,
+# "distributed" stores the alert and lets any replica's dispatcher claim it (see dispatcher.py)
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "sync")
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", 4))
+DELIVERY_QUEUE_SIZE = int(os.getenv("DELIVERY_QUEUE_SIZE", 1000))
+# DELIVERY_BACKPRESSURE: "reject" answers 429 when full, "block" waits for a free slot
+DELIVERY_BACKPRESSURE = os.getenv("DELIVERY_BACKPRESSURE", "reject")
+DELIVERY_BLOCK_TIMEOUT = float(os.getenv("DELIVERY_BLOCK_TIMEOUT", 5))
+DELIVERY_SHUTDOWN_TIMEOUT = float(os.getenv("DELIVERY_SHUTDOWN_TIMEOUT", 10))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# Workers take the highest risk level first (CRITICAL before HIGH before MEDIUM),
+# with the same aging as the Telegram rate limiter so queued MEDIUM alerts still move
+class DeliveryQueue():
+
+    # Initialize the queue with worker count, capacity and backpressure policy
+    def __init__(self, workers=DELIVERY_WORKERS, maxsize=DELIVERY_QUEUE_SIZE,
+                 backpressure=DELIVERY_BACKPRESSURE, block_timeout=DELIVERY_BLOCK_TIMEOUT, aging=PRIORITY_AGING):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.aging = aging
+
+        self._queue = None
+        self._slots = None
+        # Enqueue time of each queued item by sequence number, oldest first
+        self._enqueued_at = {}
+        self._sequence = itertools.count()
+        self._tasks = []
+        self._handler = None
+        self._accepting = False
+
+        self.processed = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    @property
+    def running(self):
+        return self._accepting
+
+    # Start the worker pool; handler is awaited as handler(notification, data)
+    async def start(self, handler):
+        if self._tasks:
+            return
+
+        self._handler = handler
+        self._queue = asyncio.PriorityQueue()
+        self._slots = asyncio.Semaphore(self.maxsize)
+        self._accepting = True
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"delivery-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info("Delivery queue started with %s workers (capacity %s)", self.workers, self.maxsize)
+
+    # Reserve a queue slot before persisting, so a full queue rejects before any write
+    async def reserve(self):
+        if not self._accepting:
+            raise QueueFullError("Delivery queue is not accepting notifications")
+
+        if self.backpressure == "block":
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.block_timeout)
+                return
+            except asyncio.TimeoutError:
+                pass
+        elif not self._slots.locked():
+            await self._slots.acquire()
+            return
+
+        self.rejected += 1
+        raise QueueFullError("Delivery queue is full")
+
+    # Give back a reserved slot that will not be used
+    def release(self):
+        self._slots.release()
+
+    # Put a notification on the queue using a previously reserved slot
+    def put(self, notification, data):
+        now = time.monotonic()
+        sequence = next(self._sequence)
+        rank = risk_rank(notification.get("risk_level"))
+        self._enqueued_at[sequence] = now
+        self._queue.put_nowait((priority_key(rank, now, self.aging), sequence, notification, data))
+
+    # Stop accepting work, drain what is queued, then stop the workers
+    async def stop(self, timeout=DELIVERY_SHUTDOWN_TIMEOUT):
+        if not self._tasks:
+            return
+
+        self._accepting = False
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Delivery queue shutdown timed out with %s notifications "
+                "still pending; they stay 'pending' in the database",
+                self._queue.qsize()
+            )
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Delivery queue stopped")
+
+    # Queue depth and age for monitoring
+    def stats(self):
+        depth = self._queue.qsize() if self._queue else 0
+        oldest_age = time.monotonic() - next(iter(self._enqueued_at.values())) if self._enqueued_at else 0.0
+
+        return {
+            "mode": DELIVERY_MODE,
+            "running": self._accepting,
+            "workers": self.workers,
+            "capacity": self.maxsize,
+            "depth": depth,
+            "oldest_age_seconds": round(oldest_age, 3),
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "errors": self.errors,
+            "rejected": self.rejected
+        }
+
+    async def _worker(self, index):
+        while True:
+            _, sequence, notification, data = await self._queue.get()
+            self._enqueued_at.pop(sequence, None)
+            self._slots.release()
+            self.in_flight += 1
+
+            try:
+                await self._handler(notification, data)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error("Delivery worker %s failed for %s: %s", index, notification.get('_id'), e)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+
+# Create instance
+delivery_queue = DeliveryQueue()
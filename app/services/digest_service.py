@@ -0,0 +1,169 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from dotenv import load_dotenv # type: ignore
+from ..db.notifications import update_notifications, renew_notification_leases
+from .telegram_service import telegram_service, RISK_LEVELS
+from .retry_service import failure_update, lease_keeper
+from .metrics import NOTIFICATIONS, NOTIFICATION_TIME_TO_SEND
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Digest settings
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "false").lower() == "true"
+# Alerts below this risk level are coalesced; CRITICAL is never coalesced
+DIGEST_RISK_THRESHOLD = os.getenv("DIGEST_RISK_THRESHOLD", "HIGH").upper()
+# Alert fields that together decide which digest an alert joins
+DIGEST_GROUP_BY = [f.strip() for f in os.getenv("DIGEST_GROUP_BY", "merchant,category").split(",") if f.strip()]
+DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", 60))
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", 20))
+
+
+class DigestCoalescer():
+
+    # Initialize the coalescer with its threshold, grouping and flush limits
+    def __init__(self, enabled=DIGEST_ENABLED, risk_threshold=DIGEST_RISK_THRESHOLD,
+                 group_by=DIGEST_GROUP_BY, window=DIGEST_WINDOW, max_items=DIGEST_MAX_ITEMS):
+        self.enabled = enabled
+        self.group_by = group_by
+        self.window = window
+        self.max_items = max_items
+
+        # CRITICAL always goes out on its own, whatever the configured threshold
+        threshold = RISK_LEVELS.index(risk_threshold) if risk_threshold in RISK_LEVELS else 1
+        self.threshold = min(threshold, RISK_LEVELS.index("CRITICAL"))
+
+        self._buffers = {}
+        self._timers = {}
+
+        self.digests_sent = 0
+        self.alerts_coalesced = 0
+
+    # Whether an alert should wait for a digest instead of being sent now
+    def should_coalesce(self, data):
+        if not self.enabled:
+            return False
+
+        risk_level = telegram_service.get_risk_level(data.get("fraud_probability", 0))
+        return RISK_LEVELS.index(risk_level) < self.threshold
+
+    def group_key(self, data):
+        return tuple(data.get(field) for field in self.group_by)
+
+    # Buffer a saved notification; the group is flushed after the window or when full
+    async def add(self, notification, data):
+        key = self.group_key(data)
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append((notification, data))
+        self.alerts_coalesced += 1
+
+        if len(buffer) >= self.max_items:
+            await self.flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    # Nothing awaits this task: log a failed flush (its alerts are retried once their leases lapse)
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.window)
+        self._timers.pop(key, None)
+        try:
+            await self.flush(key)
+        except Exception as e:
+            logger.error("Failed to flush digest %s: %s", key, e)
+
+    # Send one digest for a group and record the outcome on every notification in it.
+    # Each outcome is fenced on the lease of its claim; alerts whose lease was taken over
+    # while they waited are dropped before sending, and left to whoever holds them now.
+    async def flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer and timer is not asyncio.current_task():
+            timer.cancel()
+
+        items = self._buffers.pop(key, [])
+        if not items:
+            return
+
+        try:
+            items = await self._still_held(items)
+            if items:
+                await self._send(key, items)
+        finally:
+            # The outcome is written (releasing the leases), or on an error they are
+            # no longer renewed and the alerts are retried once they lapse
+            for notification, _ in items:
+                lease_keeper.release(notification["_id"])
+
+    # Drop the alerts whose lease was lost while they waited for the digest
+    async def _still_held(self, items):
+        leases = {notification["_id"]: notification["lease_id"] for notification, _ in items if notification.get("lease_id")}
+        held = await renew_notification_leases(leases, lease_keeper.lease)
+
+        kept = []
+        for notification, data in items:
+            if notification.get("lease_id") and notification["_id"] not in held:
+                lease_keeper.release(notification["_id"])
+                logger.warning("Lease on notification %s was lost while it waited for a digest; not sent", notification["_id"])
+                continue
+            kept.append((notification, data))
+        return kept
+
+    async def _send(self, key, items):
+        label = ", ".join(f"{field}={value or 'N/A'}" for field, value in zip(self.group_by, key))
+        try:
+            result = await telegram_service.send_digest(label, [data for _, data in items])
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        if result.get("success"):
+            now = datetime.now()
+            await update_notifications([
+                (notification["_id"], {
+                    "status": "sent",
+                    "sent_at": now,
+                    "message_id": result.get("message_id"),
+                    "digest_size": len(items),
+                    "rate_limit_wait": result.get("waited", 0.0),
+                    "attempts": notification.get("attempts", 0) + 1,
+                    "next_attempt_at": None
+                }, notification.get("lease_id"))
+                for notification, _ in items
+            ])
+            self.digests_sent += 1
+
+            for notification, data in items:
+                risk_level = telegram_service.get_risk_level(data.get("fraud_probability", 0))
+                NOTIFICATIONS.inc(status="sent", risk_level=risk_level)
+                if notification.get("created_at"):
+                    NOTIFICATION_TIME_TO_SEND.observe((now - notification["created_at"]).total_seconds(), risk_level=risk_level)
+        else:
+            error = result.get("error", "Unknown error")
+            updates = [(notification["_id"], failure_update(notification, error), notification.get("lease_id")) for notification, _ in items]
+            await update_notifications(updates)
+
+            for (_, update, _), (_, data) in zip(updates, items):
+                NOTIFICATIONS.inc(status=update["status"], risk_level=telegram_service.get_risk_level(data.get("fraud_probability", 0)))
+
+    # Flush every open group (used on shutdown)
+    async def stop(self):
+        for key in list(self._buffers):
+            try:
+                await self.flush(key)
+            except Exception as e:
+                logger.error("Failed to flush digest %s: %s", key, e)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "open_groups": len(self._buffers),
+            "buffered": sum(len(items) for items in self._buffers.values()),
+            "digests_sent": self.digests_sent,
+            "alerts_coalesced": self.alerts_coalesced
+        }
+
+
+# Create instance
+digest_coalescer = DigestCoalescer()
@@ -0,0 +1,165 @@
+import os
+import socket
+import asyncio
+import logging
+from dotenv import load_dotenv # type: ignore
+from ..db.notifications import claim_due_notification, renew_notification_lease
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Dispatcher settings (used when DELIVERY_MODE is "distributed")
+# Identifies this replica in claimed_by; defaults to hostname-pid
+DISPATCH_NODE_ID = os.getenv("DISPATCH_NODE_ID")
+# How long a claim is held without renewal; renewed every third of it while sending
+DISPATCH_LEASE = float(os.getenv("DISPATCH_LEASE", 30))
+DISPATCH_CONCURRENCY = int(os.getenv("DISPATCH_CONCURRENCY", 10))
+# Pause before polling again when nothing is due
+DISPATCH_POLL_INTERVAL = float(os.getenv("DISPATCH_POLL_INTERVAL", 0.5))
+DISPATCH_SHUTDOWN_TIMEOUT = float(os.getenv("DISPATCH_SHUTDOWN_TIMEOUT", 10))
+
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+"""
+Claims due notifications from the shared collection and delivers them.
+Every replica runs one; a claim (claimed_by, lease_until, lease_id) is taken with an
+atomic find_one_and_update, so racing replicas never get the same notification.
+The lease is renewed while the handler runs; the handler's final write is fenced by
+lease_id (see deliver_notification), which releases the claim. If a replica dies,
+its leases expire and the notifications are claimed again by the others.
+"""
+class Dispatcher():
+
+    # Initialize the dispatcher with its lease length, concurrency and polling interval
+    def __init__(self, node_id=DISPATCH_NODE_ID, lease=DISPATCH_LEASE,
+                 concurrency=DISPATCH_CONCURRENCY, poll_interval=DISPATCH_POLL_INTERVAL):
+        self.node_id = node_id
+        self.lease = lease
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+
+        self._task = None
+        self._handler = None
+        self._semaphore = None
+        self._in_flight = set()
+
+        self.claimed = 0
+        self.renewals = 0
+        self.leases_lost = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    # Start claiming; handler is awaited as handler(notification, data)
+    async def start(self, handler):
+        if self._task:
+            return
+
+        # Resolved here rather than at import so forked workers get their own id
+        self.node_id = self.node_id or default_node_id()
+        self._handler = handler
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.create_task(self._run(), name="dispatcher")
+        logger.info("Dispatcher %s started (%s concurrent, %ss leases)", self.node_id, self.concurrency, self.lease)
+
+    async def _run(self):
+        while True:
+            # Only claim what we have capacity to send right away
+            await self._semaphore.acquire()
+
+            try:
+                notification = await claim_due_notification(self.lease, self.node_id)
+            except Exception as e:
+                self._semaphore.release()
+                logger.error("Dispatcher claim failed: %s", e)
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if not notification:
+                self._semaphore.release()
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            self.claimed += 1
+            task = asyncio.create_task(self._dispatch(notification))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, notification):
+        # The stored document carries the alert fields needed to send
+        delivery = asyncio.create_task(self._handler(notification, notification))
+        renewer = asyncio.create_task(self._renew(notification, delivery))
+
+        try:
+            await delivery
+        except asyncio.CancelledError:
+            if not delivery.cancelled():
+                raise
+        except Exception as e:
+            logger.error("Dispatch of %s failed: %s", notification['_id'], e)
+        finally:
+            renewer.cancel()
+            self._semaphore.release()
+
+    # Keep the lease while the delivery runs; if it was lost, stop the delivery
+    # so a send that has not happened yet is left to the new holder
+    async def _renew(self, notification, delivery):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+
+            try:
+                held = await renew_notification_lease(notification["_id"], notification["lease_id"], self.lease)
+            except Exception as e:
+                logger.error("Lease renewal for %s failed: %s", notification['_id'], e)
+                continue
+
+            if held:
+                self.renewals += 1
+                continue
+
+            # Finished (and released) while the renewal was in flight
+            if delivery.done():
+                return
+
+            self.leases_lost += 1
+            logger.warning("Dispatcher %s lost the lease on %s; abandoning it", self.node_id, notification['_id'])
+            delivery.cancel()
+            return
+
+    # Stop claiming, give in-flight deliveries a chance to finish, then cancel the rest
+    # (their leases expire and another replica picks them up)
+    async def stop(self, timeout=DISPATCH_SHUTDOWN_TIMEOUT):
+        if not self._task:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        if self._in_flight:
+            done, pending = await asyncio.wait(set(self._in_flight), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        logger.info("Dispatcher %s stopped", self.node_id)
+
+    def stats(self):
+        return {
+            "node_id": self.node_id,
+            "running": self.running,
+            "in_flight": len(self._in_flight),
+            "claimed": self.claimed,
+            "renewals": self.renewals,
+            "leases_lost": self.leases_lost
+        }
+
+
+# Create instance
+dispatcher = Dispatcher()
@@ -0,0 +1,261 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv # type: ignore
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Event stream settings
+# "local": events are published by this process's own writes; "change_stream": they come
+# from a MongoDB change stream (sees every process's writes, needs a replica set);
+# "auto": the change stream when the server supports one, local otherwise
+EVENT_SOURCE = os.getenv("EVENT_SOURCE", "auto").lower()
+# Recent events kept for clients resuming with Last-Event-ID
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", 10000))
+# Events a subscriber may have waiting; a client that falls this far behind is dropped
+SSE_BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", 1000))
+# Seconds between keep-alive comments on an idle stream
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+# Milliseconds a client should wait before reconnecting (sent as the SSE retry field)
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))
+
+# Fields of a notification carried by its events
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": "insert"},
+        {"operationType": "update", "updateDescription.updatedFields.status": {"$exists": True}}
+    ]}},
+    {"$project": {
+        "operationType": 1,
+        "fullDocument._id": 1,
+        "fullDocument.transaction_number": 1,
+        "fullDocument.status": 1,
+        "fullDocument.risk_level": 1,
+        "updateDescription.updatedFields.status": 1
+    }}
+]
+
+
+"""
+One client's view of the hub: the events matching its filters, buffered up to
+max_buffer. When the buffer is full the subscription is marked overflowed and
+closed, rather than holding up everyone else; the client is expected to reconnect
+with the id of the last event it got.
+"""
+class Subscription():
+
+    def __init__(self, statuses=None, risk_levels=None, max_buffer=SSE_BUFFER_SIZE):
+        self.statuses = set(statuses) if statuses else None
+        self.risk_levels = set(risk_levels) if risk_levels else None
+        self.max_buffer = max_buffer
+
+        self.events = deque()
+        self.closed = False
+        self.overflowed = False
+        self._ready = asyncio.Event()
+
+    def matches(self, event):
+        if self.statuses and event["status"] not in self.statuses:
+            return False
+        if self.risk_levels and event["risk_level"] not in self.risk_levels:
+            return False
+        return True
+
+    # Buffer an event; False if the subscriber is too far behind and has been closed
+    def put(self, event):
+        if self.closed:
+            return False
+        if len(self.events) >= self.max_buffer:
+            self.overflowed = True
+            self.close()
+            return False
+
+        self.events.append(event)
+        self._ready.set()
+        return True
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    # Wait up to `timeout` seconds for events; returns those buffered (possibly none)
+    async def get(self, timeout):
+        if not self.events and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        events = list(self.events)
+        self.events.clear()
+        self._ready.clear()
+        return events
+
+
+"""
+In-process fan-out of notification events (created, and every status change) to
+live subscribers such as the SSE stream.
+Events get ids "<epoch>-<sequence>", where the epoch identifies this hub instance,
+and the last history_size are kept so a client reconnecting with the last id it saw
+gets what it missed. An id from another process or one that has fallen out of the
+history cannot be resumed from; the subscriber is told to resync instead.
+With the local source the repository publishes its own writes, so with several
+workers each one streams only what it wrote; the change stream source (replica sets)
+sees all of them.
+"""
+class EventHub():
+
+    def __init__(self, source=EVENT_SOURCE, history_size=EVENT_HISTORY_SIZE, buffer_size=SSE_BUFFER_SIZE):
+        self.source = source
+        self.buffer_size = buffer_size
+        self.epoch = f"{int(time.time()):x}{os.getpid():x}"
+
+        self.history = deque(maxlen=history_size)
+        self.subscribers = set()
+        self.sequence = 0
+        self._active_source = "local" if source != "change_stream" else None
+        self._task = None
+
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    # Whether the repository should publish its own writes
+    @property
+    def publishes_locally(self):
+        return self._active_source == "local"
+
+    def publish(self, event_type, notification, status, previous_status=None):
+        self.sequence += 1
+        event = {
+            "id": f"{self.epoch}-{self.sequence}",
+            "event": event_type,
+            "notification_id": str(notification.get("_id")) if notification.get("_id") is not None else None,
+            "transaction_number": notification.get("transaction_number"),
+            "status": status,
+            "previous_status": previous_status,
+            "risk_level": notification.get("risk_level"),
+            "at": datetime.now()
+        }
+        self.history.append((self.sequence, event))
+        self.published += 1
+
+        for subscription in list(self.subscribers):
+            if subscription.matches(event) and not subscription.put(event):
+                self.subscribers.discard(subscription)
+                if subscription.overflowed:
+                    self.dropped_subscribers += 1
+
+    # Called by the repository after a notification was stored
+    def notification_created(self, notification):
+        if self.publishes_locally:
+            self.publish("created", notification, notification.get("status", "pending"))
+
+    # Called by the repository after a notification's status was changed
+    def status_changed(self, notification, old_status, new_status):
+        if self.publishes_locally and old_status != new_status:
+            self.publish(new_status, notification, new_status, old_status)
+
+    # Subscribe; with last_event_id the missed events still in the history are buffered first.
+    # Returns (subscription, resumed): resumed is False if last_event_id could not be honoured.
+    def subscribe(self, statuses=None, risk_levels=None, last_event_id=None):
+        subscription = Subscription(statuses, risk_levels, self.buffer_size)
+        resumed = True
+
+        if last_event_id:
+            missed = self._since(last_event_id)
+            if missed is None:
+                resumed = False
+            else:
+                for event in missed:
+                    if subscription.matches(event) and not subscription.put(event):
+                        break
+
+        if not subscription.closed:
+            self.subscribers.add(subscription)
+        return subscription, resumed
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        self.subscribers.discard(subscription)
+
+    # Events after last_event_id, or None if they are no longer (or never were) in the history
+    def _since(self, last_event_id):
+        epoch, _, sequence = last_event_id.rpartition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+
+        sequence = int(sequence)
+        oldest = self.history[0][0] if self.history else self.sequence + 1
+        if sequence > self.sequence or sequence < oldest - 1:
+            return None
+        return [event for number, event in self.history if number > sequence]
+
+    # Pick the event source; with a change stream, follow it in the background
+    async def start(self, collection):
+        if self._task or self.source == "local":
+            self._active_source = "local"
+            return
+
+        if await self._supports_change_streams(collection):
+            self._active_source = "change_stream"
+            self._task = asyncio.create_task(self._follow(collection), name="event-hub-change-stream")
+            logger.info("Notification events from a MongoDB change stream")
+        else:
+            self._active_source = "local"
+            logger.info("MongoDB has no change streams (not a replica set); publishing notification events locally")
+
+    async def _supports_change_streams(self, collection):
+        try:
+            hello = await collection.database.command("hello")
+        except Exception as e:
+            logger.warning("Could not tell whether MongoDB supports change streams: %s", e)
+            return False
+        return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+    async def _follow(self, collection):
+        resume_token = None
+        while True:
+            try:
+                async with collection.watch(CHANGE_STREAM_PIPELINE, full_document="updateLookup",
+                                            resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = change["_id"]
+                        notification = change.get("fullDocument") or {}
+                        if change["operationType"] == "insert":
+                            self.publish("created", notification, notification.get("status", "pending"))
+                        else:
+                            status = change["updateDescription"]["updatedFields"]["status"]
+                            self.publish(status, notification, status)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Notification change stream failed, reopening: %s", e)
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        for subscription in list(self.subscribers):
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        return {
+            "source": self._active_source,
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "history": len(self.history),
+            "dropped_subscribers": self.dropped_subscribers
+        }
+
+
+# Create instance
+event_hub = EventHub()
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv # type: ignore
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Logging settings
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Records waiting for the writer thread; when it falls this far behind, new records are dropped (and counted)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Per-logger sampling, "logger=fraction,...": keep that fraction of the logger's records
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# Per-logger rate limits, "logger=records_per_second,...": the excess is dropped and counted
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "app.services.telegram_service.simulation=1")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Loggers configured by uvicorn with their own (blocking) handlers
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "context"}
+
+# Fields added to every record logged inside log_context()
+_context = contextvars.ContextVar("log_context", default={})
+
+
+# Parse "name=value,name=value" into {name: float}
+def parse_rules(spec):
+    rules = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            rules[name.strip()] = float(value)
+    return rules
+
+
+"""
+Attach fields (e.g. transaction_number, notification_id) to every record logged
+inside the block, including records from the services it calls.
+"""
+@contextmanager
+def log_context(**fields):
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+"""
+Drops records from noisy loggers: sampling keeps a fraction of them, rate limits
+cap them at N per second. Rules apply to a logger and its children, the most
+specific rule winning. The first record let through after a run of rate-limited
+ones carries the number dropped as `suppressed`.
+"""
+class NoiseFilter(logging.Filter):
+
+    def __init__(self, sampling=None, rate_limits=None):
+        super().__init__()
+        self.sampling = sampling or {}
+        self.rate_limits = rate_limits or {}
+        self._rules = {}
+        self._buckets = {}
+
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    # The most specific rule name matching a logger, for each kind of rule
+    def _rule(self, name):
+        rule = self._rules.get(name)
+        if rule is None:
+            rule = tuple(self._match(rules, name) for rules in (self.sampling, self.rate_limits))
+            self._rules[name] = rule
+        return rule
+
+    def _match(self, rules, name):
+        matches = [rule for rule in rules if name == rule or name.startswith(rule + ".")]
+        return max(matches, key=len) if matches else None
+
+    def filter(self, record):
+        sampled, limited = self._rule(record.name)
+
+        if sampled and random.random() >= self.sampling[sampled]:
+            self.sampled_out += 1
+            return False
+
+        if limited:
+            rate = self.rate_limits[limited]
+            now = time.monotonic()
+            tokens, updated, suppressed = self._buckets.get(limited, (max(rate, 1.0), now, 0))
+            tokens = min(max(rate, 1.0), tokens + (now - updated) * rate)
+
+            if tokens < 1:
+                self._buckets[limited] = (tokens, now, suppressed + 1)
+                self.rate_limited += 1
+                return False
+
+            self._buckets[limited] = (tokens - 1, now, 0)
+            if suppressed:
+                record.suppressed = suppressed
+
+        return True
+
+
+"""
+QueueHandler that never blocks the caller: records are handed to the writer
+thread unformatted (the message is only built there, and only if it is written),
+and dropped if the queue is full rather than waiting for room.
+"""
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The context belongs to the calling task, so capture it now
+        record.context = _context.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, context and `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "context", None) or {})
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+"""
+Routes all logging through a queue to a background writer thread.
+The root logger (and uvicorn's loggers) get a NonBlockingQueueHandler with the
+noise filter; a QueueListener thread formats (JSON or text) and writes to
+the stream. Whatever is still queued is written out at interpreter exit.
+"""
+class LogService():
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self.noise = None
+
+    @property
+    def configured(self):
+        return self.listener is not None
+
+    def configure(self, level=LOG_LEVEL, format=LOG_FORMAT, stream=None, queue_size=LOG_QUEUE_SIZE,
+                  sampling=LOG_SAMPLING, rate_limits=LOG_RATE_LIMITS):
+        if self.listener:
+            return
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if format == "json" else logging.Formatter(TEXT_FORMAT))
+
+        records = queue.Queue(queue_size)
+        self.noise = NoiseFilter(parse_rules(sampling), parse_rules(rate_limits))
+        self.handler = NonBlockingQueueHandler(records)
+        self.handler.addFilter(self.noise)
+
+        root = logging.getLogger()
+        root.handlers = [self.handler]
+        root.setLevel(level)
+
+        for name in UVICORN_LOGGERS:
+            logger = logging.getLogger(name)
+            if logger.handlers:
+                logger.handlers = [self.handler]
+
+        self.listener = logging.handlers.QueueListener(records, output)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    # Write out what is queued and stop the writer thread
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    def stats(self):
+        if not self.handler:
+            return {"configured": False}
+
+        return {
+            "configured": self.configured,
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "sampled_out": self.noise.sampled_out,
+            "rate_limited": self.noise.rate_limited
+        }
+
+
+# Create instance
+log_service = LogService()
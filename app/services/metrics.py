@@ -0,0 +1,401 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+from dotenv import load_dotenv # type: ignore
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Multi-worker aggregation: with a directory set, every worker writes its metrics there
+# and /metrics, whichever worker answers, reports all of them (see MultiprocessMetrics)
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", 1))
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric():
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple([str(labels.get(name, "")) for name in self.labelnames])
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + body + "}"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, key, value):
+        self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}_total{self._format_labels(key)} {value}"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{self._format_labels(key)} {value}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # Per-bucket counts (not cumulative) plus +Inf, then sum and count
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    # Context manager that observes the time spent inside it
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def merge(self, key, value):
+        counts, total, count = value
+        series = self._values.get(key)
+        if series is None:
+            self._values[key] = [list(counts), total, count]
+            return
+        series[0] = [a + b for a, b in zip(series[0], counts)]
+        series[1] += total
+        series[2] += count
+
+    def samples(self):
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{self._format_labels(key, ('le', bound))} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(key)} {total}"
+            yield f"{self.name}_count{self._format_labels(key)} {count}"
+
+
+class _Timer():
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry():
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    # Prometheus text exposition format (version 0.0.4)
+    def render(self, metrics=None):
+        lines = []
+        for metric in self._metrics if metrics is None else metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    # This process's values, as JSON-friendly lists
+    def snapshot(self):
+        return {metric.name: [[list(key), value] for key, value in metric._values.items()] for metric in self._metrics}
+
+    # Render several processes' snapshots ({pid: (snapshot, alive)}) as one.
+    # Counters and histograms are summed over every process, including those that
+    # have exited, so they never go backwards; gauges are reported per live process
+    # with a pid label.
+    def render_merged(self, snapshots):
+        merged = []
+        for metric in self._metrics:
+            combined = copy.copy(metric)
+            combined._values = {}
+            if isinstance(metric, Gauge):
+                combined.labelnames = metric.labelnames + ("pid",)
+
+            for pid, (snapshot, alive) in sorted(snapshots.items()):
+                for key, value in snapshot.get(metric.name, []):
+                    if isinstance(metric, Gauge):
+                        if alive:
+                            combined._values[tuple(key) + (str(pid),)] = value
+                    else:
+                        combined.merge(tuple(key), value)
+            merged.append(combined)
+        return self.render(merged)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status", ("method", "route", "status")
+))
+HTTP_REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+))
+MONGO_OPERATION_DURATION = registry.register(Histogram(
+    "mongo_operation_duration_seconds", "MongoDB operation latency by repository operation", ("operation",)
+))
+MONGO_OPERATION_ERRORS = registry.register(Counter(
+    "mongo_operation_errors", "MongoDB operations that raised, by operation", ("operation",)
+))
+TELEGRAM_SEND_DURATION = registry.register(Histogram(
+    "telegram_send_duration_seconds", "Telegram send latency including rate-limit waits", ("kind",)
+))
+TELEGRAM_ERRORS = registry.register(Counter(
+    "telegram_errors", "Telegram send errors by error type", ("error_type",)
+))
+NOTIFICATIONS = registry.register(Counter(
+    "notifications", "Delivery outcomes by status and risk level", ("status", "risk_level")
+))
+DELIVERY_QUEUE_DEPTH = registry.register(Gauge(
+    "delivery_queue_depth", "Notifications waiting in the delivery queue"
+))
+DELIVERY_QUEUE_OLDEST_AGE = registry.register(Gauge(
+    "delivery_queue_oldest_age_seconds", "Age of the oldest notification in the delivery queue"
+))
+TELEGRAM_POOL_IN_USE = registry.register(Gauge(
+    "telegram_pool_in_use", "Telegram HTTP requests in flight (compare with TELEGRAM_POOL_SIZE)"
+))
+NOTIFICATION_TIME_TO_SEND = registry.register(Histogram(
+    "notification_time_to_send_seconds", "Time from an alert being accepted to it being sent, by risk level", ("risk_level",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+))
+TELEGRAM_RATE_LIMIT_WAIT = registry.register(Histogram(
+    "telegram_rate_limit_wait_seconds", "Time a send waited for rate budget, by risk level", ("risk_level",)
+))
+MONGO_COALESCED_BATCH_SIZE = registry.register(Histogram(
+    "mongo_coalesced_batch_size", "Writes flushed together in one coalesced bulk_write",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+))
+
+
+# Decorator recording the latency (and errors) of an async repository method
+def mongo_timed(operation):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                MONGO_OPERATION_ERRORS.inc(operation=operation)
+                raise
+            finally:
+                MONGO_OPERATION_DURATION.observe(time.perf_counter() - start, operation=operation)
+        return wrapper
+    return decorator
+
+
+# Decorator recording the latency of a Telegram send and counting failed results by error type
+def telegram_timed(kind):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = await func(*args, **kwargs)
+            TELEGRAM_SEND_DURATION.observe(time.perf_counter() - start, kind=kind)
+
+            if not result.get("success"):
+                TELEGRAM_ERRORS.inc(error_type=result.get("error_type", "unknown"))
+            return result
+        return wrapper
+    return decorator
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+"""
+Metrics across worker processes. Each worker keeps its own registry and writes a
+snapshot of it to <directory>/<pid>.json every `interval` seconds (and when it stops);
+/metrics, answered by whichever worker the request reaches, merges every snapshot
+with its own current values, so scrapes no longer jump between workers' counters.
+Another worker's values are up to `interval` seconds old. The directory must be
+emptied before the workers start (the launcher does); without one, /metrics reports
+this process alone.
+"""
+class MultiprocessMetrics():
+
+    def __init__(self, registry, directory=METRICS_MULTIPROC_DIR, interval=METRICS_SNAPSHOT_INTERVAL):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task = None
+        self._collect = None
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    # Write this process's snapshot, replacing the previous one atomically
+    def write(self):
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(temporary, path)
+
+    def read(self):
+        pid = os.getpid()
+        snapshots = {pid: (self.registry.snapshot(), True)}
+        for name in os.listdir(self.directory):
+            stem, extension = os.path.splitext(name)
+            if extension != ".json" or not stem.isdigit() or int(stem) == pid:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots[int(stem)] = (json.load(f), _alive(int(stem)))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping metrics snapshot %s: %s", name, e)
+        return snapshots
+
+    def render(self):
+        if not self.enabled:
+            return self.registry.render()
+        return self.registry.render_merged(self.read())
+
+    # Start writing snapshots; collect() is called before each one to refresh gauges
+    async def start(self, collect=None):
+        if not self.enabled or self._task:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._collect = collect
+        self._task = asyncio.create_task(self._run(), name="metrics-snapshots")
+
+    async def _run(self):
+        while True:
+            try:
+                if self._collect:
+                    self._collect()
+                await asyncio.to_thread(self.write)
+            except Exception as e:
+                logger.error("Failed to write metrics snapshot: %s", e)
+            await asyncio.sleep(self.interval)
+
+    # Stop, leaving a final snapshot so this worker's counts stay in the totals
+    async def stop(self):
+        if not self._task:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.write()
+
+
+# Create instance
+multiprocess_metrics = MultiprocessMetrics(registry)
+
+
+class MetricsMiddleware():
+    """
+    ASGI middleware recording request latency by route template and status, and in-flight requests.
+    A request is timed up to its first body chunk: the whole request for an ordinary
+    response, time to first byte for a streaming one (exports, the SSE stream), which
+    would otherwise count as one request lasting minutes and stay in flight throughout.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+        observed = [False]
+        start = time.perf_counter()
+
+        def observe():
+            if observed[0]:
+                return
+            observed[0] = True
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; use its template to keep labels bounded
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route.path if route else "unmatched",
+                status=status[0]
+            )
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                observe()
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            observe()
@@ -0,0 +1,128 @@
+import os
+import fcntl
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from dotenv import load_dotenv # type: ignore
+from ..db.archive import archive_store
+from ..db.notifications import get_archive_candidates, mark_notifications_archived, ensure_retention_index
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Retention settings
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+# Days a notification stays in MongoDB (the hot window) before the TTL index expires it
+RETENTION_HOT_DAYS = float(os.getenv("RETENTION_HOT_DAYS", 30))
+# Seconds before expiry that a notification is archived; several archive intervals,
+# so a pass that fails or runs late is retried before anything expires
+ARCHIVE_LEAD = float(os.getenv("ARCHIVE_LEAD", 3600))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 300))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", 5000))
+
+# Only notifications that are done with are archived (and so ever expire);
+# a dead letter that is requeued is taken back out (see requeue_dead_letters)
+ARCHIVE_STATUSES = ("sent", "dead_letter")
+
+
+"""
+Enforces the retention window: a TTL index on created_at expires notifications
+older than hot_days, and in the background they are copied to the archive
+(see ArchiveStore) `lead` seconds before that, then flagged as archived.
+The TTL index only expires flagged notifications, so nothing leaves MongoDB
+without an archived copy, whatever state the archiver is in.
+The archive is on this host's disk: run the archiver on one host. Workers on
+that host take turns through a lock file in the archive directory.
+"""
+class RetentionArchiver():
+
+    # Initialize the archiver with the retention window and its polling interval and batch size
+    def __init__(self, store=archive_store, hot_days=RETENTION_HOT_DAYS, lead=ARCHIVE_LEAD,
+                 interval=ARCHIVE_INTERVAL, batch=ARCHIVE_BATCH):
+        self.store = store
+        self.window = timedelta(days=hot_days)
+        self.lead = timedelta(seconds=lead)
+        self.interval = interval
+        self.batch = batch
+
+        self._task = None
+
+        self.archived = 0
+        self.passes = 0
+        self.last_pass = None
+
+    async def start(self):
+        if self._task:
+            return
+
+        await ensure_retention_index(self.window.total_seconds())
+        self._task = asyncio.create_task(self._run(), name="retention-archiver")
+        logger.info("Retention archiver started (hot window %s, every %ss)", self.window, self.interval)
+
+    async def stop(self):
+        if not self._task:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Retention archiver stopped")
+
+    # Archive everything due; returns how many notifications were archived (0 if another worker is at it)
+    async def archive_once(self):
+        os.makedirs(self.store.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.store.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            cutoff = datetime.now() - (self.window - self.lead)
+            archived = 0
+            while True:
+                notifications = await get_archive_candidates(cutoff, self.batch, ARCHIVE_STATUSES)
+                if not notifications:
+                    break
+
+                await asyncio.to_thread(self.store.write, notifications)
+                marked = await mark_notifications_archived([n["_id"] for n in notifications], ARCHIVE_STATUSES)
+                archived += marked
+
+                # The rest changed status since they were read; they are picked up again later
+                if len(notifications) < self.batch or not marked:
+                    break
+        finally:
+            os.close(fd)
+
+        self.archived += archived
+        self.passes += 1
+        self.last_pass = datetime.now()
+        if archived:
+            logger.info("Archived %s notifications created before %s", archived, cutoff)
+        return archived
+
+    async def _run(self):
+        while True:
+            try:
+                await self.archive_once()
+            except Exception as e:
+                logger.error("Archive pass failed: %s", e)
+
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "hot_days": self.window.total_seconds() / 86400,
+            "archived": self.archived,
+            "passes": self.passes,
+            "last_pass": self.last_pass.isoformat() if self.last_pass else None,
+            "archive": self.store.stats()
+        }
+
+
+# Create instance
+retention_archiver = RetentionArchiver()
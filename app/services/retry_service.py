@@ -0,0 +1,220 @@
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from dotenv import load_dotenv # type: ignore
+from ..db.notifications import claim_due_notification, renew_notification_leases
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Retry settings
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 5))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 30))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 3600))
+# How long a "pending" notification may stay untouched before it is treated as abandoned
+PENDING_LEASE_TIMEOUT = float(os.getenv("PENDING_LEASE_TIMEOUT", 300))
+RETRY_SWEEP_ENABLED = os.getenv("RETRY_SWEEP_ENABLED", "true").lower() == "true"
+RETRY_SWEEP_INTERVAL = float(os.getenv("RETRY_SWEEP_INTERVAL", 15))
+RETRY_SWEEP_BATCH = int(os.getenv("RETRY_SWEEP_BATCH", 100))
+RETRY_SWEEP_CONCURRENCY = int(os.getenv("RETRY_SWEEP_CONCURRENCY", 5))
+
+
+# Delay before the next attempt: exponential backoff with full jitter
+def backoff_delay(attempts):
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+# Fields to $set after a failed attempt: schedule a retry, or dead-letter it
+def failure_update(notification, error):
+    attempts = notification.get("attempts", 0) + 1
+    now = datetime.now()
+
+    if attempts >= RETRY_MAX_ATTEMPTS:
+        return {
+            "status": "dead_letter",
+            "error": error,
+            "attempts": attempts,
+            "failed_at": now,
+            "next_attempt_at": None
+        }
+
+    return {
+        "status": "failed",
+        "error": error,
+        "attempts": attempts,
+        "failed_at": now,
+        "next_attempt_at": now + timedelta(seconds=backoff_delay(attempts))
+    }
+
+
+"""
+Holds the leases of notifications this process has taken on outside the dispatcher:
+new alerts in sync and queue mode (leased when they are stored, see build_notification),
+those claimed by the retry sweeper, and those waiting in a digest. While they wait in
+the delivery queue, for rate budget or for the digest, every lease is renewed each
+third of its length in one bulk write, so the sweeper (or a dispatcher) elsewhere only
+takes them over once this process has stopped renewing: it died, or lost Mongo for
+longer than a lease. The outcome is written fenced on the lease_id.
+A lease found taken over is reported as lost, and the delivery skips the send.
+"""
+class LeaseKeeper():
+
+    def __init__(self, lease=PENDING_LEASE_TIMEOUT):
+        self.lease = lease
+
+        self._held = {}
+        self._lost = set()
+        self._task = None
+
+        self.renewals = 0
+        self.leases_lost = 0
+
+    # Keep renewing a claimed notification's lease until release(); a no-op without a lease
+    def hold(self, notification):
+        if notification.get("lease_id"):
+            self._held[notification["_id"]] = notification["lease_id"]
+
+    def release(self, id):
+        self._held.pop(id, None)
+        self._lost.discard(id)
+
+    # Whether the lease was taken over since hold(); the notification must not be sent
+    def lost(self, id):
+        return id in self._lost
+
+    async def renew(self):
+        leases = dict(self._held)
+        if not leases:
+            return
+
+        held = await renew_notification_leases(leases, self.lease)
+        self.renewals += 1
+
+        for id, lease_id in leases.items():
+            # Released while the renewal was in flight, or still held
+            if id in held or self._held.get(id) != lease_id:
+                continue
+            self._held.pop(id)
+            self._lost.add(id)
+            self.leases_lost += 1
+            logger.warning("Lease %s on notification %s was taken over", lease_id, id)
+
+    async def start(self):
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run(), name="lease-keeper")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.renew()
+            except Exception as e:
+                logger.error("Lease renewal failed: %s", e)
+
+    # Stop renewing; what is still held expires and is picked up elsewhere
+    async def stop(self):
+        if not self._task:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "held": len(self._held),
+            "renewals": self.renewals,
+            "leases_lost": self.leases_lost
+        }
+
+
+# Create instance
+lease_keeper = LeaseKeeper()
+
+
+class RetrySweeper():
+
+    # Initialize the sweeper with its polling interval and batch size
+    def __init__(self, interval=RETRY_SWEEP_INTERVAL, batch=RETRY_SWEEP_BATCH,
+                 concurrency=RETRY_SWEEP_CONCURRENCY, lease_timeout=PENDING_LEASE_TIMEOUT):
+        self.interval = interval
+        self.batch = batch
+        self.concurrency = concurrency
+        self.lease_timeout = lease_timeout
+
+        self._task = None
+        self._handler = None
+
+        self.retried = 0
+
+    # Start sweeping; handler is awaited as handler(notification, data)
+    async def start(self, handler):
+        if self._task:
+            return
+
+        self._handler = handler
+        self._task = asyncio.create_task(self._run(), name="retry-sweeper")
+        logger.info("Retry sweeper started (every %ss)", self.interval)
+
+    async def stop(self):
+        if not self._task:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Retry sweeper stopped")
+
+    # Claim up to one batch of due notifications and deliver them
+    async def sweep(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+
+        async def deliver(notification):
+            async with semaphore:
+                try:
+                    # The stored document carries the alert fields needed to re-send
+                    await self._handler(notification, notification)
+                except Exception as e:
+                    logger.error("Retry of %s failed: %s", notification['_id'], e)
+
+        for _ in range(self.batch):
+            notification = await claim_due_notification(self.lease_timeout)
+            if not notification:
+                break
+            # Renewed while it waits for a delivery slot and for rate budget
+            lease_keeper.hold(notification)
+            tasks.append(asyncio.create_task(deliver(notification)))
+
+        if tasks:
+            await asyncio.gather(*tasks)
+            self.retried += len(tasks)
+            logger.info("Retry sweeper re-sent %s notifications", len(tasks))
+
+        return len(tasks)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error("Retry sweep failed: %s", e)
+
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "retried": self.retried
+        }
+
+
+# Create instance
+retry_sweeper = RetrySweeper()
@@ -0,0 +1,346 @@
+import os
+import glob
+import json
+import fcntl
+import socket
+import asyncio
+import logging
+from datetime import datetime
+from dotenv import load_dotenv # type: ignore
+from .circuit_breaker import mongo_breaker, is_mongo_unavailable
+from ..models.serializers import dumps
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Spill journal settings
+SPILL_JOURNAL_ENABLED = os.getenv("SPILL_JOURNAL_ENABLED", "true").lower() == "true"
+SPILL_JOURNAL_DIR = os.getenv("SPILL_JOURNAL_DIR", "spill_journal")
+# Appends arriving within this window are written and fsynced together (group commit)
+SPILL_FSYNC_INTERVAL = float(os.getenv("SPILL_FSYNC_INTERVAL", 0.01))
+# How often to look for journaled alerts to replay once Mongo is back
+SPILL_REPLAY_INTERVAL = float(os.getenv("SPILL_REPLAY_INTERVAL", 1))
+SPILL_REPLAY_BATCH = int(os.getenv("SPILL_REPLAY_BATCH", 500))
+
+
+# Byte offset up to which a journal file has been replayed (kept in a sidecar file)
+def read_offset(path):
+    try:
+        with open(f"{path}.offset") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_offset(path, offset):
+    temporary = f"{path}.offset.tmp"
+    with open(temporary, "w") as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, f"{path}.offset")
+
+
+def remove_offset(path):
+    try:
+        os.remove(f"{path}.offset")
+    except FileNotFoundError:
+        pass
+
+
+# Read up to `limit` complete lines from `offset`; returns [(offset after the line, entry or None)].
+# An unterminated last line is still being written, unless `final` (its writer is gone), in which
+# case it is a torn write and skipped.
+def read_entries(path, offset, limit, final=False):
+    entries = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while len(entries) < limit:
+            line = f.readline()
+            if not line:
+                break
+            if not line.endswith(b"\n") and not final:
+                break
+
+            offset += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.error("Skipping corrupt spill journal entry in %s before byte %s", path, offset)
+                entry = None
+            entries.append((offset, entry))
+    return entries
+
+
+"""
+Local append-only journal for alerts accepted while Mongo is unavailable.
+Each process appends JSON lines to its own file (spill-<host>-<pid>.journal), held
+under an exclusive flock while it runs. Appends are group-committed: everything that
+arrives within fsync_interval is written and fsynced in one go, and append() returns
+only once its line is on disk, so an alert answered with 202 survives a crash.
+Once the Mongo breaker closes, entries are replayed in order through the handler,
+which must be idempotent on transaction_number: progress is saved in a sidecar offset
+file, and an entry may be replayed again after a crash. Journals left behind by dead
+processes (their flock is free) are replayed and removed by whoever gets to them first.
+"""
+class SpillJournal():
+
+    def __init__(self, directory=SPILL_JOURNAL_DIR, enabled=SPILL_JOURNAL_ENABLED, fsync_interval=SPILL_FSYNC_INTERVAL,
+                 replay_interval=SPILL_REPLAY_INTERVAL, replay_batch=SPILL_REPLAY_BATCH):
+        self.directory = directory
+        self.enabled = enabled
+        self.fsync_interval = fsync_interval
+        self.replay_interval = replay_interval
+        self.replay_batch = replay_batch
+
+        self.path = None
+        self._fd = None
+        self._pid = None
+        self._buffer = []
+        self._waiters = []
+        self._flusher = None
+        self._lock = None
+        self._task = None
+
+        self.appended = 0
+        self.fsyncs = 0
+        self.replayed = 0
+        self.replay_errors = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    # Open (and lock) this process's journal; again after a fork, since the lock is per process
+    def _ensure_open(self):
+        if self._fd is not None and self._pid == os.getpid():
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"spill-{socket.gethostname()}-{os.getpid()}.journal")
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._pid = os.getpid()
+        self._lock = asyncio.Lock()
+        self._buffer, self._waiters, self._flusher = [], [], None
+
+        # Make the new file's directory entry durable too
+        directory_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+    # Append an alert; returns once it is fsynced
+    async def append(self, data):
+        self._ensure_open()
+
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append(dumps({"journaled_at": datetime.now(), "data": data}) + b"\n")
+        self._waiters.append(future)
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+
+        await future
+
+    async def _flush(self):
+        # Let concurrent appends pile up so they share one fsync
+        await asyncio.sleep(self.fsync_interval)
+
+        async with self._lock:
+            lines, waiters = self._buffer, self._waiters
+            self._buffer, self._waiters = [], []
+
+            try:
+                await asyncio.to_thread(self._write, b"".join(lines))
+            except Exception as e:
+                logger.error("Failed to write %s entries to the spill journal: %s", len(lines), e)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+            else:
+                self.appended += len(lines)
+                self.fsyncs += 1
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+
+        if self._buffer:
+            self._flusher = asyncio.create_task(self._flush())
+
+    def _write(self, payload):
+        view = memoryview(payload)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        os.fsync(self._fd)
+
+    # Journal files with entries not yet replayed, oldest first
+    def _backlog(self):
+        backlog = []
+        for path in glob.glob(os.path.join(self.directory, "spill-*.journal")):
+            try:
+                size = os.path.getsize(path)
+                modified = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if size > read_offset(path) or path != self.path:
+                backlog.append((modified, path))
+        return [path for _, path in sorted(backlog)]
+
+    # Replay whatever is journaled, provided Mongo is reachable
+    async def replay(self, handler, probe):
+        backlog = self._backlog()
+        if not backlog:
+            return 0
+
+        # A half-open breaker is tested with a cheap probe rather than the first entry
+        state = mongo_breaker.state
+        if state == "open":
+            return 0
+        if state == "half_open":
+            await probe()
+
+        replayed = 0
+        for path in backlog:
+            if path == self.path:
+                replayed += await self._replay_own(handler)
+            else:
+                replayed += await self._replay_orphan(path, handler)
+        return replayed
+
+    async def _replay_own(self, handler):
+        replayed, offset = await self._replay_file(self.path, handler, final=False)
+
+        # Everything written so far is replayed: start the file afresh. The offset goes
+        # first, so a crash in between means replaying again rather than losing entries.
+        async with self._lock:
+            if os.fstat(self._fd).st_size == offset:
+                remove_offset(self.path)
+                os.ftruncate(self._fd, 0)
+
+        return replayed
+
+    async def _replay_orphan(self, path, handler):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Still owned by a live process, or being replayed by another one
+                return 0
+
+            # Someone else finished it between our listing and taking the lock
+            if not os.path.exists(path):
+                return 0
+
+            replayed, _ = await self._replay_file(path, handler, final=True)
+            remove_offset(path)
+            os.remove(path)
+            logger.info("Replayed and removed spill journal %s", path)
+            return replayed
+        finally:
+            os.close(fd)
+
+    # Replay a file from its saved offset; stops (raising) if Mongo goes away again
+    async def _replay_file(self, path, handler, final):
+        offset = read_offset(path)
+        if offset > os.path.getsize(path):
+            offset = 0
+
+        replayed = 0
+        while True:
+            entries = await asyncio.to_thread(read_entries, path, offset, self.replay_batch, final)
+            if not entries:
+                return replayed, offset
+
+            try:
+                for next_offset, entry in entries:
+                    if entry is not None:
+                        try:
+                            await handler(entry["data"], datetime.fromisoformat(entry["journaled_at"]))
+                        except Exception as e:
+                            if is_mongo_unavailable(e):
+                                raise
+                            # A bad entry must not block everything behind it
+                            self.replay_errors += 1
+                            logger.error("Failed to replay spill journal entry: %s", e)
+                        else:
+                            replayed += 1
+                            self.replayed += 1
+                    offset = next_offset
+            finally:
+                await asyncio.to_thread(write_offset, path, offset)
+
+    async def _run(self, handler, probe):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            try:
+                replayed = await self.replay(handler, probe)
+                if replayed:
+                    logger.info("Replayed %s journaled notifications", replayed)
+            except Exception as e:
+                logger.error("Spill journal replay stopped: %s", e)
+
+    # Start replaying; handler is awaited as handler(data, journaled_at), probe() checks Mongo
+    async def start(self, handler, probe):
+        if not self.enabled or self._task:
+            return
+
+        self._ensure_open()
+        self._task = asyncio.create_task(self._run(handler, probe), name="spill-journal-replay")
+        logger.info("Spill journal at %s", self.path)
+
+    # Stop replaying, write out pending appends and release the journal
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        # A flush can schedule another for appends that arrived meanwhile
+        while self._flusher and not self._flusher.done():
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+
+        if self._fd is not None and self._pid == os.getpid():
+            # Nothing left to replay: don't leave an empty file behind
+            if os.fstat(self._fd).st_size == 0:
+                remove_offset(self.path)
+                os.remove(self.path)
+            os.close(self._fd)
+        self._fd = None
+
+    def stats(self):
+        pending_bytes = 0
+        files = 0
+        for path in glob.glob(os.path.join(self.directory, "spill-*.journal")):
+            try:
+                pending = os.path.getsize(path) - read_offset(path)
+            except FileNotFoundError:
+                continue
+            if pending > 0:
+                files += 1
+                pending_bytes += pending
+
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "files_pending": files,
+            "pending_bytes": pending_bytes,
+            "appended": self.appended,
+            "fsyncs": self.fsyncs,
+            "replayed": self.replayed,
+            "replay_errors": self.replay_errors
+        }
+
+
+# Create instance
+spill_journal = SpillJournal()
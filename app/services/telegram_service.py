@@ -1,74 +1,559 @@
 import os 
+import time
+import heapq
+import asyncio
+import itertools
 import logging 
 from datetime import datetime 
+import httpx # type: ignore
 import telegram  # type: ignore
 from telegram.constants import ParseMode # type: ignore
+from telegram.error import RetryAfter, TimedOut, NetworkError # type: ignore
+from telegram.request import BaseRequest # type: ignore
 from dotenv import load_dotenv # type: ignore
+from .metrics import telegram_timed, TELEGRAM_RATE_LIMIT_WAIT
+from .circuit_breaker import telegram_breaker
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+# The simulated sends log every message in full; rate-limited by default (see LOG_RATE_LIMITS)
+simulation_logger = logging.getLogger(f"{__name__}.simulation")
+
+# Rate limit settings (Telegram allows ~30 msg/s per bot and ~20 msg/min per group)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_GLOBAL_BURST = int(os.getenv("TELEGRAM_GLOBAL_BURST", 30))
+TELEGRAM_CHAT_RATE_PER_MINUTE = float(os.getenv("TELEGRAM_CHAT_RATE_PER_MINUTE", 20))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", 5))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
+
+# Bot API endpoint; override to point at a local Bot API server or a test stand-in
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
+
+# HTTP transport settings (timeouts in seconds)
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 32))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", 5))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", 10))
+TELEGRAM_WRITE_TIMEOUT = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", 10))
+# How long a send may wait for a free pooled connection
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", 5))
+# Idle pooled connections are closed after this long
+TELEGRAM_KEEPALIVE_EXPIRY = float(os.getenv("TELEGRAM_KEEPALIVE_EXPIRY", 60))
+# HTTP/2 needs the h2 package (python-telegram-bot[http2]); falls back to HTTP/1.1 without it
+TELEGRAM_HTTP2 = os.getenv("TELEGRAM_HTTP2", "false").lower() == "true"
+# Connections opened at startup so the first alerts skip the TCP/TLS handshake
+TELEGRAM_WARMUP_CONNECTIONS = int(os.getenv("TELEGRAM_WARMUP_CONNECTIONS", 2))
+
+# Risk levels from lowest to highest, as returned by get_risk_level
+RISK_LEVELS = ("MEDIUM", "HIGH", "CRITICAL")
+# Lowest fraud probability for each level, highest level first
+RISK_THRESHOLDS = (("CRITICAL", 0.8), ("HIGH", 0.7), ("MEDIUM", 0.0))
+CRITICAL_RANK = RISK_LEVELS.index("CRITICAL")
+
+# Priority settings: sends waiting for rate budget are served by risk level, highest first
+# Seconds of waiting that count as one risk level, so lower levels cannot starve (0 = strict priority)
+PRIORITY_AGING = float(os.getenv("PRIORITY_AGING", 10))
+# Share of each rate-limit bucket's burst that only CRITICAL alerts may use
+TELEGRAM_CRITICAL_RESERVE = float(os.getenv("TELEGRAM_CRITICAL_RESERVE", 0.2))
+
+
+# Position of a risk level in RISK_LEVELS (its priority); unknown levels rank lowest
+def risk_rank(risk_level):
+    return RISK_LEVELS.index(risk_level) if risk_level in RISK_LEVELS else 0
+
+
+# Sort key for a waiter: lower is served first. Higher ranks go first; with aging, each
+# `aging` seconds already waited is worth one rank, so an old MEDIUM alert eventually
+# overtakes fresh CRITICAL ones. Ties are broken by arrival order by the caller.
+def priority_key(rank, arrival, aging=PRIORITY_AGING):
+    if aging > 0:
+        return arrival / aging - rank
+    return -rank
+
+
+class TokenBucket():
+
+    # rate is in tokens per second, capacity is the largest burst allowed;
+    # `reserve` (a share of capacity) is kept back for CRITICAL sends
+    def __init__(self, rate, capacity, reserve=TELEGRAM_CRITICAL_RESERVE, aging=PRIORITY_AGING):
+        self.rate = rate
+        self.capacity = capacity
+        self.reserved = capacity * reserve
+        self.aging = aging
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+        # Heap of (priority_key, sequence, rank, future); futures done already are skipped
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer = None
+        self._critical_waiting = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Tokens a send of this rank has to leave in the bucket
+    def _floor(self, rank):
+        return 0.0 if rank >= CRITICAL_RANK else self.reserved
+
+    # Wait for a token; waiters are served by priority_key. Returns seconds waited.
+    async def acquire(self, rank=0):
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority_key(rank, start, self.aging), next(self._sequence), rank, future))
+        critical = rank >= CRITICAL_RANK
+        self._critical_waiting += critical
+        self._grant()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled just after being handed a token: give it back
+            if future.done() and not future.cancelled():
+                self.tokens += 1
+            self._grant()
+            raise
+        finally:
+            self._critical_waiting -= critical
+
+        return time.monotonic() - start
+
+    # Hand out the tokens available now, then wake up when the next one is due
+    def _grant(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        waiters = self._waiters
+        while True:
+            while waiters and waiters[0][3].done():
+                heapq.heappop(waiters)
+            if not waiters:
+                return
+
+            now = time.monotonic()
+            if now < self.blocked_until:
+                delay = self.blocked_until - now
+                break
+
+            self._refill(now)
+            _, _, rank, future = waiters[0]
+            if self.tokens >= 1 + self._floor(rank):
+                heapq.heappop(waiters)
+                self.tokens -= 1
+                future.set_result(None)
+                continue
+
+            # The first in line has to wait, but a CRITICAL send behind it may use the reserve
+            critical = self._first_critical()
+            if critical is None:
+                delay = (1 + self._floor(rank) - self.tokens) / self.rate
+                break
+            if self.tokens >= 1:
+                self.tokens -= 1
+                critical.set_result(None)
+                continue
+
+            delay = (1 - self.tokens) / self.rate
+            break
+
+        self._timer = asyncio.get_running_loop().call_later(delay, self._grant)
+
+    def _first_critical(self):
+        if not self._critical_waiting:
+            return None
+        waiting = [waiter for waiter in self._waiters if waiter[2] >= CRITICAL_RANK and not waiter[3].done()]
+        return min(waiting)[3] if waiting else None
+
+    # Hold all sends for the given number of seconds (Telegram retry_after)
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class RateLimiter():
+
+    # Global bucket for the bot plus one bucket per chat
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, global_burst=TELEGRAM_GLOBAL_BURST,
+                 chat_rate_per_minute=TELEGRAM_CHAT_RATE_PER_MINUTE, chat_burst=TELEGRAM_CHAT_BURST,
+                 critical_reserve=TELEGRAM_CRITICAL_RESERVE, aging=PRIORITY_AGING):
+        self.critical_reserve = critical_reserve
+        self.aging = aging
+        self.global_bucket = TokenBucket(global_rate, global_burst, critical_reserve, aging)
+        self.chat_rate = chat_rate_per_minute / 60
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.acquired = 0
+        self.retry_afters = 0
+        # risk_level -> [sends, total wait, max wait]
+        self.by_risk_level = {}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst, self.critical_reserve, self.aging)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    # Wait until both the chat and the global budget allow a send, higher risk levels first.
+    # Returns seconds waited.
+    async def acquire(self, chat_id, risk_level=None):
+        rank = risk_rank(risk_level)
+
+        # Chat first, so a busy chat does not hold global tokens while it waits
+        waited = await self._chat_bucket(chat_id).acquire(rank)
+        waited += await self.global_bucket.acquire(rank)
+
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+        TELEGRAM_RATE_LIMIT_WAIT.observe(waited, risk_level=RISK_LEVELS[rank])
+        level = self.by_risk_level.setdefault(RISK_LEVELS[rank], [0, 0.0, 0.0])
+        level[0] += 1
+        level[1] += waited
+        level[2] = max(level[2], waited)
+        return waited
+
+    # Telegram answered 429 - hold the chat and the bot for retry_after seconds
+    def retry_after(self, chat_id, seconds):
+        self.retry_afters += 1
+        self._chat_bucket(chat_id).pause(seconds)
+        self.global_bucket.pause(seconds)
+
+    def stats(self):
+        return {
+            "acquired": self.acquired,
+            "retry_afters": self.retry_afters,
+            "avg_wait_seconds": round(self.total_wait / self.acquired, 4) if self.acquired else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+            "by_risk_level": {
+                level: {
+                    "acquired": count,
+                    "avg_wait_seconds": round(total / count, 4),
+                    "max_wait_seconds": round(longest, 4)
+                }
+                for level, (count, total, longest) in self.by_risk_level.items()
+            }
+        }
+
+
+"""
+Telegram transport on one pooled httpx client, with a keep-alive expiry and counters
+for pool utilisation. Built on BaseRequest rather than HTTPXRequest, which has no
+keep-alive option: the client is created once with the configured limits, and only
+replaced by initialize() after shutdown() has closed it.
+"""
+class PooledRequest(BaseRequest):
+
+    def __init__(self, connection_pool_size=TELEGRAM_POOL_SIZE, keepalive_expiry=TELEGRAM_KEEPALIVE_EXPIRY,
+                 connect_timeout=TELEGRAM_CONNECT_TIMEOUT, read_timeout=TELEGRAM_READ_TIMEOUT,
+                 write_timeout=TELEGRAM_WRITE_TIMEOUT, pool_timeout=TELEGRAM_POOL_TIMEOUT, http_version="1.1"):
+        self.pool_size = connection_pool_size
+        self.http_version = http_version
+
+        http1 = http_version == "1.1"
+        self._client_options = {
+            "timeout": httpx.Timeout(connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout),
+            "limits": httpx.Limits(
+                max_connections=connection_pool_size,
+                max_keepalive_connections=connection_pool_size,
+                keepalive_expiry=keepalive_expiry
+            ),
+            "http1": http1,
+            "http2": not http1
+        }
+        try:
+            self.client = httpx.AsyncClient(**self._client_options)
+        except ImportError as e:
+            raise RuntimeError(f"HTTP/2 needs python-telegram-bot[http2]: {e}") from e
+
+        # In-flight requests include those waiting for a free connection
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.pool_timeouts = 0
+
+    async def initialize(self):
+        if self.client.is_closed:
+            self.client = httpx.AsyncClient(**self._client_options)
+
+    async def shutdown(self):
+        if not self.client.is_closed:
+            await self.client.aclose()
+
+    # Timeouts the caller leaves at their default (DEFAULT_NONE) come from the client
+    def _timeout(self, read_timeout, write_timeout, connect_timeout, pool_timeout):
+        defaults = self.client.timeout
+        default = type(BaseRequest.DEFAULT_NONE)
+        return httpx.Timeout(
+            connect=defaults.connect if isinstance(connect_timeout, default) else connect_timeout,
+            read=defaults.read if isinstance(read_timeout, default) else read_timeout,
+            write=defaults.write if isinstance(write_timeout, default) else write_timeout,
+            pool=defaults.pool if isinstance(pool_timeout, default) else pool_timeout
+        )
+
+    async def _send(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                    write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                    pool_timeout=BaseRequest.DEFAULT_NONE):
+        if self.client.is_closed:
+            raise RuntimeError("PooledRequest is not initialized")
+
+        try:
+            response = await self.client.request(
+                method=method,
+                url=url,
+                headers={"User-Agent": self.USER_AGENT},
+                timeout=self._timeout(read_timeout, write_timeout, connect_timeout, pool_timeout),
+                files=request_data.multipart_data if request_data else None,
+                data=request_data.json_parameters if request_data else None
+            )
+        except httpx.PoolTimeout as e:
+            self.pool_timeouts += 1
+            raise TimedOut("Pool timeout: all pooled connections are busy; the request was not sent") from e
+        except httpx.TimeoutException as e:
+            raise TimedOut from e
+        except httpx.HTTPError as e:
+            raise NetworkError(f"httpx.{e.__class__.__name__}: {e}") from e
+
+        return response.status_code, response.content
+
+    async def do_request(self, *args, **kwargs):
+        self.in_flight += 1
+        self.requests += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            return await self._send(*args, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "http_version": self.http_version,
+            "pool_size": self.pool_size,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "utilisation": round(min(self.in_flight, self.pool_size) / self.pool_size, 3),
+            "requests": self.requests,
+            "pool_timeouts": self.pool_timeouts
+        }
+
+
+# Build the pooled transport from the settings above
+def build_request():
+    options = {
+        "connection_pool_size": TELEGRAM_POOL_SIZE,
+        "keepalive_expiry": TELEGRAM_KEEPALIVE_EXPIRY,
+        "connect_timeout": TELEGRAM_CONNECT_TIMEOUT,
+        "read_timeout": TELEGRAM_READ_TIMEOUT,
+        "write_timeout": TELEGRAM_WRITE_TIMEOUT,
+        "pool_timeout": TELEGRAM_POOL_TIMEOUT
+    }
+
+    if TELEGRAM_HTTP2:
+        try:
+            return PooledRequest(http_version="2", **options)
+        except RuntimeError as e:
+            logger.warning("HTTP/2 unavailable for Telegram, using HTTP/1.1: %s", e)
+
+    return PooledRequest(http_version="1.1", **options)
+
+
 class TelegramService():
 
     # Initialize the TelegramService with bot token and chat ID
+    # The bot itself is created per process by connect(), so it is never shared across a fork
     def __init__(self):
         # Get telegram settings from env
         self.token = os.getenv('TELEGRAM_BOT_TOKEN')
         self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
         self.bot = None
+        self.request = None
+        self.initialized = False
+        self.rate_limiter = RateLimiter()
+        self.max_retries = TELEGRAM_MAX_RETRIES
+        self._pid = None
 
         # Check if settings are provided
         if not self.token or not self.chat_id:
-            logging.error("Telegram bot token or chat ID is not set.")
+            logger.error("Telegram bot token or chat ID is not set.")
 
-        else:
-            try:
-                # Initialize the telegram bot
-                self.bot = telegram.Bot(token=self.token)
-                logging.info("Telegram bot initialized successfully.")
-            except Exception as e:
-                logging.error(f"Failed to initialize Telegram bot: {e}")
+    # Create the Telegram bot (and fresh rate limiter state) for the current process
+    def connect(self):
+        if not self.token or not self.chat_id:
+            return
+
+        try:
+            # Initialize the telegram bot on a pooled, tuned HTTP transport
+            self.request = build_request()
+            self.bot = telegram.Bot(token=self.token, base_url=TELEGRAM_API_BASE_URL, request=self.request)
+            self.initialized = False
+            self.rate_limiter = RateLimiter()
+            self._pid = os.getpid()
+            logger.info("Telegram bot initialized successfully.")
+        except Exception as e:
+            logger.error("Failed to initialize Telegram bot: %s", e)
+
+    # Create the bot, initialize it (getMe) and open a few pooled connections ahead of the first alert.
+    # Failures are logged, not raised: the service still starts and the bot connects on first use.
+    async def start(self, warmup_connections=TELEGRAM_WARMUP_CONNECTIONS):
+        # Reuses a bot already created in this process rather than leaving its client open
+        self._ensure_bot()
+        if not self.bot:
+            return
+
+        try:
+            await self.bot.initialize()
+            self.initialized = True
+
+            # initialize() opened one connection; concurrent getMe calls reuse it and open the rest
+            if warmup_connections > 1:
+                await asyncio.gather(*(self.bot.get_me() for _ in range(warmup_connections)))
+
+            logger.info("Telegram bot @%s ready (%s, pool of %s)", self.bot.username, self.request.http_version, self.request.pool_size)
+        except Exception as e:
+            logger.error("Failed to warm up Telegram connection: %s", e)
+
+    # Close the pooled connections
+    async def close(self):
+        if not self.bot:
+            return
+
+        try:
+            await self.bot.shutdown()
+        except Exception as e:
+            logger.error("Failed to shut down Telegram bot: %s", e)
+
+        self.bot = None
+        self.request = None
+        self.initialized = False
+
+    def stats(self):
+        return {
+            "configured": bool(self.token and self.chat_id),
+            "initialized": self.initialized,
+            "pool": self.request.stats() if self.request else None,
+            "rate_limiter": self.rate_limiter.stats()
+        }
+
+    # Connect lazily, and again if this process was forked after connecting
+    # (the parent's client is left alone: its connections are the parent's)
+    def _ensure_bot(self):
+        if self.bot is None or (self._pid is not None and self._pid != os.getpid()):
+            self.connect()
     
     # Send fraut alert to telegram bot
+    @telegram_timed("alert")
     async def send_fraud_alert(self, data):
         try:
             # Format message for Telegram
             message = self.format_fraud_message(data)
+            self._ensure_bot()
             
             # If bot is not configured, simulate sending
             if not self.bot or not self.chat_id:
-                logging.info(f"SIMULATION: Telegram message would be sent:\n{message}")
+                simulation_logger.info("SIMULATION: Telegram message would be sent:\n%s", message)
                 return {
                     "success": True,
                     "message_id": f"simulated-{datetime.now().timestamp()}",
                     "content": message
                 }
             
-            # Send the actual message
-            response = await self.bot.send_message(
-                chat_id=self.chat_id,
-                text=message,
-                parse_mode=ParseMode.HTML
-            )
+            # Send the actual message, waiting for the rate budget first
+            response, waited = await self.send_rate_limited(message, risk_level=self.get_risk_level(data.get("fraud_probability", 0)))
             
-            logging.info(f"Sent fraud alert to Telegram. Message ID: {response.message_id}")
+            logger.debug("Sent fraud alert to Telegram. Message ID: %s (waited %.3fs)", response.message_id, waited)
             
             return {
                 "success": True,
                 "message_id": str(response.message_id),
-                "content": message
+                "content": message,
+                "waited": waited
             }
             
         except Exception as e:
-            logging.error(f"Error sending Telegram notification: {str(e)}")
+            logger.error("Error sending Telegram notification: %s", e)
             return {
                 "success": False,
-                "error": str(e)
+                "error": str(e),
+                "error_type": type(e).__name__
             }
     
 
-    # Format the telegram message
-    def format_fraud_message(self, data):
+    # Send one digest message covering several alerts
+    @telegram_timed("digest")
+    async def send_digest(self, key, alerts):
+        try:
+            message = self.format_digest_message(key, alerts)
+            self._ensure_bot()
+
+            # If bot is not configured, simulate sending
+            if not self.bot or not self.chat_id:
+                simulation_logger.info("SIMULATION: Telegram digest would be sent:\n%s", message)
+                return {
+                    "success": True,
+                    "message_id": f"simulated-{datetime.now().timestamp()}",
+                    "content": message
+                }
+
+            response, waited = await self.send_rate_limited(message, risk_level=self.highest_risk_level(alerts))
+
+            logger.info("Sent digest of %s alerts to Telegram. Message ID: %s", len(alerts), response.message_id)
+
+            return {
+                "success": True,
+                "message_id": str(response.message_id),
+                "content": message,
+                "waited": waited
+            }
+
+        except Exception as e:
+            logger.error("Error sending Telegram digest: %s", e)
+            return {
+                "success": False,
+                "error": str(e),
+                "error_type": type(e).__name__
+            }
+
+
+    # Send a message within the rate limits, honouring Telegram's retry_after
+    # Returns the Telegram response and the total seconds spent waiting.
+    # While Telegram is unreachable the breaker fails sends at once (CircuitOpenError),
+    # before they queue for rate budget, and the retry schedule takes over.
+    async def send_rate_limited(self, message, chat_id=None, risk_level=None):
+        chat_id = chat_id or self.chat_id
+        waited = 0.0
+
+        for attempt in range(self.max_retries + 1):
+            telegram_breaker.check()
+            waited += await self.rate_limiter.acquire(chat_id, risk_level)
+
+            try:
+                response = await telegram_breaker.call(
+                    self.bot.send_message,
+                    chat_id=chat_id,
+                    text=message,
+                    parse_mode=ParseMode.HTML
+                )
+                return response, waited
+
+            except RetryAfter as e:
+                self.rate_limiter.retry_after(chat_id, e.retry_after)
+                logger.warning("Telegram flood control, retrying in %ss (attempt %s)", e.retry_after, attempt + 1)
+
+                if attempt == self.max_retries:
+                    raise
+
+
+    # Format the telegram message; detected_at defaults to now (pass the original time to render it again later)
+    def format_fraud_message(self, data, detected_at=None):
         fraud_probability = data.get("fraud_probability", 0)
         risk_level = self.get_risk_level(fraud_probability)
         emoji = self.get_emoji_for_risk(risk_level)
@@ -91,18 +576,51 @@ class TelegramService():
 <b>Transaction Location:</b> {data.get('transaction_location', 'N/A')}
 <b>Time:</b> {"Night" if data.get('is_nighttime') else "Day"}
 
-<i>Detected at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</i>
+<i>Detected at: {(detected_at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')}</i>
+"""
+
+
+    # Highest risk level among several alerts
+    def highest_risk_level(self, alerts):
+        return max(
+            (self.get_risk_level(alert.get("fraud_probability", 0)) for alert in alerts),
+            key=RISK_LEVELS.index
+        )
+
+    # Format a digest message for alerts sharing a key (merchant/category)
+    def format_digest_message(self, key, alerts):
+        highest = self.highest_risk_level(alerts)
+        emoji = self.get_emoji_for_risk(highest)
+        total = sum(alert.get("transaction_amount", 0) for alert in alerts)
+
+        lines = [
+            f"• {alert.get('transaction_number', 'Unknown')} - "
+            f"${alert.get('transaction_amount', 0):.2f} - "
+            f"{alert.get('fraud_probability', 0) * 100:.1f}%"
+            for alert in alerts
+        ]
+        newline = "\n"
+
+        return f"""
+{emoji} <b>FRAUD ALERT DIGEST</b> {emoji}
+
+<b>Alerts:</b> {len(alerts)}
+<b>Group:</b> {key}
+<b>Highest Risk Level:</b> {highest}
+<b>Total Amount:</b> ${total:.2f}
+
+{newline.join(lines)}
+
+<i>Digest sent at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</i>
 """
 
 
     # Determine the risk level based on probability
     def get_risk_level(self, probability):
-        if probability >= 0.8:
-            return "CRITICAL"
-        elif probability >= 0.7:
-            return "HIGH"
-        else:
-            return "MEDIUM"
+        for level, threshold in RISK_THRESHOLDS:
+            if probability >= threshold:
+                return level
+        return "MEDIUM"
     
 
     # Get emoji based on risk level
@@ -0,0 +1,163 @@
+"""
+Run several dispatcher processes against one MongoDB and check that every
+notification is delivered exactly once, including those a crashed
+dispatcher held when it died.
+
+Each process runs app.services.dispatcher.Dispatcher with the real
+deliver_notification; only the Telegram send is replaced by a fake that
+sleeps for a random time and records (transaction_number, node) in a
+side collection. Partway through, one dispatcher is killed with SIGKILL;
+its leases must expire and be taken over by the others.
+
+MongoDB: pass --mongo-uri, or have `mongod` on PATH and a throwaway
+instance is started on a free port.
+
+Usage:
+    python -m benchmarks.distributed_dispatch --dispatchers 4 --notifications 2000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+from pymongo import MongoClient # type: ignore
+
+from benchmarks.load_test import LocalStack, wait_for
+
+DISPATCH_DB = "notify_service_dispatch"
+
+
+def run_dispatcher(mongo_uri, node_id, args):
+    os.environ.update({
+        "MONGODB_URI": mongo_uri,
+        "MONGODB_DB": DISPATCH_DB,
+        "DELIVERY_MODE": "distributed",
+        "DIGEST_ENABLED": "false",
+        "STATS_ENABLED": "false"
+    })
+
+    from app.db.notifications import connect_to_mongodb, repository
+    from app.services.telegram_service import telegram_service
+    from app.services.dispatcher import Dispatcher
+    from app.controllers.notification_controller import deliver_notification
+
+    async def fake_send(data):
+        await asyncio.sleep(random.uniform(0, args.send_latency * 2))
+        await repository.db.sends.insert_one({"transaction_number": data["transaction_number"], "node": node_id})
+        return {"success": True, "message_id": "1", "content": "", "waited": 0.0}
+
+    telegram_service.send_fraud_alert = fake_send
+
+    async def main():
+        await connect_to_mongodb()
+        dispatcher = Dispatcher(node_id=node_id, lease=args.lease, concurrency=args.concurrency, poll_interval=0.05)
+        await dispatcher.start(deliver_notification)
+        while True:
+            await asyncio.sleep(3600)
+
+    asyncio.run(main())
+
+
+def seed(collection, count):
+    now = datetime.now()
+    collection.insert_many([
+        {
+            "transaction_number": f"DISPATCH-{i}",
+            "transaction_amount": 10.0,
+            "fraud_probability": 0.95,
+            "risk_level": "CRITICAL",
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        }
+        for i in range(count)
+    ])
+
+
+def run(mongo_uri, args):
+    client = MongoClient(mongo_uri)
+    client.drop_database(DISPATCH_DB)
+    db = client[DISPATCH_DB]
+    seed(db.notifications, args.notifications)
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_dispatcher, args=(mongo_uri, f"node-{i}", args), daemon=True)
+        for i in range(args.dispatchers)
+    ]
+
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+
+    try:
+        # Kill one dispatcher once work is under way, leaving its claims orphaned
+        wait_for(lambda: db.sends.estimated_document_count() >= args.notifications * args.kill_after, timeout=args.timeout,
+                 what="deliveries to start")
+        orphaned = db.notifications.count_documents({"claimed_by": "node-0", "status": "pending"})
+        os.kill(processes[0].pid, signal.SIGKILL)
+
+        wait_for(lambda: db.notifications.count_documents({"status": "sent"}) == args.notifications,
+                 timeout=args.timeout, what="all notifications to be sent")
+        elapsed = time.perf_counter() - start
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=10)
+
+    sends = Counter(doc["transaction_number"] for doc in db.sends.find({}, {"transaction_number": 1}))
+    per_node = Counter(doc["node"] for doc in db.sends.find({}, {"node": 1}))
+    duplicates = {txn: count for txn, count in sends.items() if count > 1}
+    client.drop_database(DISPATCH_DB)
+    client.close()
+
+    return {
+        "dispatchers": args.dispatchers,
+        "notifications": args.notifications,
+        "elapsed_seconds": round(elapsed, 2),
+        "killed": "node-0",
+        "orphaned_when_killed": orphaned,
+        "sends": sum(sends.values()),
+        "missing": args.notifications - len(sends),
+        "duplicates": len(duplicates),
+        "sends_per_node": dict(sorted(per_node.items()))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Use this MongoDB instead of starting mongod")
+    parser.add_argument("--dispatchers", type=int, default=4)
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent sends per dispatcher")
+    parser.add_argument("--lease", type=float, default=2.0, help="Lease length in seconds")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="Mean fake Telegram latency in seconds")
+    parser.add_argument("--kill-after", type=float, default=0.25, help="Kill node-0 after this fraction was sent")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stack = LocalStack(SimpleNamespace(mongo_uri=args.mongo_uri, verbose=args.verbose))
+    try:
+        stack.start_mongo()
+        report = run(stack.mongo_uri, args)
+    finally:
+        stack.stop()
+
+    print(json.dumps(report, indent=2))
+    # A duplicate is only acceptable for the sends node-0 made but had not yet recorded when it was killed
+    sys.exit(1 if report["missing"] or report["duplicates"] > report["orphaned_when_killed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
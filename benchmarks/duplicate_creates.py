@@ -0,0 +1,154 @@
+"""
+Fire concurrent creates of the same transaction and check that exactly one
+notification is stored and exactly one request reports creating it.
+
+For each of --transactions transaction numbers, --concurrency calls to
+send_fraud_notification with identical data are started at once, all
+racing the same upsert on transaction_number. Every other call must
+come back as "already exists" with the id of the stored notification,
+and none may fail (a duplicate key error surfacing as a 500). Runs with
+WRITE_COALESCING off and then on, each in a fresh process since the
+setting is read at import.
+
+Delivery runs in distributed mode, so a created notification is left
+for the dispatchers instead of being sent; nothing talks to Telegram.
+
+MongoDB: pass --mongo-uri, or have `mongod` on PATH and a throwaway
+instance is started on a free port. Exits non-zero if a check fails.
+
+Usage:
+    python -m benchmarks.duplicate_creates --concurrency 300 --transactions 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from benchmarks.load_test import LocalStack
+
+DUPLICATES_DB = "notify_service_duplicate_creates"
+
+ALREADY_EXISTS = "Notification already exists for this transaction."
+
+
+def run_mode(mongo_uri, coalesce, args, results):
+    os.environ.update({
+        "MONGODB_URI": mongo_uri,
+        "MONGODB_DB": DUPLICATES_DB,
+        "DELIVERY_MODE": "distributed",
+        "WRITE_COALESCING": "true" if coalesce else "false",
+        "DIGEST_ENABLED": "false",
+        "STATS_ENABLED": "false",
+        "SPILL_JOURNAL_ENABLED": "false"
+    })
+
+    from app.db.notifications import repository
+    from app.controllers.notification_controller import send_fraud_notification
+
+    async def main():
+        await repository.connect()
+        await repository.collection.delete_many({})
+
+        transactions = [f"DUPLICATE-{coalesce}-{i}" for i in range(args.transactions)]
+        calls = [
+            send_fraud_notification({
+                "transaction_number": transaction,
+                "transaction_amount": 99.5,
+                "fraud_probability": 0.97,
+                "merchant": "benchmark",
+                "is_nighttime": False
+            })
+            for transaction in transactions
+            for _ in range(args.concurrency)
+        ]
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*calls)
+        elapsed = time.perf_counter() - start
+
+        created = Counter()
+        ids = {}
+        failures = 0
+        mismatched_ids = 0
+        for index, response in enumerate(responses):
+            transaction = transactions[index // args.concurrency]
+            if not response.get("success"):
+                failures += 1
+                continue
+            if response.get("message") != ALREADY_EXISTS:
+                created[transaction] += 1
+            if ids.setdefault(transaction, response.get("notification_id")) != response.get("notification_id"):
+                mismatched_ids += 1
+
+        stored = Counter()
+        async for document in repository.collection.find({"transaction_number": {"$in": transactions}}, {"transaction_number": 1}):
+            stored[document["transaction_number"]] += 1
+
+        await repository.close()
+        return {
+            "write_coalescing": coalesce,
+            "transactions": args.transactions,
+            "calls_per_transaction": args.concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "failures": failures,
+            "transactions_not_created_once": sum(1 for t in transactions if created[t] != 1),
+            "transactions_not_stored_once": sum(1 for t in transactions if stored[t] != 1),
+            "responses_with_another_id": mismatched_ids
+        }
+
+    results.put(asyncio.run(main()))
+
+
+def run(mongo_uri, args):
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for coalesce in (False, True):
+        results = context.Queue()
+        process = context.Process(target=run_mode, args=(mongo_uri, coalesce, args, results))
+        process.start()
+        reports.append(results.get(timeout=args.timeout))
+        process.join(timeout=10)
+
+    from pymongo import MongoClient # type: ignore
+    client = MongoClient(mongo_uri)
+    client.drop_database(DUPLICATES_DB)
+    client.close()
+    return reports
+
+
+def passed(report):
+    return not (
+        report["failures"]
+        or report["transactions_not_created_once"]
+        or report["transactions_not_stored_once"]
+        or report["responses_with_another_id"]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Use this MongoDB instead of starting mongod")
+    parser.add_argument("--concurrency", type=int, default=300, help="Concurrent creates per transaction")
+    parser.add_argument("--transactions", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stack = LocalStack(SimpleNamespace(mongo_uri=args.mongo_uri, verbose=args.verbose))
+    try:
+        stack.start_mongo()
+        reports = run(stack.mongo_uri, args)
+    finally:
+        stack.stop()
+
+    print(json.dumps(reports, indent=2))
+    sys.exit(0 if all(passed(report) for report in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
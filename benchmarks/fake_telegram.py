@@ -0,0 +1,77 @@
+"""
+Minimal stand-in for the Telegram Bot API (getMe and sendMessage) with
+configurable latency and 429 flood-control injection.
+
+Usage:
+    python -m benchmarks.fake_telegram --port 8081 --latency 0.05 --flood-every 100
+Then run the service with TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+import uvicorn # type: ignore
+from fastapi import FastAPI, Request # type: ignore
+from fastapi.responses import JSONResponse # type: ignore
+
+
+def create_app(latency=0.0, flood_every=0, retry_after=1):
+    app = FastAPI()
+    state = {"calls": 0, "sent": 0, "floods": 0}
+
+    @app.post("/bot{token}/getMe")
+    async def get_me(token: str):
+        return {"ok": True, "result": {
+            "id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"
+        }}
+
+    @app.post("/bot{token}/sendMessage")
+    async def send_message(token: str, request: Request):
+        state["calls"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+
+        if flood_every and state["calls"] % flood_every == 0:
+            state["floods"] += 1
+            return JSONResponse(status_code=429, content={
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after}
+            })
+
+        if "json" in request.headers.get("content-type", ""):
+            form = await request.json()
+        else:
+            form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+        chat_id = form.get("chat_id", 1)
+        state["sent"] += 1
+        return {"ok": True, "result": {
+            "message_id": state["sent"],
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if str(chat_id).lstrip("-").isdigit() else 1, "type": "private"},
+            "text": form.get("text", "")
+        }}
+
+    @app.get("/stats")
+    async def stats():
+        return state
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every sendMessage")
+    parser.add_argument("--flood-every", type=int, default=0, help="Answer 429 on every Nth sendMessage (0 disables)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency, args.flood_every, args.retry_after), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
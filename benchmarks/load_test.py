@@ -0,0 +1,280 @@
+"""
+Load test for the notification service.
+
+Runs the real FastAPI app (app.main:app under uvicorn) against a local
+MongoDB and the fake Telegram Bot API from benchmarks/fake_telegram.py,
+drives /notifications/send, /notifications/status/{id} and
+/notifications/ at a fixed concurrency, and prints throughput, latency
+percentiles and MongoDB operations per request as JSON.
+
+MongoDB: pass --mongo-uri, or have `mongod` on PATH and a throwaway
+instance is started on a free port. The benchmark database is dropped
+before the run.
+
+Usage:
+    python -m benchmarks.load_test --requests 2000 --concurrency 50 \
+        --telegram-latency 0.05 --flood-every 500 --output load.json
+    python -m benchmarks.load_test --app-env DELIVERY_MODE=queue
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx # type: ignore
+from pymongo import MongoClient # type: ignore
+
+BENCH_DB = "notify_service_load"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(check, timeout=30, what="service"):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class LocalStack():
+    """Starts MongoDB (unless given), the fake Telegram API and the app as subprocesses."""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        self.tempdir = None
+        self.mongo_uri = args.mongo_uri
+
+    def _start(self, cmd, env=None):
+        process = subprocess.Popen(
+            cmd,
+            env={**os.environ, **(env or {})},
+            stdout=subprocess.DEVNULL,
+            stderr=None if self.args.verbose else subprocess.DEVNULL
+        )
+        self.processes.append(process)
+        return process
+
+    def start_mongo(self):
+        if self.mongo_uri:
+            return
+
+        mongod = shutil.which("mongod")
+        if not mongod:
+            raise RuntimeError("No --mongo-uri given and no mongod on PATH")
+
+        self.tempdir = tempfile.mkdtemp(prefix="notify-load-mongo-")
+        port = free_port()
+        self._start([mongod, "--dbpath", self.tempdir, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"])
+        self.mongo_uri = f"mongodb://127.0.0.1:{port}"
+
+    def start(self):
+        self.start_mongo()
+        mongo = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=1000)
+        wait_for(lambda: mongo.admin.command("ping"), what="MongoDB")
+        mongo.drop_database(BENCH_DB)
+        mongo.close()
+
+        telegram_port = free_port()
+        self._start([
+            sys.executable, "-m", "benchmarks.fake_telegram",
+            "--port", str(telegram_port),
+            "--latency", str(self.args.telegram_latency),
+            "--flood-every", str(self.args.flood_every),
+            "--retry-after", str(self.args.retry_after)
+        ])
+        wait_for(lambda: httpx.get(f"http://127.0.0.1:{telegram_port}/stats").status_code == 200, what="fake Telegram API")
+
+        app_port = free_port()
+        env = {
+            "MONGODB_URI": self.mongo_uri,
+            "MONGODB_DB": BENCH_DB,
+            "TELEGRAM_BOT_TOKEN": "123456:load-test",
+            "TELEGRAM_CHAT_ID": "1",
+            "TELEGRAM_API_BASE_URL": f"http://127.0.0.1:{telegram_port}/bot"
+        }
+        env.update(dict(item.split("=", 1) for item in self.args.app_env))
+        self._start(self.app_command(app_port), env)
+        self.base_url = f"http://127.0.0.1:{app_port}"
+        wait_for(lambda: httpx.get(f"{self.base_url}/health").status_code == 200, what="notification service")
+
+    def app_command(self, port):
+        if self.args.workers:
+            return [
+                sys.executable, "-m", "app.server",
+                "--host", "127.0.0.1", "--port", str(port), "--workers", str(self.args.workers)
+            ]
+        return [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"
+        ]
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.tempdir:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+
+
+class MongoOpCounter():
+    """Counts operations seen by the server through serverStatus opcounters."""
+
+    def __init__(self, uri):
+        self.client = MongoClient(uri)
+
+    def read(self):
+        counters = self.client.admin.command("serverStatus")["opcounters"]
+        # The serverStatus call itself is one command
+        return sum(counters.values()) - 1
+
+    def close(self):
+        self.client.close()
+
+
+async def run_phase(client, ops, name, requests, concurrency, make_request):
+    latencies = []
+    statuses = Counter()
+    indexes = iter(range(requests))
+
+    async def worker():
+        for i in indexes:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    ops_before = ops.read()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ops_after = ops.read()
+
+    return {
+        "phase": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p90": round(percentile(latencies, 90) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies, default=0.0) * 1000, 2)
+        },
+        "status_codes": dict(statuses),
+        "mongo_ops_per_request": round((ops_after - ops_before) / requests, 2)
+    }
+
+
+async def drive(base_url, mongo_uri, args):
+    rng = random.Random(args.seed)
+    payloads = [
+        {
+            "transaction_number": f"LOAD-{args.seed}-{i}",
+            "transaction_amount": round(rng.uniform(1, 5000), 2),
+            "fraud_probability": round(rng.uniform(0.5, 1.0), 3),
+            "category": rng.choice(["grocery_pos", "shopping_net", "gas_transport", "misc_net"]),
+            "merchant": f"merchant_{rng.randint(1, 50)}",
+            "is_nighttime": rng.random() < 0.3
+        }
+        for i in range(args.requests)
+    ]
+
+    ops = MongoOpCounter(mongo_uri)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            phases = [
+                await run_phase(client, ops, "send", args.requests, args.concurrency,
+                                lambda c, i: c.post("/notifications/send", json=payloads[i])),
+                await run_phase(client, ops, "status", args.requests, args.concurrency,
+                                lambda c, i: c.get(f"/notifications/status/{payloads[rng.randrange(args.requests)]['transaction_number']}")),
+                await run_phase(client, ops, "list", args.requests, args.concurrency,
+                                lambda c, i: c.get("/notifications/", params={"page": 1 + i % 10, "limit": args.page_size}))
+            ]
+    finally:
+        ops.close()
+
+    return phases
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Use this MongoDB instead of starting mongod")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per phase")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--flood-every", type=int, default=0, help="Fake Telegram answers 429 on every Nth send")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the service, e.g. DELIVERY_MODE=queue")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show service and fake API logs")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Run the service through app.server with this many workers (0 = single uvicorn process)")
+    return parser
+
+
+# Start the stack, run every phase, and stop it again
+def run_load_test(args):
+    stack = LocalStack(args)
+    try:
+        stack.start()
+        return asyncio.run(drive(stack.base_url, stack.mongo_uri, args))
+    finally:
+        stack.stop()
+
+
+def main():
+    args = build_parser().parse_args()
+
+    phases = run_load_test(args)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "verbose")},
+        "phases": phases
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
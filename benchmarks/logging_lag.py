@@ -0,0 +1,152 @@
+"""
+Measure how much logging delays the event loop.
+
+Runs the same workload three ways: --tasks coroutines each log a
+"Notification sent" line (with the structured timings) and, every
+--simulation-every records, a full SIMULATION message dump, while a ticker
+measures how late the loop wakes it up. Modes:
+
+- off: records below the level, so logging costs next to nothing
+- sync: a plain StreamHandler on the root logger (what logging.basicConfig
+  set up before): formatting and the write happen in the caller
+- queue: the app's log_service - a non-blocking QueueHandler, JSON
+  formatting and the write on a background thread, SIMULATION dumps rate
+  limited
+
+Output goes to a sink that sleeps --write-latency seconds per write, to
+stand in for a slow terminal, pipe or log shipper (0 for /dev/null speed).
+Reported: loop lag percentiles and how many records were written, dropped
+or rate limited.
+
+Usage:
+    python -m benchmarks.logging_lag --duration 3 --write-latency 0.0005
+    python -m benchmarks.logging_lag --modes sync queue --write-latency 0
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from app.services.log_service import LogService, TEXT_FORMAT
+from app.services.telegram_service import simulation_logger
+
+logger = logging.getLogger("app.controllers.notification_controller")
+
+SIMULATION_MESSAGE = "SIMULATION: Telegram message would be sent:\n\n" + "\n".join(
+    f"<b>Field {i}:</b> value {i}" for i in range(12)
+)
+
+
+class SlowSink():
+    """A write-only stream where every write takes `latency` seconds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def configure(mode, sink):
+    root = logging.getLogger()
+    service = None
+
+    if mode == "off":
+        root.handlers = [logging.StreamHandler(sink)]
+        root.setLevel(logging.WARNING)
+    elif mode == "sync":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.handlers = [handler]
+        root.setLevel(logging.INFO)
+    else:
+        service = LogService()
+        service.configure(level="INFO", stream=sink)
+
+    return service
+
+
+async def scenario(mode, args):
+    sink = SlowSink(args.write_latency)
+    service = configure(mode, sink)
+
+    lags = []
+    logged = 0
+    stop = time.perf_counter() + args.duration
+
+    async def ticker():
+        while time.perf_counter() < stop:
+            expected = time.perf_counter() + args.tick
+            await asyncio.sleep(args.tick)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    async def worker(index):
+        nonlocal logged
+        count = 0
+        while time.perf_counter() < stop:
+            count += 1
+            logger.info("Notification sent", extra={
+                "timings": {"rate_limit_wait": 0.0, "telegram": 0.05, "db_update": 0.002, "time_to_send": 0.052}
+            })
+            if args.simulation_every and count % args.simulation_every == 0:
+                simulation_logger.info(SIMULATION_MESSAGE)
+            logged += 1
+            await asyncio.sleep(args.interval)
+
+    start = time.perf_counter()
+    await asyncio.gather(ticker(), *(worker(i) for i in range(args.tasks)))
+    elapsed = time.perf_counter() - start
+
+    stats = {}
+    if service:
+        stats = service.stats()
+        service.stop()
+
+    return {
+        "mode": mode,
+        "notifications_logged": logged,
+        "logged_per_sec": round(logged / elapsed),
+        "lag_p50_ms": round(percentile(lags, 50) * 1000, 2),
+        "lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+        "lag_max_ms": round(max(lags) * 1000, 2) if lags else 0.0,
+        "writes": sink.writes,
+        "dropped": stats.get("dropped", 0),
+        "rate_limited": stats.get("rate_limited", 0)
+    }
+
+
+async def run(args):
+    return [await scenario(mode, args) for mode in args.modes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=["off", "sync", "queue"], default=["off", "sync", "queue"])
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per mode")
+    parser.add_argument("--tasks", type=int, default=50, help="Concurrent logging coroutines")
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds each coroutine sleeps between records")
+    parser.add_argument("--simulation-every", type=int, default=5, help="Log a SIMULATION dump every N records (0: never)")
+    parser.add_argument("--write-latency", type=float, default=0.0005, help="Seconds each write to the sink takes")
+    parser.add_argument("--tick", type=float, default=0.001, help="Ticker interval")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measure the cost of the /metrics instrumentation: per-call cost of the
+primitives, and per-request overhead of MetricsMiddleware on a trivial
+FastAPI route driven in-process.
+
+Usage:
+    python -m benchmarks.metrics_overhead --iterations 200000 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx # type: ignore
+from fastapi import FastAPI # type: ignore
+
+from app.services.metrics import Counter, Histogram, MetricsMiddleware, mongo_timed
+
+
+def per_call_ns(func, iterations):
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter_ns() - start) / iterations, 1)
+
+
+async def per_await_ns(func, iterations):
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        await func()
+    return round((time.perf_counter_ns() - start) / iterations, 1)
+
+
+def build_app(instrumented):
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.get("/status/{id}")
+    async def status(id: str):
+        return {"id": id}
+
+    return app
+
+
+async def per_request_us(app, requests):
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for i in range(100):
+            await client.get(f"/status/{i}")
+
+        start = time.perf_counter()
+        for i in range(requests):
+            await client.get(f"/status/{i}")
+        return round((time.perf_counter() - start) / requests * 1e6, 2)
+
+
+async def run(args):
+    counter = Counter("bench_counter", "bench", ("status", "risk_level"))
+    histogram = Histogram("bench_histogram", "bench", ("operation",))
+
+    async def plain():
+        return None
+
+    @mongo_timed("bench")
+    async def timed():
+        return None
+
+    plain_us = await per_request_us(build_app(False), args.requests)
+    instrumented_us = await per_request_us(build_app(True), args.requests)
+
+    return {
+        "counter_inc_ns": per_call_ns(lambda: counter.inc(status="sent", risk_level="HIGH"), args.iterations),
+        "histogram_observe_ns": per_call_ns(lambda: histogram.observe(0.0123, operation="find_one"), args.iterations),
+        "plain_coroutine_ns": await per_await_ns(plain, args.iterations),
+        "mongo_timed_coroutine_ns": await per_await_ns(timed, args.iterations),
+        "request_us": {
+            "without_middleware": plain_us,
+            "with_middleware": instrumented_us,
+            "overhead_pct": round((instrumented_us - plain_us) / plain_us * 100, 2)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Kill MongoDB in the middle of a load run, bring it back, and check that no
+accepted alert was lost.
+
+Starts a throwaway mongod (it has to be ours, to kill and restart it), the
+fake Telegram Bot API and the app, then posts alerts at a fixed
+concurrency. Once --kill-after of them have been sent, mongod is killed
+with SIGKILL; it is restarted on the same port and data directory after
+--outage seconds while the load keeps going. Every alert answered with
+200 or 202 counts as accepted (those taken while Mongo was down are
+answered 202 "journaled" from the local spill journal). The run passes if,
+after the journal has been replayed, every accepted alert is stored
+exactly once and has been sent.
+
+Requires `mongod` on PATH.
+
+Usage:
+    python -m benchmarks.mongo_outage --requests 3000 --concurrency 50 --outage 5
+    python -m benchmarks.mongo_outage --workers 2
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx # type: ignore
+from pymongo import MongoClient # type: ignore
+
+from benchmarks.load_test import BENCH_DB, LocalStack, free_port, wait_for
+
+
+class Mongod():
+    """A mongod that can be killed and started again on the same port and data directory."""
+
+    def __init__(self, verbose=False):
+        self.binary = shutil.which("mongod")
+        if not self.binary:
+            raise RuntimeError("mongod is not on PATH")
+        self.dbpath = tempfile.mkdtemp(prefix="notify-outage-mongo-")
+        self.port = free_port()
+        self.uri = f"mongodb://127.0.0.1:{self.port}"
+        self.verbose = verbose
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.binary, "--dbpath", self.dbpath, "--port", str(self.port), "--bind_ip", "127.0.0.1", "--quiet"],
+            stdout=subprocess.DEVNULL,
+            stderr=None if self.verbose else subprocess.DEVNULL
+        )
+        client = MongoClient(self.uri, serverSelectionTimeoutMS=1000)
+        wait_for(lambda: client.admin.command("ping"), what="MongoDB")
+        client.close()
+
+    def kill(self):
+        self.process.send_signal(signal.SIGKILL)
+        self.process.wait()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+        shutil.rmtree(self.dbpath, ignore_errors=True)
+
+
+async def drive(base_url, mongod, args):
+    accepted = set()
+    statuses = Counter()
+    timeline = {}
+    issued = 0
+    start = time.perf_counter()
+
+    async def worker(client):
+        nonlocal issued
+        while issued < args.requests:
+            txn = f"OUTAGE-{issued}"
+            issued += 1
+            try:
+                response = await client.post("/notifications/send", json={
+                    "transaction_number": txn,
+                    "transaction_amount": 42.0,
+                    "fraud_probability": 0.93
+                })
+                body = response.json()
+                statuses[f"{response.status_code} {body.get('status') or 'error'}"] += 1
+                if response.status_code in (200, 202):
+                    accepted.add(txn)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+
+    async def outage():
+        while issued < args.requests * args.kill_after:
+            await asyncio.sleep(0.01)
+        mongod.kill()
+        timeline["killed_at"] = round(time.perf_counter() - start, 2)
+        await asyncio.sleep(args.outage)
+        await asyncio.to_thread(mongod.start)
+        timeline["restored_at"] = round(time.perf_counter() - start, 2)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout) as client:
+        chaos = asyncio.create_task(outage())
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        timeline["load_finished_at"] = round(time.perf_counter() - start, 2)
+        await chaos
+        health = (await client.get("/health")).json()
+
+    return accepted, statuses, timeline, health
+
+
+def verify(mongo_uri, accepted, args):
+    client = MongoClient(mongo_uri)
+    collection = client[BENCH_DB].notifications
+
+    def settled():
+        sent = collection.count_documents({"transaction_number": {"$regex": "^OUTAGE-"}, "status": "sent"})
+        return sent >= len(accepted)
+
+    try:
+        wait_for(settled, timeout=args.timeout, what="journaled alerts to be replayed and sent")
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+
+    stored = Counter(doc["transaction_number"] for doc in collection.find({}, {"transaction_number": 1}))
+    sent = {doc["transaction_number"] for doc in collection.find({"status": "sent"}, {"transaction_number": 1})}
+    client.close()
+
+    return {
+        "accepted": len(accepted),
+        "stored": len(stored),
+        "lost": sorted(accepted - set(stored))[:20],
+        "lost_count": len(accepted - set(stored)),
+        "unsent_count": len(accepted - sent),
+        "stored_twice": sum(1 for count in stored.values() if count > 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--kill-after", type=float, default=0.3, help="Kill mongod after this fraction of requests")
+    parser.add_argument("--outage", type=float, default=5.0, help="Seconds before mongod is restarted")
+    parser.add_argument("--workers", type=int, default=0, help="Run the app with app.server and this many workers")
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=120, help="How long to wait for the replay to finish")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    mongod = Mongod(verbose=args.verbose)
+    journal_dir = tempfile.mkdtemp(prefix="notify-outage-journal-")
+    stack = LocalStack(SimpleNamespace(
+        mongo_uri=mongod.uri,
+        verbose=args.verbose,
+        telegram_latency=0.0,
+        flood_every=0,
+        retry_after=1,
+        workers=args.workers,
+        app_env=[
+            # Fail over to the journal quickly instead of after the 30s driver default
+            "MONGODB_SERVER_SELECTION_TIMEOUT_MS=500",
+            "MONGO_BREAKER_RESET=1",
+            "SPILL_REPLAY_INTERVAL=0.5",
+            f"SPILL_JOURNAL_DIR={journal_dir}",
+            "RETRY_SWEEP_INTERVAL=1"
+        ]
+    ))
+
+    try:
+        mongod.start()
+        stack.start()
+        accepted, statuses, timeline, health = asyncio.run(drive(stack.base_url, mongod, args))
+        report = verify(mongod.uri, accepted, args)
+    finally:
+        stack.stop()
+        mongod.stop()
+        shutil.rmtree(journal_dir, ignore_errors=True)
+
+    report.update({
+        "responses": dict(statuses),
+        "timeline": timeline,
+        "breakers": health.get("circuit_breakers"),
+        "spill_journal": health.get("spill_journal")
+    })
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["lost_count"] or report["stored_twice"] else 0)
+
+
+if __name__ == "__main__":
+    main()
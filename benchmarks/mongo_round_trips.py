@@ -0,0 +1,148 @@
+"""
+Count MongoDB round trips (commands sent to the server) per API request,
+for the previous find/update access pattern and for NotificationRepository.
+
+Needs a reachable MongoDB; the benchmark database is dropped first.
+
+Usage:
+    python -m benchmarks.mongo_round_trips --uri mongodb://localhost:27017 --requests 200
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+
+from bson import ObjectId # type: ignore
+from pymongo import monitoring # type: ignore
+
+from app.db.notifications import NotificationRepository, STATUS_PROJECTION
+
+
+class CommandCounter(monitoring.CommandListener):
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# The access pattern before the repository: lookup then insert, trial-and-error
+# updates followed by a re-read, and a count_documents on every list page
+class LegacyAccess():
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, id):
+        notification = None
+        if len(id) == 24:
+            try:
+                notification = await self.collection.find_one({"_id": ObjectId(id)})
+            except Exception:
+                pass
+        if not notification:
+            notification = await self.collection.find_one({"transaction_number": id})
+        return notification
+
+    async def create(self, notification):
+        existing = await self.get(notification["transaction_number"])
+        if existing:
+            return existing
+        result = await self.collection.insert_one(notification)
+        return {**notification, "_id": str(result.inserted_id)}
+
+    async def update(self, id, update_data):
+        if len(id) == 24:
+            result = await self.collection.update_one({"_id": ObjectId(id)}, {"$set": update_data})
+            if result.modified_count > 0:
+                return await self.get(id)
+        result = await self.collection.update_one({"transaction_number": id}, {"$set": update_data})
+        if result.modified_count > 0:
+            return await self.get(id)
+        return None
+
+    async def list(self, page, limit):
+        cursor = self.collection.find().sort("created_at", -1).skip((page - 1) * limit).limit(limit)
+        notifications = await cursor.to_list(length=limit)
+        await self.collection.count_documents({})
+        return notifications
+
+
+def notification(prefix, i):
+    return {
+        "transaction_number": f"{prefix}-{i}",
+        "transaction_amount": 100.0 + i,
+        "fraud_probability": 0.9,
+        "status": "pending",
+        "created_at": datetime.now()
+    }
+
+
+async def measure(counter, operation, requests):
+    before = counter.count
+    for i in range(requests):
+        await operation(i)
+    return round((counter.count - before) / requests, 2)
+
+
+async def run(args):
+    counter = CommandCounter()
+    repository = NotificationRepository(args.uri, args.db, event_listeners=[counter])
+    await repository.connect()
+    await repository.collection.drop()
+    await repository.close()
+    await repository.connect()
+
+    legacy = LegacyAccess(repository.collection)
+    ids = {"legacy": [], "repository": []}
+
+    async def legacy_create(i):
+        ids["legacy"].append(str((await legacy.create(notification("L", i)))["_id"]))
+
+    async def repository_create(i):
+        saved, _ = await repository.create(notification("R", i))
+        ids["repository"].append(saved["_id"])
+
+    results = {
+        "legacy": {
+            "send": await measure(counter, legacy_create, args.requests),
+            "status_by_id": await measure(counter, lambda i: legacy.get(ids["legacy"][i]), args.requests),
+            "status_by_transaction": await measure(counter, lambda i: legacy.get(f"L-{i}"), args.requests),
+            "update_by_id": await measure(counter, lambda i: legacy.update(ids["legacy"][i], {"status": "sent"}), args.requests),
+            "update_by_transaction": await measure(counter, lambda i: legacy.update(f"L-{i}", {"status": "failed"}), args.requests),
+            "list_page": await measure(counter, lambda i: legacy.list(1 + i % 5, 20), args.requests)
+        },
+        "repository": {
+            "send": await measure(counter, repository_create, args.requests),
+            "status_by_id": await measure(counter, lambda i: repository.get(ids["repository"][i], STATUS_PROJECTION), args.requests),
+            "status_by_transaction": await measure(counter, lambda i: repository.get(f"R-{i}", STATUS_PROJECTION), args.requests),
+            "update_by_id": await measure(counter, lambda i: repository.update(ids["repository"][i], {"status": "sent"}), args.requests),
+            "update_by_transaction": await measure(counter, lambda i: repository.update(f"R-{i}", {"status": "failed"}), args.requests),
+            "list_page": await measure(counter, lambda i: repository.list(1 + i % 5, 20), args.requests)
+        }
+    }
+
+    await repository.collection.drop()
+    await repository.close()
+    return {"requests_per_operation": args.requests, "round_trips_per_request": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="notify_service_bench")
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Check that every combination of list filters is answered by an index scan.
+
+Creates the service's indexes on a scratch database (through
+NotificationRepository.connect), seeds it, and runs explain() on the
+query that GET /notifications/ issues for each combination of filters:
+status (one and several), risk_level, merchant, category, amount range,
+fraud_probability range and created_at range. Each combination is
+explained twice: in page mode (skip) and in cursor mode, where the
+filters are combined with the keyset predicate for the page after the
+first one (page_query, the $and/$or shape NotificationRepository.list
+sends). A winning plan without an IXSCAN, or with a COLLSCAN or a
+blocking SORT stage, is reported as a failure and the script exits
+non-zero.
+
+Filters on amount or fraud_probability alone pass with an IXSCAN of the
+(created_at, _id) index: there is deliberately no index led by those
+ranges (see NotificationRepository.connect), so such a page walks the
+newest notifications until it has `limit` matches.
+
+MongoDB: pass --mongo-uri, or have `mongod` on PATH and a throwaway
+instance is started on a free port. tests/test_query_plans.py runs the
+same check under pytest wherever MONGODB_TEST_URI is set or mongod is
+installed.
+
+Usage:
+    python -m benchmarks.query_plans --documents 20000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from bson import ObjectId # type: ignore
+
+from app.db.notifications import NotificationRepository, filter_query, page_query, LIST_PROJECTION
+from app.services.telegram_service import telegram_service
+from benchmarks.load_test import LocalStack
+
+PLANS_DB = "notify_service_query_plans"
+
+# The list sort (newest first)
+SORT = [("created_at", -1), ("_id", -1)]
+
+now = datetime.now()
+
+# One sample value per filter kind, as passed to filter_query
+FILTERS = {
+    "status": {"status": "failed"},
+    "status_in": {"status": ["failed", "dead_letter"]},
+    "risk_level": {"risk_level": "HIGH"},
+    "merchant": {"merchant": "merchant_7"},
+    "category": {"category": "shopping_net"},
+    "amount": {"min_amount": 100, "max_amount": 500},
+    "probability": {"min_probability": 0.9, "max_probability": 1.0},
+    "created_at": {"created_from": now - timedelta(days=2), "created_to": now - timedelta(days=1)}
+}
+
+
+def seed_documents(count, rng):
+    documents = []
+    for i in range(count):
+        probability = round(rng.uniform(0.5, 1.0), 3)
+        documents.append({
+            "transaction_number": f"PLAN-{i}",
+            "transaction_amount": round(rng.uniform(1, 5000), 2),
+            "fraud_probability": probability,
+            "risk_level": telegram_service.get_risk_level(probability),
+            "category": rng.choice(["grocery_pos", "shopping_net", "gas_transport", "misc_net"]),
+            "merchant": f"merchant_{rng.randint(1, 50)}",
+            "status": rng.choice(["sent"] * 8 + ["failed", "dead_letter"]),
+            "attempts": 1,
+            "created_at": now - timedelta(seconds=rng.randint(0, 30 * 86400))
+        })
+    return documents
+
+
+# Every stage name in a plan tree (classic and SBE explain layouts)
+def plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+async def winning_stages(collection, query, limit):
+    cursor = collection.find(query, LIST_PROJECTION).sort(SORT).limit(limit)
+    plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+    return list(plan_stages(plan))
+
+
+def combinations():
+    names = list(FILTERS)
+    for size in range(1, len(names) + 1):
+        for combo in itertools.combinations(names, size):
+            # status and status_in are alternatives
+            if "status" in combo and "status_in" in combo:
+                continue
+            yield combo
+
+
+async def run(mongo_uri, args):
+    repository = NotificationRepository(mongo_uri, PLANS_DB)
+    await repository.connect()
+    await repository.collection.drop()
+    await repository.close()
+    await repository.connect()
+
+    try:
+        await repository.collection.insert_many(seed_documents(args.documents, random.Random(args.seed)))
+
+        results = []
+        for combo in combinations():
+            params = {}
+            for name in combo:
+                params.update(FILTERS[name])
+
+            query = filter_query(**params)
+
+            # Cursor mode continues after the last notification of the first page
+            first_page = await repository.collection.find(query, {"created_at": 1}).sort(SORT).limit(args.limit).to_list(length=args.limit)
+            last = first_page[-1] if first_page else {"created_at": now, "_id": ObjectId()}
+
+            for mode, mode_query in (("page", query), ("cursor", page_query(query, (last["created_at"], last["_id"])))):
+                stages = await winning_stages(repository.collection, mode_query, args.limit)
+                results.append({
+                    "filters": list(combo),
+                    "mode": mode,
+                    "stages": stages,
+                    "ok": "IXSCAN" in stages and "COLLSCAN" not in stages and "SORT" not in stages
+                })
+        return results
+    finally:
+        await repository.client.drop_database(PLANS_DB)
+        await repository.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Use this MongoDB instead of starting mongod")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stack = LocalStack(SimpleNamespace(mongo_uri=args.mongo_uri, verbose=args.verbose))
+    try:
+        stack.start_mongo()
+        results = asyncio.run(run(stack.mongo_uri, args))
+    finally:
+        stack.stop()
+
+    failures = [r for r in results if not r["ok"]]
+    print(json.dumps({
+        "combinations": len(results) // 2,
+        "plans_checked": len(results),
+        "failures": failures,
+        "plans": results if args.verbose else None
+    }, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
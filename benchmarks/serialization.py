@@ -0,0 +1,130 @@
+"""
+Compare the two ways a status or list response can be serialized:
+
+- model: what FastAPI does for a plain dict return - validate against the
+  route's response_model, jsonable_encoder, then the stdlib JSON encoder
+- fast: the controller's dict encoded directly by app.models.serializers
+  (orjson when installed, the stdlib encoder otherwise)
+
+The documents are synthetic Mongo-shaped dicts (ObjectId, datetimes), so
+no database is needed. Both paths' outputs are checked to decode to the
+same JSON before timing.
+
+Usage:
+    python -m benchmarks.serialization --iterations 2000 --page-size 100
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId # type: ignore
+from fastapi.encoders import jsonable_encoder # type: ignore
+from fastapi.responses import JSONResponse # type: ignore
+from fastapi.routing import serialize_response # type: ignore
+
+from app.main import app
+from app.models import serializers
+from app.models.serializers import FastJSONResponse, notification_summary, notification_detail
+
+
+def make_document(i, now):
+    return {
+        "_id": ObjectId(),
+        "transaction_number": f"TX{i:09d}",
+        "status": "sent" if i % 5 else "failed",
+        "created_at": now - timedelta(seconds=i, microseconds=i * 1000),
+        "updated_at": now,
+        "sent_at": now - timedelta(seconds=i - 1) if i % 5 else None,
+        "error": None if i % 5 else "Timed out",
+        "fraud_probability": 0.5 + (i % 50) / 100,
+        "transaction_amount": 10.0 + i * 1.37,
+        "message_id": str(1000 + i) if i % 5 else None
+    }
+
+
+def route_field(path):
+    for route in app.routes:
+        if getattr(route, "path", None) == path and "GET" in route.methods:
+            return route.secure_cloned_response_field
+    raise LookupError(path)
+
+
+async def model_path(field, content):
+    value = await serialize_response(field=field, response_content=content)
+    return JSONResponse(jsonable_encoder(value)).body
+
+
+def fast_path(content):
+    return FastJSONResponse(content).body
+
+
+async def time_us(func, iterations, is_async):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if is_async:
+            await func()
+        else:
+            func()
+    return round((time.perf_counter() - start) / iterations * 1e6, 2)
+
+
+async def compare(name, field, content, iterations):
+    model_body = await model_path(field, content)
+    fast_body = fast_path(content)
+    if json.loads(model_body) != json.loads(fast_body):
+        raise AssertionError(f"{name}: fast path output differs from the response_model output")
+
+    model_us = await time_us(lambda: model_path(field, content), iterations, True)
+    fast_us = await time_us(lambda: fast_path(content), iterations, False)
+
+    return {
+        "bytes": len(fast_body),
+        "model_us": model_us,
+        "fast_us": fast_us,
+        "speedup": round(model_us / fast_us, 2) if fast_us else None
+    }
+
+
+async def run(args):
+    now = datetime.now().replace(microsecond=123000)
+    documents = [make_document(i, now) for i in range(args.page_size)]
+
+    for doc in documents:
+        doc["_id"] = str(doc["_id"])
+
+    status = notification_detail(documents[0])
+    listing = {
+        "success": True,
+        "notifications": [notification_summary(doc) for doc in documents],
+        "total": 10000,
+        "page": 1,
+        "limit": args.page_size,
+        "pages": -(-10000 // args.page_size),
+        "next_cursor": "eyJ0IjogIjIwMjMtMTAtMTVUMTQ6MzA6MDAiLCAiaWQiOiAiNjRhODJjM2U5YjcyZjVkOGU5ZjgyYzMxIn0="
+    }
+
+    return {
+        "encoder": "orjson" if serializers.orjson is not None else "json",
+        "iterations": args.iterations,
+        "endpoints": {
+            "GET /notifications/status/{id}": await compare(
+                "status", route_field("/notifications/status/{id}"), status, args.iterations),
+            f"GET /notifications/ (limit={args.page_size})": await compare(
+                "list", route_field("/notifications/"), listing, args.iterations)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Drive TelegramService.send_fraud_alert against a fake bot that answers
+with RetryAfter (HTTP 429) every few messages, and report how the rate
+limiter spread the sends and how long messages waited.
+
+Usage:
+    python -m benchmarks.telegram_rate_limit --messages 200 --flood-every 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from telegram.error import RetryAfter # type: ignore
+
+from app.services.telegram_service import TelegramService, RateLimiter
+
+
+class FakeBot():
+
+    # Raise RetryAfter on every flood_every-th call, otherwise accept the message
+    def __init__(self, flood_every=0, retry_after=1, latency=0.0):
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.latency = latency
+        self.calls = 0
+        self.sent = []
+        self.floods = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.flood_every and self.calls % self.flood_every == 0:
+            self.floods += 1
+            raise RetryAfter(self.retry_after)
+
+        self.sent.append((time.monotonic(), chat_id))
+        return SimpleNamespace(message_id=len(self.sent))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(args):
+    service = TelegramService()
+    service.chat_id = "fake-chat"
+    service.bot = FakeBot(args.flood_every, args.retry_after, args.latency)
+    service.rate_limiter = RateLimiter(
+        global_rate=args.global_rate,
+        global_burst=args.global_burst,
+        chat_rate_per_minute=args.chat_rate_per_minute,
+        chat_burst=args.chat_burst
+    )
+
+    start = time.monotonic()
+    results = await asyncio.gather(*(
+        service.send_fraud_alert({
+            "transaction_number": f"BENCH-{i}",
+            "transaction_amount": 100.0,
+            "fraud_probability": 0.9
+        })
+        for i in range(args.messages)
+    ))
+    elapsed = time.monotonic() - start
+
+    waits = [r.get("waited", 0.0) for r in results if r.get("success")]
+    return {
+        "messages": args.messages,
+        "sent": len(service.bot.sent),
+        "failed": sum(1 for r in results if not r.get("success")),
+        "floods": service.bot.floods,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(service.bot.sent) / elapsed, 2) if elapsed else 0.0,
+        "wait_seconds": {
+            "p50": round(percentile(waits, 50), 4),
+            "p99": round(percentile(waits, 99), 4),
+            "max": round(max(waits, default=0.0), 4)
+        },
+        "limiter": service.rate_limiter.stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--flood-every", type=int, default=40, help="Answer 429 on every Nth call (0 disables)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake Telegram latency in seconds")
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--global-burst", type=int, default=30)
+    parser.add_argument("--chat-rate-per-minute", type=float, default=1200)
+    parser.add_argument("--chat-burst", type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Compare the production launcher (app.server) with one worker against N
+workers, using the load test from benchmarks/load_test.py.
+
+Accepts every load test option; --compare-workers sets N (default: CPUs).
+
+Usage:
+    python -m benchmarks.worker_scaling --requests 3000 --concurrency 100
+"""
+import copy
+import json
+
+from app.server import default_workers
+from benchmarks.load_test import build_parser, run_load_test
+
+
+def main():
+    parser = build_parser()
+    parser.description = __doc__
+    parser.add_argument("--compare-workers", type=int, default=default_workers())
+    args = parser.parse_args()
+
+    results = {}
+    for workers in sorted({1, args.compare_workers}):
+        run_args = copy.copy(args)
+        run_args.workers = workers
+        results[workers] = {phase["phase"]: phase for phase in run_load_test(run_args)}
+
+    single = results[1]
+    multi = results[max(results)]
+    report = {
+        "workers": sorted(results),
+        "phases": {
+            name: {
+                "throughput_per_second": {str(w): results[w][name]["throughput_per_second"] for w in results},
+                "p99_ms": {str(w): results[w][name]["latency_ms"]["p99"] for w in results},
+                "speedup": round(multi[name]["throughput_per_second"] / single[name]["throughput_per_second"], 2)
+                if single[name]["throughput_per_second"] else None
+            }
+            for name in single
+        }
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measure what write coalescing does to MongoDB round trips and throughput.
+
+Runs the database side of the send path - create() the pending
+notification, then update() it to "sent" under its lease - for --requests
+notifications at a fixed concurrency, through NotificationRepository with
+coalescing off and then on. Round trips are counted with a pymongo command
+listener (everything the repository sends, including the pre-image reads
+a coalesced update batch needs).
+
+Reported per mode: notifications per second, round trips per
+notification, per-notification latency percentiles and, when on, the
+average batch size. Try a few concurrencies and --interval values: the
+interval is added latency at low concurrency, and buys fewer, larger
+batches at high concurrency.
+
+MongoDB: pass --mongo-uri, or have `mongod` on PATH and a throwaway
+instance is started on a free port.
+
+Usage:
+    python -m benchmarks.write_coalescing --requests 5000 --concurrency 10 100 500
+    python -m benchmarks.write_coalescing --interval 0.005 --max-batch 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.db.notifications import NotificationRepository
+from benchmarks.load_test import LocalStack, percentile
+from benchmarks.mongo_round_trips import CommandCounter
+
+COALESCING_DB = "notify_service_write_coalescing"
+
+
+async def scenario(mongo_uri, coalesce, concurrency, args):
+    counter = CommandCounter()
+    repository = NotificationRepository(
+        mongo_uri,
+        COALESCING_DB,
+        coalesce=coalesce,
+        coalesce_interval=args.interval,
+        coalesce_max_batch=args.max_batch,
+        event_listeners=[counter]
+    )
+    await repository.connect()
+    await repository.collection.delete_many({})
+
+    latencies = []
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while issued < args.requests:
+            issued += 1
+            start = time.perf_counter()
+            saved, _ = await repository.create({
+                "transaction_number": f"COALESCE-{coalesce}-{concurrency}-{issued}",
+                "transaction_amount": 42.0,
+                "fraud_probability": 0.93,
+                "risk_level": "CRITICAL",
+                "status": "pending",
+                "attempts": 0,
+                "lease_id": "bench"
+            })
+            await repository.update(saved["_id"], {
+                "status": "sent",
+                "sent_at": datetime.now(),
+                "attempts": 1,
+                "next_attempt_at": None
+            }, lease_id="bench")
+            latencies.append(time.perf_counter() - start)
+
+    before = counter.count
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    round_trips = counter.count - before
+
+    sent = await repository.collection.count_documents({"status": "sent"})
+    batches = repository.coalescer.stats() if repository.coalescer else None
+    await repository.close()
+
+    return {
+        "coalesce": coalesce,
+        "concurrency": concurrency,
+        "notifications_per_sec": round(len(latencies) / elapsed),
+        "round_trips_per_notification": round(round_trips / len(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "average_batch": batches["average_batch"] if batches else None,
+        "all_sent": sent == len(latencies)
+    }
+
+
+async def run(mongo_uri, args):
+    results = []
+    for concurrency in args.concurrency:
+        for coalesce in (False, True):
+            results.append(await scenario(mongo_uri, coalesce, concurrency, args))
+
+    repository = NotificationRepository(mongo_uri, COALESCING_DB)
+    await repository.connect()
+    await repository.client.drop_database(COALESCING_DB)
+    await repository.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Use this MongoDB instead of starting mongod")
+    parser.add_argument("--requests", type=int, default=5000, help="Notifications per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--interval", type=float, default=0.002, help="Seconds a batch waits for more writes")
+    parser.add_argument("--max-batch", type=int, default=500, help="Writes that flush a batch at once")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stack = LocalStack(SimpleNamespace(mongo_uri=args.mongo_uri, verbose=args.verbose))
+    try:
+        stack.start_mongo()
+        results = asyncio.run(run(stack.mongo_uri, args))
+    finally:
+        stack.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
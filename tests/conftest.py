@@ -0,0 +1,35 @@
+import os
+
+import pytest # type: ignore
+
+# Settings are read when the app modules are imported: no Telegram bot (sends are
+# simulated unless a test provides one) and a throwaway database name
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+os.environ["TELEGRAM_CHAT_ID"] = ""
+os.environ["MONGODB_DB"] = "notify_service_test"
+os.environ["DELIVERY_MODE"] = "sync"
+os.environ["WRITE_COALESCING"] = "false"
+
+
+"""
+A NotificationRepository on an in-memory mongomock database, installed as the
+module-level repository used by the notification helpers. Tests connect it
+inside their own event loop (asyncio.run), as there is no pytest-asyncio.
+"""
+@pytest.fixture
+def repository(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    from app.db import notifications
+    from app.db.status_cache import status_cache
+    from app.services.circuit_breaker import mongo_breaker
+
+    monkeypatch.setattr(notifications, "AsyncIOMotorClient", mongomock_motor.AsyncMongoMockClient)
+    repository = notifications.NotificationRepository("mongodb://localhost", "notify_service_test", coalesce=False)
+    monkeypatch.setattr(notifications, "repository", repository)
+
+    # Shared process state other tests may have left behind
+    status_cache.clear()
+    mongo_breaker.record_success()
+    return repository
+
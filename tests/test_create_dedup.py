@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+
+from app.db import notifications
+from app.controllers.notification_controller import (
+    build_notification,
+    send_fraud_notification,
+    send_fraud_notifications_batch
+)
+
+ALREADY_EXISTS = "Notification already exists for this transaction."
+
+
+def alert(transaction_number):
+    return {
+        "transaction_number": transaction_number,
+        "transaction_amount": 99.5,
+        "fraud_probability": 0.97,
+        "merchant": "merchant_1",
+        "is_nighttime": False
+    }
+
+
+def test_concurrent_creates_store_one_notification(repository):
+    async def main():
+        await repository.connect()
+        results = await asyncio.gather(*(repository.create(build_notification(alert("DUP-1"))) for _ in range(20)))
+        stored = await repository.collection.count_documents({"transaction_number": "DUP-1"})
+        return results, stored
+
+    results, stored = asyncio.run(main())
+
+    assert stored == 1
+    assert sum(created for _, created in results) == 1
+    assert len({saved["_id"] for saved, _ in results}) == 1
+
+
+def test_existing_notification_is_returned_not_overwritten(repository):
+    async def main():
+        await repository.connect()
+        first, created = await repository.create(build_notification(alert("DUP-2")))
+        await notifications.update_notification(first["_id"], {"status": "sent", "sent_at": datetime.now()})
+
+        again, created_again = await repository.create(build_notification(alert("DUP-2")))
+        return first, created, again, created_again
+
+    first, created, again, created_again = asyncio.run(main())
+
+    assert created and not created_again
+    assert again["_id"] == first["_id"]
+    assert again["status"] == "sent"
+
+
+def test_concurrent_requests_report_already_exists(repository):
+    async def main():
+        await repository.connect()
+        return await asyncio.gather(*(send_fraud_notification(alert("DUP-3")) for _ in range(10)))
+
+    responses = asyncio.run(main())
+
+    assert all(response["success"] for response in responses)
+    assert sum(response["message"] != ALREADY_EXISTS for response in responses) == 1
+    assert len({response["notification_id"] for response in responses}) == 1
+
+
+def test_batch_drops_duplicates_in_the_batch_and_in_the_database(repository):
+    async def main():
+        await repository.connect()
+        await repository.create(build_notification(alert("DUP-4")))
+        result = await send_fraud_notifications_batch([alert("DUP-4"), alert("NEW-1"), alert("NEW-1")])
+        stored = await repository.collection.count_documents({})
+        return result, stored
+
+    result, stored = asyncio.run(main())
+
+    assert [r["status"] for r in result["results"]] == ["pending", "sent", "duplicate"]
+    assert result["results"][0]["message"] == ALREADY_EXISTS
+    assert stored == 2
+
+
+def test_coalesced_creates_store_one_notification(repository):
+    repository.coalescer = notifications.WriteCoalescer(repository._write_batch, 0.005, 100)
+
+    async def main():
+        await repository.connect()
+        results = await asyncio.gather(*(repository.create(build_notification(alert("DUP-5"))) for _ in range(20)))
+        stored = await repository.collection.count_documents({"transaction_number": "DUP-5"})
+        return results, stored
+
+    results, stored = asyncio.run(main())
+
+    assert stored == 1
+    assert sum(created for _, created in results) == 1
+    assert len({saved["_id"] for saved, _ in results}) == 1
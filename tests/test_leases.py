@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime, timedelta
+from collections import Counter
+
+from bson import ObjectId # type: ignore
+
+from app.db import notifications
+from app.services.dispatcher import Dispatcher
+from app.services.retry_service import LeaseKeeper
+from app.controllers.notification_controller import build_notification
+
+
+def due_notification(transaction_number):
+    return build_notification({
+        "transaction_number": transaction_number,
+        "transaction_amount": 120.5,
+        "fraud_probability": 0.95,
+        "merchant": "merchant_1"
+    }, leased=False)
+
+
+async def expire_lease(repository, id):
+    past = datetime.now() - timedelta(seconds=1)
+    await repository.collection.update_one({"_id": ObjectId(id)}, {"$set": {"next_attempt_at": past, "lease_until": past}})
+
+
+def test_racing_claims_hand_out_a_notification_once(repository):
+    async def main():
+        await repository.connect()
+        await repository.create(due_notification("LEASE-1"))
+        return await asyncio.gather(*(notifications.claim_due_notification(30, f"node-{i}") for i in range(5)))
+
+    claims = [claim for claim in asyncio.run(main()) if claim]
+
+    assert len(claims) == 1
+    assert claims[0]["lease_id"] and claims[0]["claimed_by"]
+
+
+def test_claimed_notification_is_not_claimed_again_until_its_lease_expires(repository):
+    async def main():
+        await repository.connect()
+        await repository.create(due_notification("LEASE-2"))
+        first = await notifications.claim_due_notification(30, "node-a")
+        while_held = await notifications.claim_due_notification(30, "node-b")
+
+        await expire_lease(repository, first["_id"])
+        second = await notifications.claim_due_notification(30, "node-b")
+        return first, while_held, second
+
+    first, while_held, second = asyncio.run(main())
+
+    assert while_held is None
+    assert second["_id"] == first["_id"]
+    assert second["claimed_by"] == "node-b"
+    assert second["lease_id"] != first["lease_id"]
+
+
+def test_writes_are_fenced_on_the_current_lease(repository):
+    async def main():
+        await repository.connect()
+        await repository.create(due_notification("LEASE-3"))
+        first = await notifications.claim_due_notification(30, "node-a")
+        await expire_lease(repository, first["_id"])
+        second = await notifications.claim_due_notification(30, "node-b")
+
+        # The first holder finishes late: neither its renewal nor its outcome may apply
+        renewed = await notifications.renew_notification_lease(first["_id"], first["lease_id"], 30)
+        stale = await notifications.update_notification(first["_id"], {"status": "failed"}, lease_id=first["lease_id"])
+        stale_bulk = await notifications.update_notifications([(first["_id"], {"status": "failed"}, first["lease_id"])])
+
+        current = await notifications.update_notification(second["_id"], {"status": "sent", "sent_at": datetime.now()}, lease_id=second["lease_id"])
+        stored = await repository.collection.find_one({"_id": ObjectId(first["_id"])})
+        return renewed, stale, stale_bulk, current, stored
+
+    renewed, stale, stale_bulk, current, stored = asyncio.run(main())
+
+    assert renewed is False
+    assert stale is None
+    assert stale_bulk == 0
+    assert current["status"] == "sent"
+    assert stored["status"] == "sent"
+    # The holder's final write releases the claim
+    assert "lease_id" not in stored or stored["lease_id"] is None
+
+
+def test_lease_keeper_holds_a_lease_past_its_expiry_and_reports_a_takeover(repository):
+    async def main():
+        await repository.connect()
+        keeper = LeaseKeeper(lease=30)
+        saved, _ = await repository.create(build_notification({
+            "transaction_number": "LEASE-4",
+            "transaction_amount": 10,
+            "fraud_probability": 0.95
+        }, leased=True))
+        keeper.hold(saved)
+
+        # Renewed after it lapsed: the sweeper still finds nothing due
+        await expire_lease(repository, saved["_id"])
+        await keeper.renew()
+        while_held = await notifications.claim_due_notification(30, "sweeper")
+
+        # Taken over once the keeper stopped renewing in time
+        await expire_lease(repository, saved["_id"])
+        taken = await notifications.claim_due_notification(30, "sweeper")
+        await keeper.renew()
+        return keeper, saved, while_held, taken
+
+    keeper, saved, while_held, taken = asyncio.run(main())
+
+    assert saved["lease_id"]
+    assert while_held is None
+    assert taken["_id"] == saved["_id"]
+    assert keeper.lost(saved["_id"])
+    assert keeper.stats()["leases_lost"] == 1
+
+
+def test_dispatchers_deliver_each_notification_once(repository):
+    delivered = Counter()
+
+    async def deliver(notification, data):
+        await asyncio.sleep(0.01)
+        delivered[notification["_id"]] += 1
+        await notifications.update_notification(notification["_id"], {"status": "sent", "sent_at": datetime.now()},
+                                                lease_id=notification["lease_id"])
+
+    async def main():
+        await repository.connect()
+        for i in range(30):
+            await repository.create(due_notification(f"LEASE-5-{i}"))
+
+        dispatchers = [Dispatcher(node_id=f"node-{i}", lease=30, concurrency=4, poll_interval=0.01) for i in range(3)]
+        for dispatcher in dispatchers:
+            await dispatcher.start(deliver)
+
+        for _ in range(200):
+            if await repository.collection.count_documents({"status": "sent"}) == 30:
+                break
+            await asyncio.sleep(0.02)
+
+        for dispatcher in dispatchers:
+            await dispatcher.stop()
+        return dispatchers
+
+    dispatchers = asyncio.run(main())
+
+    assert len(delivered) == 30
+    assert set(delivered.values()) == {1}
+    assert sum(dispatcher.stats()["claimed"] for dispatcher in dispatchers) == 30
@@ -0,0 +1,30 @@
+import os
+import shutil
+import asyncio
+from types import SimpleNamespace
+
+import pytest # type: ignore
+
+from benchmarks import query_plans
+from benchmarks.load_test import LocalStack
+
+# A MongoDB to explain against (its scratch database is dropped afterwards); without one,
+# a throwaway mongod is started if it is installed
+MONGODB_TEST_URI = os.getenv("MONGODB_TEST_URI")
+
+pytestmark = pytest.mark.skipif(
+    not MONGODB_TEST_URI and not shutil.which("mongod"),
+    reason="explain() needs a real MongoDB: set MONGODB_TEST_URI or install mongod"
+)
+
+
+def test_every_list_filter_combination_is_an_index_scan():
+    stack = LocalStack(SimpleNamespace(mongo_uri=MONGODB_TEST_URI, verbose=False))
+    try:
+        stack.start_mongo()
+        results = asyncio.run(query_plans.run(stack.mongo_uri, SimpleNamespace(documents=5000, limit=10, seed=42)))
+    finally:
+        stack.stop()
+
+    assert results
+    assert [result for result in results if not result["ok"]] == []
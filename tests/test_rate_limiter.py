@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import RetryAfter # type: ignore
+
+from app.services.telegram_service import RateLimiter, TelegramService
+
+
+class FakeBot():
+    """Answers sendMessage, raising RetryAfter for the first `floods` calls."""
+
+    def __init__(self, floods=0, retry_after=1):
+        self.floods = floods
+        self.retry_after = retry_after
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.calls += 1
+        if self.calls <= self.floods:
+            raise RetryAfter(self.retry_after)
+        return SimpleNamespace(message_id=self.calls)
+
+
+def connected_service(bot):
+    service = TelegramService()
+    service.chat_id = "-100"
+    service.bot = bot
+    service._pid = os.getpid()
+    service.rate_limiter = RateLimiter(global_rate=100, global_burst=100, chat_rate_per_minute=6000, chat_burst=10, critical_reserve=0)
+    return service
+
+
+def test_chat_bucket_delays_sends_beyond_its_burst():
+    async def main():
+        limiter = RateLimiter(global_rate=100, global_burst=100, chat_rate_per_minute=600, chat_burst=2, critical_reserve=0)
+
+        start = time.monotonic()
+        waits = [await limiter.acquire("chat") for _ in range(4)]
+        return time.monotonic() - start, waits, limiter
+
+    elapsed, waits, limiter = asyncio.run(main())
+
+    # Two go out at once, then one every 0.1s (10 per second)
+    assert waits[0] < 0.01 and waits[1] < 0.01
+    assert elapsed >= 0.18
+    assert limiter.acquired == 4
+    assert limiter.max_wait >= 0.08
+
+
+def test_chats_have_separate_buckets():
+    async def main():
+        limiter = RateLimiter(global_rate=100, global_burst=100, chat_rate_per_minute=60, chat_burst=1, critical_reserve=0)
+        return [await limiter.acquire(chat) for chat in ("a", "b", "c")]
+
+    assert max(asyncio.run(main())) < 0.01
+
+
+def test_retry_after_is_honoured_and_the_alert_still_sent():
+    bot = FakeBot(floods=1, retry_after=1)
+    service = connected_service(bot)
+
+    result = asyncio.run(service.send_fraud_alert({"transaction_number": "T1", "fraud_probability": 0.9, "transaction_amount": 10}))
+
+    assert result["success"]
+    assert bot.calls == 2
+    assert result["waited"] >= 0.9
+    assert service.rate_limiter.retry_afters == 1
+
+
+def test_gives_up_after_max_retries():
+    bot = FakeBot(floods=10, retry_after=0)
+    service = connected_service(bot)
+    service.max_retries = 2
+
+    result = asyncio.run(service.send_fraud_alert({"transaction_number": "T1", "fraud_probability": 0.9, "transaction_amount": 10}))
+
+    assert not result["success"]
+    assert result["error_type"] == "RetryAfter"
+    assert bot.calls == 3
@@ -0,0 +1,156 @@
+import time
+import asyncio
+
+import pytest # type: ignore
+from pymongo.errors import ServerSelectionTimeoutError # type: ignore
+
+from app.controllers import notification_controller
+from app.controllers.notification_controller import send_fraud_notification, replay_journaled_notification
+from app.services.spill_journal import SpillJournal
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, is_mongo_failure, mongo_breaker
+
+
+def alert(transaction_number):
+    return {
+        "transaction_number": transaction_number,
+        "transaction_amount": 42.0,
+        "fraud_probability": 0.91,
+        "merchant": "merchant_2",
+        "is_nighttime": True
+    }
+
+
+async def reachable():
+    return True
+
+
+"""
+The spill journal in a temporary directory, and a switch that takes the test
+repository's create() down as if MongoDB had gone away.
+"""
+@pytest.fixture
+def outage(repository, monkeypatch, tmp_path):
+    journal = SpillJournal(directory=str(tmp_path), enabled=True, fsync_interval=0.001, replay_batch=7)
+    monkeypatch.setattr(notification_controller, "spill_journal", journal)
+
+    state = {"down": False}
+    create = repository.create
+
+    async def create_unless_down(notification):
+        if state["down"]:
+            raise ServerSelectionTimeoutError("mongod is down")
+        return await create(notification)
+
+    monkeypatch.setattr(repository, "create", create_unless_down)
+    return journal, state
+
+
+def test_alerts_accepted_while_mongo_is_down_are_replayed_once(repository, outage):
+    journal, state = outage
+
+    async def main():
+        await repository.connect()
+        before = await send_fraud_notification(alert("SPILL-0"))
+
+        state["down"] = True
+        during = await asyncio.gather(*(send_fraud_notification(alert(f"SPILL-{i}")) for i in range(1, 41)))
+        # A retry of an alert that was stored before the outage is journaled too
+        during.append(await send_fraud_notification(alert("SPILL-0")))
+
+        state["down"] = False
+        replayed = await journal.replay(replay_journaled_notification, reachable)
+        again = await journal.replay(replay_journaled_notification, reachable)
+
+        stored = await repository.collection.count_documents({})
+        distinct = len(await repository.collection.distinct("transaction_number"))
+        await journal.stop()
+        return before, during, replayed, again, stored, distinct
+
+    before, during, replayed, again, stored, distinct = asyncio.run(main())
+
+    assert before["status"] == "sent"
+    assert all(response["status"] == "journaled" for response in during)
+    assert replayed == 41
+    assert again == 0
+    assert stored == distinct == 41
+    assert journal.appended == 41
+
+
+def test_replayed_alert_keeps_its_time_and_is_due(repository, outage):
+    journal, state = outage
+
+    async def main():
+        await repository.connect()
+        state["down"] = True
+        await send_fraud_notification(alert("SPILL-TIME"))
+        journaled_before = time.time()
+        await asyncio.sleep(0.05)
+
+        state["down"] = False
+        await journal.replay(replay_journaled_notification, reachable)
+        await journal.stop()
+        return journaled_before, await repository.collection.find_one({"transaction_number": "SPILL-TIME"})
+
+    journaled_before, stored = asyncio.run(main())
+
+    assert stored["status"] == "pending"
+    assert stored["created_at"].timestamp() <= journaled_before
+    # Left for the retry sweeper: due at once and not claimed by anyone
+    assert stored["next_attempt_at"].timestamp() <= time.time()
+    assert not stored.get("lease_id")
+
+
+def test_nothing_is_replayed_while_the_mongo_breaker_is_open(repository, outage):
+    journal, state = outage
+
+    async def main():
+        await repository.connect()
+        state["down"] = True
+        await send_fraud_notification(alert("SPILL-OPEN"))
+        state["down"] = False
+
+        for _ in range(mongo_breaker.failure_threshold):
+            mongo_breaker.record_failure()
+        while_open = await journal.replay(replay_journaled_notification, reachable)
+
+        mongo_breaker.record_success()
+        after = await journal.replay(replay_journaled_notification, reachable)
+        await journal.stop()
+        return while_open, after
+
+    try:
+        assert asyncio.run(main()) == (0, 1)
+    finally:
+        mongo_breaker.record_success()
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_good_trial():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05, is_failure=is_mongo_failure)
+
+    async def failing():
+        raise ServerSelectionTimeoutError("down")
+
+    async def working():
+        return "ok"
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ServerSelectionTimeoutError):
+                await breaker.call(failing)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(working)
+
+        # A failed trial opens it again
+        await asyncio.sleep(0.06)
+        assert breaker.state == "half_open"
+        with pytest.raises(ServerSelectionTimeoutError):
+            await breaker.call(failing)
+        assert breaker.state == "open"
+
+        await asyncio.sleep(0.06)
+        assert await breaker.call(working) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(main())
+    assert breaker.stats()["rejected"] == 1